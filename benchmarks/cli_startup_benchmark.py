@@ -0,0 +1,53 @@
+"""Time cold starts of the command-line interface, one fresh interpreter per run.
+
+Usage: python benchmarks/cli_startup_benchmark.py [--rows 10000] [--repeat 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from harness import ROOT, best_of
+from synthetic import write_csv
+
+CLI = os.path.join(ROOT, "ledger_cli.py")
+
+
+def run_cli(command):
+    subprocess.run([sys.executable, CLI] + command, check=True, stdout=subprocess.DEVNULL)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, "source.csv")
+        ledger = os.path.join(directory, "ledger.gl")
+        write_csv(source, args.rows)
+        subprocess.run([sys.executable, CLI, "import", source, ledger], check=True, stdout=subprocess.DEVNULL)
+        cases = [
+            ("python -c pass", None),
+            ("balances", ["balances", ledger]),
+            ("statements", ["statements", ledger]),
+            ("tax-forms", ["tax-forms", ledger]),
+            ("export .csv", ["export", ledger, os.path.join(directory, "out.csv")]),
+            ("export .xlsx", ["export", ledger, os.path.join(directory, "out.xlsx")]),
+        ]
+        print(f"{'Command':<16} {'Best (ms)':>10}")
+        for name, command in cases:
+            if command is None:
+                start = time.perf_counter()
+                subprocess.run([sys.executable, "-c", "pass"], check=True)
+                elapsed = time.perf_counter() - start
+            else:
+                elapsed, _ = best_of(args.repeat, lambda: run_cli(command))
+            print(f"{name:<16} {elapsed * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""Compare two benchmark result files and flag regressions.
+
+Usage: python benchmarks/compare_benchmarks.py BASELINE.json CURRENT.json [--threshold 0.10]
+
+Exits with status 1 if any case present in both files got slower than
+the threshold allows.
+"""
+import argparse
+import sys
+
+import harness
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=harness.DEFAULT_THRESHOLD,
+                        help="relative slow-down counted as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    baseline = harness.load_results(args.baseline)
+    current = harness.load_results(args.current)
+    for label, data in (("Baseline", baseline), ("Current", current)):
+        environment = data["environment"]
+        print(f"{label}: {data['benchmark']} at {environment['commit'] or 'unknown commit'}, "
+              f"{environment['timestamp']}, Python {environment['python']}")
+    print()
+    comparison = harness.compare(baseline["results"], current["results"], args.threshold)
+    return 1 if harness.print_comparison(comparison, args.threshold) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
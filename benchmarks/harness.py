@@ -0,0 +1,158 @@
+"""Timing, peak-memory measurement and result files shared by the benchmarks.
+
+Results are lists of dicts, one per (case, rows), and are saved as JSON
+together with the environment they were measured in, so two versions of
+the app can be compared with compare_benchmarks.py.
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+RESULTS_VERSION = 1
+
+# A case counts as a regression when its best time grows by more than this fraction
+DEFAULT_THRESHOLD = 0.10
+
+
+def best_of(repeat, func):
+    """Return (best wall time in seconds, result of the last run)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def peak_memory(func):
+    """Return the peak bytes allocated while func runs, as seen by tracemalloc.
+
+    Measured in a separate run, since tracing slows allocation down.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(case, rows, func, repeat=3, memory=True):
+    """Time func `repeat` times (and once more for peak memory); return a result dict.
+
+    Latency is the best and median wall time of one call (the first call
+    may build lazy indexes, which the median shows); throughput is ledger
+    rows per second at the best time.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    return {
+        "case": case,
+        "rows": rows,
+        "repeat": repeat,
+        "best_s": best,
+        "median_s": statistics.median(timings),
+        "rows_per_s": rows / best if best else None,
+        "peak_bytes": peak_memory(func) if memory else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    try:
+        import numpy
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = None
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": numpy_version,
+    }
+
+
+def write_results(path, results, benchmark):
+    with open(path, "w") as results_file:
+        json.dump({"version": RESULTS_VERSION, "benchmark": benchmark, "environment": environment(),
+                   "results": results}, results_file, indent=2)
+        results_file.write("\n")
+
+
+def load_results(path):
+    with open(path) as results_file:
+        data = json.load(results_file)
+    if data.get("version", 0) > RESULTS_VERSION:
+        raise ValueError(f"{path}: results version {data['version']} is newer than this harness supports.")
+    return data
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Pair up the cases of two result lists; return [(case, rows, before, after, change, regressed)].
+
+    change is the relative change in best time (0.25 is 25% slower).
+    Cases present in only one of the lists are skipped.
+    """
+    before = {(result["case"], result["rows"]): result for result in baseline}
+    comparison = []
+    for result in current:
+        old = before.get((result["case"], result["rows"]))
+        if old is None:
+            continue
+        change = result["best_s"] / old["best_s"] - 1 if old["best_s"] else 0.0
+        comparison.append((result["case"], result["rows"], old["best_s"], result["best_s"], change,
+                           change > threshold))
+    return comparison
+
+
+def format_bytes(count):
+    if count is None:
+        return "-"
+    for unit in ("B", "KB", "MB"):
+        if count < 1024:
+            return f"{count:.0f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GB"
+
+
+def print_header():
+    print(f"{'Rows':>12} {'Case':<30} {'Best (ms)':>11} {'Median (ms)':>12} {'Rows/s':>14} {'Peak':>10}")
+
+
+def print_result(result):
+    rate = f"{result['rows_per_s']:,.0f}" if result["rows_per_s"] else "-"
+    print(f"{result['rows']:>12,} {result['case']:<30} {result['best_s'] * 1000:>11.2f} "
+          f"{result['median_s'] * 1000:>12.2f} {rate:>14} {format_bytes(result['peak_bytes']):>10}")
+
+
+def print_comparison(comparison, threshold=DEFAULT_THRESHOLD):
+    print(f"{'Rows':>12} {'Case':<30} {'Before (ms)':>12} {'After (ms)':>11} {'Change':>8}")
+    for case, rows, before, after, change, regressed in comparison:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{rows:>12,} {case:<30} {before * 1000:>12.2f} {after * 1000:>11.2f} {change:>+8.1%}{flag}")
+    regressions = sum(1 for *_, regressed in comparison if regressed)
+    print(f"{regressions} of {len(comparison)} cases slower by more than {threshold:.0%}")
+    return regressions
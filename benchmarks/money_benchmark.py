@@ -0,0 +1,79 @@
+"""Compare float and integer-cent aggregation: throughput and rounding drift.
+
+Sums synthetic ledger amounts per account three ways: the old float path
+(float(text) accumulated in Python), integer cents in Python, and integer
+cents on NumPy int64 arrays. Drift is the float result minus the exact one.
+
+Usage: python benchmarks/money_benchmark.py [--rows 1000000 10000000] [--repeat 3]
+"""
+import argparse
+import random
+from array import array
+from decimal import Decimal
+
+from harness import best_of
+from ledger_store import CENTS_PER_UNIT, format_cents, numpy_module
+
+ACCOUNTS = 13
+
+
+def build_columns(rows, seed=1):
+    rng = random.Random(seed)
+    account_ids = array("i", (rng.randrange(ACCOUNTS) for _ in range(rows)))
+    cents = array("q", (rng.randrange(1, 1_000_000) for _ in range(rows)))
+    return account_ids, cents
+
+
+def float_sums(account_ids, amounts):
+    totals = [0.0] * ACCOUNTS
+    for account_id, amount in zip(account_ids, amounts):
+        totals[account_id] += amount
+    return totals
+
+
+def cent_sums(account_ids, cents):
+    totals = [0] * ACCOUNTS
+    for account_id, amount in zip(account_ids, cents):
+        totals[account_id] += amount
+    return totals
+
+
+def numpy_cent_sums(np, account_ids, cents):
+    totals = np.zeros(ACCOUNTS, dtype=np.int64)
+    np.add.at(totals, np.frombuffer(account_ids, dtype=np.int32), np.frombuffer(cents, dtype=np.int64))
+    return totals.tolist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    np = numpy_module()
+
+    print(f"{'Rows':>12} {'Path':<22} {'Best (ms)':>10} {'Mrows/s':>9} {'Max drift':>12}")
+    for rows in args.rows:
+        account_ids, cents = build_columns(rows)
+        # The old representation: each amount parsed from text into a float
+        amounts = array("d", (float(format_cents(amount)) for amount in cents))
+        exact = cent_sums(account_ids, cents)
+        cases = [
+            ("float (Python)", lambda: float_sums(account_ids, amounts)),
+            ("int cents (Python)", lambda: cent_sums(account_ids, cents)),
+        ]
+        if np is not None:
+            cases.append(("int cents (NumPy)", lambda: numpy_cent_sums(np, account_ids, cents)))
+        for name, func in cases:
+            elapsed, totals = best_of(args.repeat, func)
+            if name.startswith("float"):
+                # Decimal(total) is the float's exact value, so this is the true error in cents
+                drift = max(abs(Decimal(total) * CENTS_PER_UNIT - exact_total)
+                            for total, exact_total in zip(totals, exact))
+                drift_text = f"{drift:.4f}c"
+            else:
+                drift_text = "0c" if totals == exact else "MISMATCH"
+            print(f"{rows:>12,} {name:<22} {elapsed * 1000:>10.1f} {rows / elapsed / 1e6:>9.1f} {drift_text:>12}")
+
+
+if __name__ == "__main__":
+    main()
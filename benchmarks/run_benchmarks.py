@@ -0,0 +1,108 @@
+"""Benchmark the ledger core, statements and file I/O on synthetic ledgers.
+
+Measures latency (best and median of --repeat runs), throughput (rows/s)
+and peak traced memory for each case at each ledger size. Runs without
+Tk. Results can be saved as JSON with --output and compared against a
+saved baseline with --compare (exit status 1 if any case regressed).
+
+Usage: python benchmarks/run_benchmarks.py [--rows 10000 1000000 10000000] [--cases ...]
+                                           [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import harness
+import synthetic
+from financial_statements import BalanceSheet, IncomeStatement, StatementEngine, StatementOfEquity, export_to_excel
+from ledger import GeneralLedger
+from ledger_format import read_ledger_file, write_ledger_file
+from ledger_io import load_csv, save_csv
+
+DEFAULT_ROWS = [10_000, 1_000_000, 10_000_000]
+
+
+def all_statements(ledger):
+    engine = StatementEngine(ledger)
+    return (IncomeStatement(ledger, engine=engine),
+            BalanceSheet(ledger, engine=engine),
+            StatementOfEquity(ledger, engine=engine))
+
+
+def year_statements(ledger):
+    engine = StatementEngine(ledger, "2024-01-01", "2024-12-31")
+    return StatementOfEquity(ledger, engine=engine)
+
+
+def build_cases(ledger, directory):
+    """Return {case name: func}; every func works on the prepared fixture files in `directory`."""
+    source_csv = os.path.join(directory, "source.csv")
+    source_gl = os.path.join(directory, "source.gl")
+    return {
+        "get_account_balances": ledger.get_account_balances,
+        "get_account_balances (period)": lambda: ledger.get_account_balances("2024-04-01", "2024-06-30"),
+        "generate_t_accounts": ledger.generate_t_accounts,
+        "statements": lambda: all_statements(ledger),
+        "statements (year)": lambda: year_statements(ledger),
+        "rebuild_index": ledger.rebuild_index,
+        "search": lambda: ledger.search("synthetic entry 4", start_date="2024-04-01", end_date="2024-06-30"),
+        "save_csv": lambda: save_csv(ledger, os.path.join(directory, "out.csv")),
+        "load_csv": lambda: load_csv(GeneralLedger(), source_csv),
+        "write_ledger_file": lambda: write_ledger_file(ledger, os.path.join(directory, "out.gl")),
+        "read_ledger_file": lambda: read_ledger_file(GeneralLedger(), source_gl),
+        "export_to_excel": lambda: export_to_excel(ledger, os.path.join(directory, "out.xlsx")),
+    }
+
+
+def run(rows_list, cases, repeat, memory, accounts, days):
+    results = []
+    harness.print_header()
+    for rows in rows_list:
+        ledger = synthetic.build_ledger(rows, accounts, days)
+        with tempfile.TemporaryDirectory() as directory:
+            # Input files for the load cases, written once per size and not timed
+            save_csv(ledger, os.path.join(directory, "source.csv"))
+            write_ledger_file(ledger, os.path.join(directory, "source.gl"))
+            available = build_cases(ledger, directory)
+            for case in cases:
+                result = harness.measure(case, rows, available[case], repeat, memory)
+                harness.print_result(result)
+                results.append(result)
+        del ledger
+    return results
+
+
+def main():
+    case_names = list(build_cases(GeneralLedger(), ""))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--cases", nargs="+", choices=case_names, default=case_names, metavar="CASE",
+                        help="cases to run (default: all): " + ", ".join(case_names))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--accounts", type=int, default=32)
+    parser.add_argument("--days", type=int, default=365, help="number of distinct dates the rows are spread over")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip the extra traced run that measures peak memory")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare against results saved by an earlier --output")
+    parser.add_argument("--threshold", type=float, default=harness.DEFAULT_THRESHOLD,
+                        help="relative slow-down counted as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.cases, args.repeat, args.memory, args.accounts, args.days)
+    # The suite must stay headless; nothing it imports may pull in the GUI
+    assert "tkinter" not in sys.modules
+    if args.output:
+        harness.write_results(args.output, results, "run_benchmarks")
+        print(f"Results written to {args.output}")
+    if args.compare:
+        print()
+        comparison = harness.compare(harness.load_results(args.compare)["results"], results, args.threshold)
+        if harness.print_comparison(comparison, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""Time statement construction on synthetic ledgers.
+
+Usage: python benchmarks/statements_benchmark.py [--rows 1000000 10000000] [--repeat 5]
+"""
+import argparse
+
+import harness
+from date_index import DateIndex
+from financial_statements import StatementEngine, IncomeStatement, BalanceSheet, StatementOfEquity
+from synthetic import build_ledger
+
+
+def all_statements(ledger):
+    engine = StatementEngine(ledger)
+    return (IncomeStatement(ledger, engine=engine),
+            BalanceSheet(ledger, engine=engine),
+            StatementOfEquity(ledger, engine=engine))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'Rows':>12} {'Statement':<26} {'Best (ms)':>10}")
+    for rows in args.rows:
+        ledger = build_ledger(rows)
+        cases = [
+            ("Income Statement", lambda: IncomeStatement(ledger)),
+            ("Balance Sheet", lambda: BalanceSheet(ledger)),
+            ("Statement of Equity", lambda: StatementOfEquity(ledger)),
+            ("All three (shared)", lambda: all_statements(ledger)),
+            ("Income Statement (period)", lambda: IncomeStatement(ledger, "2024-04-01", "2024-06-30")),
+            ("rebuild_index", ledger.rebuild_index),
+            ("Date index build", lambda: DateIndex.build(ledger._store)),
+        ]
+        for name, func in cases:
+            result = harness.measure(name, rows, func, args.repeat, memory=False)
+            results.append(result)
+            print(f"{rows:>12,} {name:<26} {result['best_s'] * 1000:>10.3f}")
+    if args.output:
+        harness.write_results(args.output, results, "statements_benchmark")
+
+
+if __name__ == "__main__":
+    main()
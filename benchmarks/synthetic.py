@@ -0,0 +1,95 @@
+"""Synthetic ledgers for the benchmarks.
+
+Rows come in balanced two-line journal entries (a debit and a credit of
+the same amount) over a configurable number of accounts, spread over
+`days` consecutive dates in date order, like books entered as business
+happens. Generation is seeded, so every run and every version measures
+the same data.
+"""
+import csv
+import random
+from array import array
+from datetime import date, timedelta
+
+import harness  # Puts the app on sys.path
+from chart_of_accounts import DEFAULT_CHART
+from ledger import GeneralLedger
+from ledger_io import ENTRY_HEADER, LEDGER_HEADER
+from ledger_store import format_cents, numpy_module
+
+START_DATE = date(2024, 1, 1)
+DESCRIPTIONS = 100
+MAX_AMOUNT_CENTS = 1_000_000
+
+
+def account_names(count):
+    """The chart's accounts first (so statements have every type), then numbered extras."""
+    names = DEFAULT_CHART.names()[:count]
+    return names + [f"Account {number}" for number in range(len(names), count)]
+
+
+def date_strings(days, start=START_DATE):
+    return [(start + timedelta(days=day)).isoformat() for day in range(days)]
+
+
+def synthetic_columns(rows, accounts=32, days=365, seed=1):
+    """Return (account ids, day numbers, debit cents, credit cents, description ids, entry ids)."""
+    np = numpy_module()
+    pairs = (rows + 1) // 2
+    if np is not None:
+        rng = np.random.default_rng(seed)
+        account_ids = rng.integers(0, accounts, rows, dtype=np.int32)
+        day_ids = np.sort(rng.integers(0, days, pairs, dtype=np.int32)).repeat(2)[:rows]
+        amounts = rng.integers(1, MAX_AMOUNT_CENTS, pairs, dtype=np.int64).repeat(2)[:rows]
+        debit_side = (np.arange(rows) % 2 == 0)
+        debits = np.where(debit_side, amounts, 0)
+        credits = np.where(debit_side, 0, amounts)
+        description_ids = rng.integers(0, DESCRIPTIONS, rows, dtype=np.int32)
+        entry_ids = (np.arange(rows, dtype=np.int32) // 2) + 1
+        return tuple(array(typecode, column.astype(typecode).tobytes()) for typecode, column in (
+            ("i", account_ids), ("i", day_ids), ("q", debits), ("q", credits),
+            ("i", description_ids), ("i", entry_ids)))
+
+    rng = random.Random(seed)
+    account_ids = array("i", (rng.randrange(accounts) for _ in range(rows)))
+    day_ids = array("i", (day for day in sorted(rng.randrange(days) for _ in range(pairs)) for _ in (0, 1)))[:rows]
+    amounts = [rng.randrange(1, MAX_AMOUNT_CENTS) for _ in range(pairs)]
+    debits = array("q", (amounts[row // 2] if row % 2 == 0 else 0 for row in range(rows)))
+    credits = array("q", (0 if row % 2 == 0 else amounts[row // 2] for row in range(rows)))
+    description_ids = array("i", (rng.randrange(DESCRIPTIONS) for _ in range(rows)))
+    entry_ids = array("i", (row // 2 + 1 for row in range(rows)))
+    return account_ids, day_ids, debits, credits, description_ids, entry_ids
+
+
+def build_ledger(rows, accounts=32, days=365, seed=1):
+    """Return a GeneralLedger holding `rows` synthetic rows.
+
+    The store columns are filled directly; going through add_transactions
+    would make building the fixture dominate the run.
+    """
+    ledger = GeneralLedger()
+    store = ledger._store
+    for name in account_names(accounts):
+        store.accounts.intern(name)
+    for day in date_strings(days):
+        store.intern_date(day)
+    for number in range(DESCRIPTIONS):
+        store.descriptions.intern(f"Synthetic entry {number}")
+    (store.account_ids, store.date_ids, store.debits, store.credits,
+     store.description_ids, store.entry_ids) = synthetic_columns(rows, accounts, days, seed)
+    ledger.rebuild_index()
+    return ledger
+
+
+def write_csv(path, rows, accounts=32, days=365, seed=1, entries=False):
+    """Write a synthetic ledger CSV, in the format save_csv produces."""
+    names = account_names(accounts)
+    dates = date_strings(days)
+    account_ids, day_ids, debits, credits, description_ids, entry_ids = synthetic_columns(rows, accounts, days, seed)
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(LEDGER_HEADER + [ENTRY_HEADER] if entries else LEDGER_HEADER)
+        for row in range(rows):
+            line = [dates[day_ids[row]], names[account_ids[row]], format_cents(debits[row]),
+                    format_cents(credits[row]), f"Synthetic entry {description_ids[row]}"]
+            writer.writerow(line + [entry_ids[row]] if entries else line)
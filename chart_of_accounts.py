@@ -0,0 +1,130 @@
+"""Chart of accounts: account numbers and types, and classification of other names.
+
+Accounts in the chart have an explicit type. Any other name (a custom
+account typed into the app, or one from an imported file) is classified
+once by name rules and the answer is memoized, so statements never
+re-examine an account's name.
+"""
+
+ACCOUNT_TYPES = ('asset', 'liability', 'equity', 'revenue', 'expense')
+
+# Name rules for accounts outside the chart; prefixes are tried before suffixes
+# so that e.g. "Prepaid Expenses" is an asset and "Unearned Revenue" a liability
+PREFIX_RULES = (
+    ('asset', ('prepaid', 'accumulated depreciation', 'allowance for')),
+    ('liability', ('unearned', 'deferred revenue', 'accrued')),
+    ('expense', ('cost of goods', 'cogs')),
+)
+SUFFIX_RULES = (
+    ('revenue', ('revenue', 'income', 'sales')),
+    ('expense', ('expense', 'expenses', 'cost')),
+    ('asset', ('asset', 'cash', 'receivable', 'inventory', 'equipment', 'buildings', 'land')),
+    ('liability', ('liability', 'payable', 'debt')),
+    ('equity', ('equity', 'capital', 'retained earnings', 'stock', 'draw')),
+)
+
+
+def classify_by_name(name):
+    """Return the account type implied by an account name, or None."""
+    name = name.strip().lower()
+    for account_type, prefixes in PREFIX_RULES:
+        if name.startswith(prefixes):
+            return account_type
+    for account_type, suffixes in SUFFIX_RULES:
+        if name.endswith(suffixes):
+            return account_type
+    return None
+
+
+class Account:
+    __slots__ = ("number", "name", "type")
+
+    def __init__(self, number, name, account_type):
+        if account_type not in ACCOUNT_TYPES:
+            raise ValueError(f"Unknown account type {account_type!r} for {name!r}.")
+        self.number = number
+        self.name = name
+        self.type = account_type
+
+    def __repr__(self):
+        return f"Account({self.number!r}, {self.name!r}, {self.type!r})"
+
+
+class ChartOfAccounts:
+    def __init__(self, accounts=()):
+        self._accounts = {}
+        # Memoized type of every name looked up so far, in or out of the chart
+        self._types = {}
+        for number, name, account_type in accounts:
+            self.add(number, name, account_type)
+
+    def add(self, number, name, account_type):
+        account = Account(number, name, account_type)
+        self._accounts[name] = account
+        self._types[name] = account_type
+        return account
+
+    def get(self, name):
+        return self._accounts.get(name)
+
+    def __contains__(self, name):
+        return name in self._accounts
+
+    def __iter__(self):
+        return iter(sorted(self._accounts.values(), key=lambda account: account.number))
+
+    def __len__(self):
+        return len(self._accounts)
+
+    def names(self):
+        """Account names in account-number order."""
+        return [account.name for account in self]
+
+    def classify(self, name):
+        """Return the account type of `name` ('asset', ..., 'expense'), or None."""
+        try:
+            return self._types[name]
+        except KeyError:
+            account_type = self._types[name] = classify_by_name(name)
+            return account_type
+
+
+DEFAULT_CHART = ChartOfAccounts([
+    (1000, "Cash", 'asset'),
+    (1100, "Accounts Receivable", 'asset'),
+    (1200, "Inventory", 'asset'),
+    (1300, "Prepaid Expenses", 'asset'),
+    (1500, "Equipment", 'asset'),
+    (1510, "Buildings", 'asset'),
+    (1520, "Land", 'asset'),
+    (1590, "Accumulated Depreciation", 'asset'),
+    (2000, "Accounts Payable", 'liability'),
+    (2100, "Notes Payable", 'liability'),
+    (2200, "Salaries Payable", 'liability'),
+    (2210, "Interest Payable", 'liability'),
+    (2300, "Unearned Revenue", 'liability'),
+    (2310, "Deferred Revenue", 'liability'),
+    (3000, "Common Stock", 'equity'),
+    (3100, "Retained Earnings", 'equity'),
+    (3200, "Owner's Capital", 'equity'),
+    (3300, "Owner's Draw", 'equity'),
+    (4000, "Sales Revenue", 'revenue'),
+    (4100, "Service Revenue", 'revenue'),
+    (4200, "Interest Revenue", 'revenue'),
+    (4300, "Rent Revenue", 'revenue'),
+    (5000, "COGS", 'expense'),
+    (6000, "Salaries Expense", 'expense'),
+    (6100, "Rent Expense", 'expense'),
+    (6200, "Utilities Expense", 'expense'),
+    (6300, "Insurance Expense", 'expense'),
+    (6400, "Depreciation Expense", 'expense'),
+    (6500, "Interest Expense", 'expense'),
+    (6600, "Advertising Expense", 'expense'),
+    (6700, "Office Supplies Expense", 'expense'),
+    (6800, "Maintenance Expense", 'expense'),
+])
+
+
+def classify_account(account):
+    """Return the account type of `account` under the default chart, or None."""
+    return DEFAULT_CHART.classify(account)
@@ -0,0 +1,169 @@
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+
+from ledger_store import held_bytes, numpy_module
+
+
+class AccountDateIndex:
+    """Sorted distinct dates of one account with per-date totals and prefix sums.
+
+    Prefix sums carry a leading zero, so the totals of dates[lo:hi] are
+    cum[hi] - cum[lo]. Rows are usually appended in date order and extend
+    the prefix sums in O(1); a back-dated row marks the sums stale from its
+    position and they are recomputed on the next query.
+    """
+
+    __slots__ = ("dates", "day_debits", "day_credits", "day_counts",
+                 "cum_debits", "cum_credits", "cum_counts", "_stale_from")
+
+    def __init__(self):
+        self.dates = array("i")
+        self.day_debits = []
+        self.day_credits = []
+        self.day_counts = []
+        self.cum_debits = [0]
+        self.cum_credits = [0]
+        self.cum_counts = [0]
+        self._stale_from = None
+
+    @classmethod
+    def from_days(cls, dates, day_debits, day_credits, day_counts):
+        index = cls()
+        index.dates = array("i", dates)
+        index.day_debits = list(day_debits)
+        index.day_credits = list(day_credits)
+        index.day_counts = list(day_counts)
+        index.cum_debits = list(accumulate(index.day_debits, initial=0))
+        index.cum_credits = list(accumulate(index.day_credits, initial=0))
+        index.cum_counts = list(accumulate(index.day_counts, initial=0))
+        return index
+
+    def add(self, ordinal, debit, credit):
+        dates = self.dates
+        if not dates or ordinal > dates[-1]:
+            dates.append(ordinal)
+            self.day_debits.append(debit)
+            self.day_credits.append(credit)
+            self.day_counts.append(1)
+            if self._stale_from is None:
+                self.cum_debits.append(self.cum_debits[-1] + debit)
+                self.cum_credits.append(self.cum_credits[-1] + credit)
+                self.cum_counts.append(self.cum_counts[-1] + 1)
+            return
+        if ordinal == dates[-1] and self._stale_from is None:
+            self.day_debits[-1] += debit
+            self.day_credits[-1] += credit
+            self.day_counts[-1] += 1
+            self.cum_debits[-1] += debit
+            self.cum_credits[-1] += credit
+            self.cum_counts[-1] += 1
+            return
+        position = bisect_left(dates, ordinal)
+        if dates[position] == ordinal:
+            self.day_debits[position] += debit
+            self.day_credits[position] += credit
+            self.day_counts[position] += 1
+        else:
+            dates.insert(position, ordinal)
+            self.day_debits.insert(position, debit)
+            self.day_credits.insert(position, credit)
+            self.day_counts.insert(position, 1)
+        if self._stale_from is None or position < self._stale_from:
+            self._stale_from = position
+
+    def _refresh(self):
+        start = self._stale_from
+        for cum, days in ((self.cum_debits, self.day_debits),
+                          (self.cum_credits, self.day_credits),
+                          (self.cum_counts, self.day_counts)):
+            del cum[start + 1:]
+            running = cum[start]
+            for value in days[start:]:
+                running += value
+                cum.append(running)
+        self._stale_from = None
+
+    def nbytes(self):
+        return sum(held_bytes(values) for values in (self.dates, self.day_debits, self.day_credits,
+                                                     self.day_counts, self.cum_debits, self.cum_credits,
+                                                     self.cum_counts))
+
+    def totals(self, start=None, end=None):
+        """Return (debit, credit, rows) for dates in [start, end]; None leaves a side open."""
+        if self._stale_from is not None:
+            self._refresh()
+        lo = 0 if start is None else bisect_left(self.dates, start)
+        hi = len(self.dates) if end is None else bisect_right(self.dates, end)
+        if hi <= lo:
+            return 0, 0, 0
+        return (self.cum_debits[hi] - self.cum_debits[lo],
+                self.cum_credits[hi] - self.cum_credits[lo],
+                self.cum_counts[hi] - self.cum_counts[lo])
+
+
+class DateIndex:
+    """Per-account date indexes, addressed by the store's account id.
+
+    A period query is a pair of bisections per account, so it costs
+    O(accounts * log dates) however many rows the ledger holds.
+    """
+
+    def __init__(self):
+        self.accounts = []
+
+    @classmethod
+    def build(cls, store):
+        np = numpy_module() if len(store) else None
+        if np is not None:
+            return cls._build_vectorized(np, store)
+        index = cls()
+        ordinals = store.date_ordinals
+        for account_id, date_id, debit, credit in zip(store.account_ids, store.date_ids,
+                                                      store.debits, store.credits):
+            index.add(account_id, ordinals[date_id], debit, credit)
+        return index
+
+    @classmethod
+    def _build_vectorized(cls, np, store):
+        # Group rows by (account id, date ordinal) packed into one int64 key
+        account_ids = np.frombuffer(store.account_ids, dtype=np.int32).astype(np.int64)
+        ordinals = np.frombuffer(store.date_ordinals, dtype=np.int32)[
+            np.frombuffer(store.date_ids, dtype=np.int32)].astype(np.int64)
+        keys, inverse, counts = np.unique((account_ids << 32) | ordinals,
+                                          return_inverse=True, return_counts=True)
+        debits = np.zeros(len(keys), dtype=np.int64)
+        credits = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(debits, inverse, np.frombuffer(store.debits, dtype=np.int64))
+        np.add.at(credits, inverse, np.frombuffer(store.credits, dtype=np.int64))
+        key_accounts = keys >> 32
+        key_dates = keys & 0xFFFFFFFF
+        bounds = np.searchsorted(key_accounts, np.arange(len(store.accounts) + 1)).tolist()
+
+        index = cls()
+        for account_id in range(len(store.accounts)):
+            lo, hi = bounds[account_id], bounds[account_id + 1]
+            index.accounts.append(AccountDateIndex.from_days(
+                key_dates[lo:hi].tolist(), debits[lo:hi].tolist(),
+                credits[lo:hi].tolist(), counts[lo:hi].tolist()))
+        return index
+
+    def add(self, account_id, ordinal, debit, credit):
+        while account_id >= len(self.accounts):
+            self.accounts.append(AccountDateIndex())
+        self.accounts[account_id].add(ordinal, debit, credit)
+
+    def nbytes(self):
+        """Approximate bytes of every account's dates and prefix sums."""
+        return sys.getsizeof(self.accounts) + sum(sys.getsizeof(account_index) + account_index.nbytes()
+                                                  for account_index in self.accounts)
+
+    def period_totals(self, start=None, end=None):
+        """Return {account_id: (debit, credit)} for accounts with rows in [start, end]."""
+        totals = {}
+        for account_id, account_index in enumerate(self.accounts):
+            debit, credit, rows = account_index.totals(start, end)
+            if rows:
+                totals[account_id] = (debit, credit)
+        return totals
@@ -0,0 +1,143 @@
+import os
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+
+import instrumentation
+
+DIAGNOSTICS_COLUMNS = ("Operation", "Calls", "Errors", "Mean (ms)", "p50 (ms)", "p95 (ms)", "Max (ms)", "Rows")
+
+# Interval between redraws of the operation table while the window is showing
+DIAGNOSTICS_REFRESH_MS = 1000
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:,.2f}"
+
+
+class DiagnosticsViewer:
+    """A single, reusable window showing the timings recorded by instrumentation.
+
+    Like the T-account window it is created on first use and hidden when
+    closed. While showing, the operation table is redrawn every
+    DIAGNOSTICS_REFRESH_MS; recording itself is switched on and off with
+    the window's checkbox and costs nothing while off.
+    """
+
+    def __init__(self, master):
+        self.master = master
+        self.window = None
+        self.after_id = None
+        self.profiles_shown = 0
+
+    def show(self):
+        if self.window is None:
+            self.build_window()
+        self.window.deiconify()
+        self.window.lift()
+        self.refresh()
+
+    def is_open(self):
+        return self.window is not None and self.window.state() != 'withdrawn'
+
+    def hide(self):
+        if self.after_id is not None:
+            self.window.after_cancel(self.after_id)
+            self.after_id = None
+        self.window.withdraw()
+
+    def build_window(self):
+        self.window = tk.Toplevel(self.master)
+        self.window.title("Diagnostics")
+        self.window.protocol("WM_DELETE_WINDOW", self.hide)
+
+        top = ttk.Frame(self.window)
+        top.pack(fill='x', padx=10, pady=(10, 0))
+        self.enabled_var = tk.BooleanVar(value=instrumentation.is_enabled())
+        ttk.Checkbutton(top, text="Record timings", variable=self.enabled_var,
+                        command=lambda: instrumentation.enable(self.enabled_var.get())).pack(side='left')
+        ttk.Button(top, text="Reset", command=self.reset).pack(side='left', padx=5)
+        ttk.Button(top, text="Export...", command=self.export).pack(side='left', padx=5)
+        ttk.Button(top, text="Profile Next Call...", command=self.profile_next).pack(side='right', padx=5)
+        self.profile_var = tk.StringVar()
+        self.profile_dropdown = ttk.Combobox(top, textvariable=self.profile_var, width=28,
+                                             postcommand=self.update_operations)
+        self.profile_dropdown.pack(side='right', padx=5)
+        ttk.Label(top, text="Operation:").pack(side='right')
+
+        self.tree = ttk.Treeview(self.window, columns=DIAGNOSTICS_COLUMNS, show='headings', height=12)
+        for column in DIAGNOSTICS_COLUMNS:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=220 if column == "Operation" else 80,
+                             anchor='w' if column == "Operation" else 'e')
+        self.tree.pack(fill='both', expand=True, padx=10, pady=10)
+
+        profile_frame = ttk.LabelFrame(self.window, text="Last profile")
+        profile_frame.pack(fill='both', expand=True, padx=10, pady=(0, 10))
+        self.profile_text = tk.Text(profile_frame, height=14, width=110, wrap='none')
+        scrollbar = ttk.Scrollbar(profile_frame, orient='vertical', command=self.profile_text.yview)
+        self.profile_text.configure(yscrollcommand=scrollbar.set, state='disabled')
+        scrollbar.pack(side='right', fill='y')
+        self.profile_text.pack(side='left', fill='both', expand=True)
+
+    def refresh(self):
+        if self.after_id is not None:
+            self.window.after_cancel(self.after_id)
+            self.after_id = None
+        if not self.is_open():
+            return
+        self.enabled_var.set(instrumentation.is_enabled())
+        rows = [(name, f"{figures['count']:,}", f"{figures['errors']:,}", format_ms(figures["mean_seconds"]),
+                 format_ms(figures["p50_seconds"]), format_ms(figures["p95_seconds"]),
+                 format_ms(figures["max_seconds"]), f"{figures['rows']:,}")
+                for name, figures in instrumentation.metrics().items()]
+        items = self.tree.get_children()
+        for item, values in zip(items, rows):
+            self.tree.item(item, values=values)
+        for values in rows[len(items):]:
+            self.tree.insert("", tk.END, values=values)
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+        self.show_new_profile()
+        self.after_id = self.window.after(DIAGNOSTICS_REFRESH_MS, self.refresh)
+
+    def show_new_profile(self):
+        profiles = instrumentation.captured_profiles()
+        if len(profiles) == self.profiles_shown:
+            return
+        self.profiles_shown = len(profiles)
+        operation, path = profiles[-1]
+        self.profile_text.config(state='normal')
+        self.profile_text.delete("1.0", tk.END)
+        self.profile_text.insert(tk.END, f"{operation}: {path}\n\n" + instrumentation.profile_summary(path))
+        self.profile_text.config(state='disabled')
+
+    def update_operations(self):
+        self.profile_dropdown.configure(values=instrumentation.operations())
+
+    def reset(self):
+        instrumentation.reset()
+        self.refresh()
+
+    def export(self):
+        filepath = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json"), ("Prometheus text", "*.prom"), ("All files", "*.*")]
+        )
+        if filepath:
+            instrumentation.write_metrics(filepath)
+
+    def profile_next(self):
+        operation = self.profile_var.get().strip()
+        if not operation:
+            messagebox.showerror("Error", "Choose or type the operation to profile.", parent=self.window)
+            return
+        filepath = filedialog.asksaveasfilename(
+            defaultextension=".prof", initialfile=operation.replace(".", "_") + ".prof",
+            filetypes=[("cProfile traces", "*.prof"), ("All files", "*.*")]
+        )
+        if filepath:
+            instrumentation.enable()
+            self.enabled_var.set(True)
+            instrumentation.profile_next(operation, filepath)
+            messagebox.showinfo("Profile", f"The next {operation} call will be profiled to "
+                                           f"{os.path.basename(filepath)}.", parent=self.window)
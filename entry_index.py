@@ -0,0 +1,86 @@
+import sys
+from array import array
+
+from ledger_store import INT_BYTES, NO_ENTRY, held_bytes, numpy_module
+
+
+class EntryIndex:
+    """Row numbers and running net (debits - credits) of every journal entry.
+
+    Looking up an entry's lines is one dict access, and the set of
+    unbalanced entries is kept current as rows are appended, so checking
+    the whole ledger costs nothing beyond the first build.
+    """
+
+    def __init__(self):
+        # Rows present at build time, grouped by entry: lines of entry e are order[lo:hi]
+        self.order = array("i")
+        self.spans = {}  # entry id -> (lo, hi)
+        self.added = {}  # entry id -> array of rows appended since the build
+        self.nets = {}  # entry id -> debit - credit cents
+        self.unbalanced = set()
+
+    @classmethod
+    def build(cls, store):
+        np = numpy_module() if len(store) else None
+        if np is not None:
+            return cls._build_vectorized(np, store)
+        index = cls()
+        index.add(store, 0, len(store))
+        return index
+
+    @classmethod
+    def _build_vectorized(cls, np, store):
+        # Sort the entry rows by entry id (stable, so each entry keeps row order) and cut at id changes
+        entry_ids = np.frombuffer(store.entry_ids, dtype=np.int32)
+        rows = np.flatnonzero(entry_ids != NO_ENTRY)
+        index = cls()
+        if not len(rows):
+            return index
+        order = rows[np.argsort(entry_ids[rows], kind="stable")].astype(np.int32)
+        keys, starts = np.unique(entry_ids[order], return_index=True)
+        amounts = np.frombuffer(store.debits, dtype=np.int64) - np.frombuffer(store.credits, dtype=np.int64)
+        nets = np.add.reduceat(amounts[order], starts)
+        index.order.frombytes(order.tobytes())
+        starts = starts.tolist()
+        index.spans = dict(zip(keys.tolist(), zip(starts, starts[1:] + [len(order)])))
+        index.nets = dict(zip(keys.tolist(), nets.tolist()))
+        index.unbalanced = set(keys[nets != 0].tolist())
+        return index
+
+    def __len__(self):
+        return len(self.nets)
+
+    def nbytes(self):
+        """Approximate bytes of the row order and the per-entry spans, nets and appended rows."""
+        size = held_bytes(self.order) + sys.getsizeof(self.unbalanced)
+        # Spans map an int key to a tuple of two ints; nets an int key to an int
+        size += sys.getsizeof(self.spans) + len(self.spans) * (sys.getsizeof((0, 0)) + 3 * INT_BYTES)
+        size += sys.getsizeof(self.nets) + len(self.nets) * 2 * INT_BYTES
+        size += sys.getsizeof(self.added) + sum(INT_BYTES + held_bytes(rows) for rows in self.added.values())
+        return size
+
+    def lines(self, entry_id):
+        """Return the row numbers of one entry, in row order."""
+        lo, hi = self.spans.get(entry_id, (0, 0))
+        return self.order[lo:hi] + self.added.get(entry_id, array("i"))
+
+    def add(self, store, start, stop):
+        """Index rows [start, stop) of `store`."""
+        touched = set()
+        debits = store.debits
+        credits = store.credits
+        for row, entry_id in enumerate(store.entry_ids[start:stop], start):
+            if entry_id == NO_ENTRY:
+                continue
+            entry_rows = self.added.get(entry_id)
+            if entry_rows is None:
+                entry_rows = self.added[entry_id] = array("i")
+            entry_rows.append(row)
+            self.nets[entry_id] = self.nets.get(entry_id, 0) + debits[row] - credits[row]
+            touched.add(entry_id)
+        for entry_id in touched:
+            if self.nets[entry_id]:
+                self.unbalanced.add(entry_id)
+            else:
+                self.unbalanced.discard(entry_id)
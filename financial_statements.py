@@ -1,14 +1,93 @@
-import pandas as pd
 from datetime import datetime
 
+from chart_of_accounts import ACCOUNT_TYPES, DEFAULT_CHART, classify_account  # classify_account re-exported
+from instrumentation import timed
+from ledger_io import LEDGER_HEADER
+from ledger_store import CENTS_PER_UNIT, to_ordinal
+
+# Excel's hard limit on rows per worksheet
+EXCEL_MAX_ROWS = 1_048_576
+
+# Ledger rows fetched from the store per chunk while exporting
+EXPORT_CHUNK_ROWS = 50_000
+
+def to_units(cents_by_key):
+    return {key: cents / CENTS_PER_UNIT for key, cents in cents_by_key.items()}
+
+class StatementEngine:
+    """Classifies every account once and aggregates a single balance snapshot
+    into the figures shared by all three statements.
+
+    balances are cumulative up to end_date (what the balance sheet and ending
+    equity report); period_balances cover only [start_date, end_date] and
+    drive revenue, expenses and net income; opening_balances are cumulative
+    up to the day before start_date (beginning equity). All come from the
+    ledger's period snapshots or indexes, so a period costs
+    O(accounts * log dates) rather than a scan.
+    Every sum is taken in integer cents (the *_cents attributes) and only
+    converted to currency units for display, so totals are exact. Account
+    types come from the chart of accounts (DEFAULT_CHART unless given).
+    """
+
+    @timed("statement_engine")
+    def __init__(self, ledger, start_date=None, end_date=None, chart=None):
+        self.ledger = ledger
+        self.chart = chart if chart is not None else DEFAULT_CHART
+        self.start_date = start_date
+        self.end_date = end_date
+        # {account: (debit_cents, credit_cents)}, cumulative and over the period
+        self.total_sums = ledger.get_period_totals_cents(end_date=end_date)
+        if start_date is None:
+            self.period_sums = self.total_sums
+            self.opening_balance_cents = {}
+        else:
+            self.period_sums = ledger.get_period_totals_cents(start_date, end_date)
+            self.opening_balance_cents = ledger.get_balances_cents(end_date=to_ordinal(start_date) - 1)
+        self.balance_cents = {account: debit - credit for account, (debit, credit) in self.total_sums.items()}
+        self.period_balance_cents = (self.balance_cents if start_date is None else
+                                     {account: debit - credit for account, (debit, credit) in self.period_sums.items()})
+        self.account_cents = {category: {} for category in ACCOUNT_TYPES}
+        classify = self.chart.classify
+        for account, balance in self.balance_cents.items():
+            category = classify(account)
+            if category is not None:
+                self.account_cents[category][account] = balance
+        self.total_cents = {category: sum(accounts.values())
+                            for category, accounts in self.account_cents.items()}
+        self.revenue_cents = sum(self.period_balance_cents.get(acc, 0) for acc in self.account_cents['revenue'])
+        self.expenses_cents = sum(self.period_balance_cents.get(acc, 0) for acc in self.account_cents['expense'])
+        self.net_income_cents = self.revenue_cents - self.expenses_cents
+
+        self.balances = to_units(self.balance_cents)
+        self.opening_balances = to_units(self.opening_balance_cents)
+        self.period_balances = (self.balances if start_date is None
+                                else to_units(self.period_balance_cents))
+        self.accounts = {category: to_units(accounts) for category, accounts in self.account_cents.items()}
+        self.revenue = self.revenue_cents / CENTS_PER_UNIT
+        self.expenses = self.expenses_cents / CENTS_PER_UNIT
+        self.net_income = self.net_income_cents / CENTS_PER_UNIT
+
 class FinancialStatement:
-    def __init__(self, ledger):
+    # Column order of the rows returned by to_records()
+    COLUMNS = ()
+
+    def __init__(self, ledger, engine=None, start_date=None, end_date=None):
         self.ledger = ledger
-        self.balances = ledger.get_account_balances()
+        self.engine = engine if engine is not None else StatementEngine(ledger, start_date, end_date)
+        self.balances = self.engine.balances
+
+    def to_records(self):
+        raise NotImplementedError
+
+    def to_dataframe(self):
+        import pandas as pd  # Imported on demand; headless use never needs it
+        return pd.DataFrame(self.to_records(), columns=list(self.COLUMNS))
 
 class IncomeStatement(FinancialStatement):
-    def __init__(self, ledger, start_date=None, end_date=None):
-        super().__init__(ledger)
+    COLUMNS = ('Category', 'Amount')
+
+    def __init__(self, ledger, start_date=None, end_date=None, engine=None):
+        super().__init__(ledger, engine, start_date, end_date)
         self.start_date = start_date
         self.end_date = end_date
         self.revenue = 0
@@ -17,70 +96,59 @@ class IncomeStatement(FinancialStatement):
         self.calculate()
 
     def calculate(self):
-        # Revenue accounts typically end with "Revenue" or "Income"
-        revenue_accounts = [acc for acc in self.balances.keys() 
-                          if acc.lower().endswith(('revenue', 'income', 'sales'))]
-        self.revenue = sum(self.balances[acc] for acc in revenue_accounts)
+        self.revenue = self.engine.revenue
+        self.expenses = self.engine.expenses
+        self.net_income = self.engine.net_income
 
-        # Expense accounts typically end with "Expense" or "Cost"
-        expense_accounts = [acc for acc in self.balances.keys() 
-                          if acc.lower().endswith(('expense', 'cost'))]
-        self.expenses = sum(self.balances[acc] for acc in expense_accounts)
-
-        self.net_income = self.revenue - self.expenses
-
-    def to_dataframe(self):
-        return pd.DataFrame({
-            'Category': ['Revenue', 'Expenses', 'Net Income'],
-            'Amount': [self.revenue, self.expenses, self.net_income]
-        })
+    def to_records(self):
+        return [
+            {'Category': 'Revenue', 'Amount': self.revenue},
+            {'Category': 'Expenses', 'Amount': self.expenses},
+            {'Category': 'Net Income', 'Amount': self.net_income},
+        ]
 
 class BalanceSheet(FinancialStatement):
-    def __init__(self, ledger):
-        super().__init__(ledger)
+    COLUMNS = ('Category', 'Account', 'Amount')
+
+    def __init__(self, ledger, engine=None):
+        super().__init__(ledger, engine)
         self.assets = {}
         self.liabilities = {}
         self.equity = {}
         self.calculate()
 
     def calculate(self):
-        # Asset accounts typically end with "Asset" or are specific asset types
-        self.assets = {acc: bal for acc, bal in self.balances.items() 
-                      if acc.lower().endswith(('asset', 'cash', 'receivable', 'inventory'))}
-
-        # Liability accounts typically end with "Liability" or "Payable"
-        self.liabilities = {acc: bal for acc, bal in self.balances.items() 
-                          if acc.lower().endswith(('liability', 'payable', 'debt'))}
-
-        # Equity accounts typically end with "Equity" or "Capital"
-        self.equity = {acc: bal for acc, bal in self.balances.items() 
-                      if acc.lower().endswith(('equity', 'capital', 'retained earnings'))}
+        self.assets = dict(self.engine.accounts['asset'])
+        self.liabilities = dict(self.engine.accounts['liability'])
+        self.equity = dict(self.engine.accounts['equity'])
 
-    def to_dataframe(self):
+    def to_records(self):
         data = []
         # Add assets
         data.extend([{'Category': 'Assets', 'Account': acc, 'Amount': bal} 
                     for acc, bal in self.assets.items()])
         data.append({'Category': 'Assets', 'Account': 'Total Assets', 
-                    'Amount': sum(self.assets.values())})
+                    'Amount': self.engine.total_cents['asset'] / CENTS_PER_UNIT})
         
         # Add liabilities
         data.extend([{'Category': 'Liabilities', 'Account': acc, 'Amount': bal} 
                     for acc, bal in self.liabilities.items()])
         data.append({'Category': 'Liabilities', 'Account': 'Total Liabilities', 
-                    'Amount': sum(self.liabilities.values())})
+                    'Amount': self.engine.total_cents['liability'] / CENTS_PER_UNIT})
         
         # Add equity
         data.extend([{'Category': 'Equity', 'Account': acc, 'Amount': bal} 
                     for acc, bal in self.equity.items()])
         data.append({'Category': 'Equity', 'Account': 'Total Equity', 
-                    'Amount': sum(self.equity.values())})
+                    'Amount': self.engine.total_cents['equity'] / CENTS_PER_UNIT})
         
-        return pd.DataFrame(data)
+        return data
 
 class StatementOfEquity(FinancialStatement):
-    def __init__(self, ledger, start_date=None, end_date=None):
-        super().__init__(ledger)
+    COLUMNS = ('Account', 'Category', 'Amount')
+
+    def __init__(self, ledger, start_date=None, end_date=None, engine=None):
+        super().__init__(ledger, engine, start_date, end_date)
         self.start_date = start_date
         self.end_date = end_date
         self.beginning_equity = {}
@@ -91,23 +159,21 @@ class StatementOfEquity(FinancialStatement):
         self.calculate()
 
     def calculate(self):
-        # Get income statement for net income
-        income_stmt = IncomeStatement(self.ledger, self.start_date, self.end_date)
-        self.net_income = income_stmt.net_income
-
-        # Equity accounts
-        equity_accounts = [acc for acc in self.balances.keys() 
-                         if acc.lower().endswith(('equity', 'capital', 'retained earnings'))]
-        
-        # Calculate changes in equity
-        for account in equity_accounts:
-            self.ending_equity[account] = self.balances[account]
-            # This is a simplified calculation - in a real system, you'd track historical values
-            self.beginning_equity[account] = 0
-            self.contributions[account] = 0
-            self.distributions[account] = 0
-
-    def to_dataframe(self):
+        # Net income comes from the shared engine rather than a second IncomeStatement
+        self.net_income = self.engine.net_income
+
+        # Beginning balances are the closing balances of the day before the period;
+        # credits in the period are contributions and debits distributions, so
+        # beginning + contributions + distributions = ending (debit - credit)
+        engine = self.engine
+        for account, balance in engine.accounts['equity'].items():
+            debit, credit = engine.period_sums.get(account, (0, 0))
+            self.ending_equity[account] = balance
+            self.beginning_equity[account] = engine.opening_balances.get(account, 0)
+            self.contributions[account] = -credit / CENTS_PER_UNIT
+            self.distributions[account] = debit / CENTS_PER_UNIT
+
+    def to_records(self):
         data = []
         for account in self.ending_equity.keys():
             data.extend([
@@ -122,31 +188,54 @@ class StatementOfEquity(FinancialStatement):
                 {'Account': account, 'Category': 'Ending Balance', 
                  'Amount': self.ending_equity[account]}
             ])
-        return pd.DataFrame(data)
-
-def export_to_excel(ledger, filename):
-    """Export all financial statements to an Excel file."""
-    with pd.ExcelWriter(filename) as writer:
-        # Export Income Statement
-        income_stmt = IncomeStatement(ledger)
-        income_stmt.to_dataframe().to_excel(writer, sheet_name='Income Statement', index=False)
-        
-        # Export Balance Sheet
-        balance_sheet = BalanceSheet(ledger)
-        balance_sheet.to_dataframe().to_excel(writer, sheet_name='Balance Sheet', index=False)
-        
-        # Export Statement of Equity
-        equity_stmt = StatementOfEquity(ledger)
-        equity_stmt.to_dataframe().to_excel(writer, sheet_name='Statement of Equity', index=False)
-        
-        # Export General Ledger
-        ledger_data = []
-        for transaction in ledger.transactions:
-            ledger_data.append({
-                'Date': transaction.date,
-                'Account': transaction.account,
-                'Debit': transaction.debit,
-                'Credit': transaction.credit,
-                'Description': transaction.description
-            })
-        pd.DataFrame(ledger_data).to_excel(writer, sheet_name='General Ledger', index=False) 
\ No newline at end of file
+        return data
+
+def write_statement_sheet(workbook, title, statement):
+    sheet = workbook.create_sheet(title)
+    sheet.append(list(statement.COLUMNS))
+    for record in statement.to_records():
+        sheet.append([record[column] for column in statement.COLUMNS])
+
+@timed("export_to_excel")
+def export_to_excel(ledger, filename, row_count=None, chunk_size=EXPORT_CHUNK_ROWS, progress=None):
+    """Export all financial statements to an Excel file.
+
+    The workbook is written in openpyxl's write-only mode and the General
+    Ledger sheet is streamed from the ledger store chunk by chunk, so memory
+    stays flat however many rows are exported. Rows past Excel's sheet limit
+    continue on "General Ledger 2", "General Ledger 3", ... row_count limits
+    the export to a snapshot of the ledger; progress(done, total) is called
+    after each chunk.
+    """
+    from openpyxl import Workbook  # Imported on demand; only exports need it
+
+    workbook = Workbook(write_only=True)
+
+    # All three statements come from one shared computation
+    engine = StatementEngine(ledger)
+    write_statement_sheet(workbook, 'Income Statement', IncomeStatement(ledger, engine=engine))
+    write_statement_sheet(workbook, 'Balance Sheet', BalanceSheet(ledger, engine=engine))
+    write_statement_sheet(workbook, 'Statement of Equity', StatementOfEquity(ledger, engine=engine))
+
+    # Export General Ledger
+    total = len(ledger.transactions) if row_count is None else row_count
+    rows_per_sheet = EXCEL_MAX_ROWS - 1  # Leave room for the header row
+    sheet = None
+    sheet_number = 0
+    rows_in_sheet = rows_per_sheet
+    for start in range(0, max(total, 1), chunk_size):
+        stop = min(start + chunk_size, total)
+        for row in ledger.get_rows(start, stop):
+            if rows_in_sheet == rows_per_sheet:
+                sheet_number += 1
+                sheet = workbook.create_sheet(
+                    'General Ledger' if sheet_number == 1 else f'General Ledger {sheet_number}')
+                sheet.append(LEDGER_HEADER)
+                rows_in_sheet = 0
+            sheet.append(row)
+            rows_in_sheet += 1
+        if progress is not None:
+            progress(stop, total)
+    if sheet is None:
+        workbook.create_sheet('General Ledger').append(LEDGER_HEADER)
+    workbook.save(filename)
@@ -1,71 +1,32 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, simpledialog
 import csv
-from financial_statements import IncomeStatement, BalanceSheet, StatementOfEquity, export_to_excel
-
-class Transaction:
-    def __init__(self, date, account, debit, credit, description):
-        self.date = date
-        self.account = account
-        self.debit = float(debit)
-        self.credit = float(credit)
-        self.description = description
-
-class GeneralLedger:
-    def __init__(self):
-        self.transactions = []
-
-    def add_transaction(self, date, account, debit, credit, description):
-        if debit >= 0 and credit >= 0 and debit != credit:  # Basic validation
-            self.transactions.append(Transaction(date, account, debit, credit, description))
-        else:
-            print("Invalid transaction: Debits and credits must be non-negative and unequal.")
-
-    def display_ledger(self):
-        print("Date\t\tAccount\t\tDebit\t\tCredit\t\tDescription")
-        print("-" * 80)
-        for transaction in self.transactions:
-            print(f"{transaction.date}\t{transaction.account}\t\t{transaction.debit:.2f}\t\t{transaction.credit:.2f}\t\t{transaction.description}")
-
-    def get_account_balances(self):
-        balances = {}
-        for transaction in self.transactions:
-            if transaction.account not in balances:
-                balances[transaction.account] = 0
-            balances[transaction.account] += transaction.debit - transaction.credit
-        return balances
-
-    def generate_t_accounts(self):
-        t_accounts = {}
-        for transaction in self.transactions:
-            account = transaction.account
-            debit = transaction.debit
-            credit = transaction.credit
-
-            if account not in t_accounts:
-                t_accounts[account] = {"debits": [], "credits": [], "balance": 0}
-
-            if debit > 0:
-                t_accounts[account]["debits"].append(debit)
-                t_accounts[account]["balance"] += debit
-            elif credit > 0:
-                t_accounts[account]["credits"].append(credit)
-                t_accounts[account]["balance"] -= credit
-        return t_accounts
-
-    def display_t_accounts(self):
-        t_accounts = self.generate_t_accounts()
-        for account, data in t_accounts.items():
-            print(f"\n{'='*20} {account} {'='*20}")
-            print(f"{'Debits':<15} | {'Credits':>15}")
-            print("-" * 31)
-            max_lines = max(len(data["debits"]), len(data["credits"]))
-            for i in range(max_lines):
-                debit = f"{data['debits'][i]:.2f}" if i < len(data["debits"]) else ""
-                credit = f"{data['credits'][i]:.2f}" if i < len(data["credits"]) else ""
-                print(f"{debit:<15} | {credit:>15}")
-            print("-" * 31)
-            print(f"{'Balance:':<15} | {data['balance']:>15.2f}")
+import os
+from chart_of_accounts import DEFAULT_CHART
+from ledger import GeneralLedger, Transaction  # Transaction re-exported for existing imports
+from ledger_io import SQLITE_EXTENSIONS, is_sqlite_file, load_csv, save_csv
+from ledger_format import FILE_EXTENSION, is_ledger_file
+from ledger_store import to_ordinal
+from journal import CHECKPOINT_RECORDS, checkpoint, open_ledger
+from sqlite_ledger import SqliteLedger, copy_ledger
+from jobs import JobRunner
+from ledger_view import VirtualLedgerView
+from t_account_view import TAccountViewer
+from financial_statements import StatementEngine, IncomeStatement, BalanceSheet, StatementOfEquity, export_to_excel
+from tax_forms import FORM_1065, FORM_1120, evaluate_forms
+from workspace import Workspace
+from refresh import RefreshScheduler, statements_affected, tax_forms_affected
+from diagnostics_view import DiagnosticsViewer
+from instrumentation import measure
+
+JOURNAL_COMMIT_MS = 1000
+
+# Delay after the last keystroke before the ledger filter runs
+FILTER_DELAY_MS = 150
+
+LEDGER_FILETYPES = [("CSV files", "*.csv"), ("Ledger files", f"*{FILE_EXTENSION}"),
+                    ("SQLite ledgers", " ".join(f"*{extension}" for extension in SQLITE_EXTENSIONS)),
+                    ("All files", "*.*")]
 
 class LedgerApp:
     def __init__(self, master):
@@ -73,54 +34,16 @@ class LedgerApp:
         master.title("General Ledger V3")
 
         self.ledger = GeneralLedger()
+        self.workspace = None  # Open multi-entity workspace, if any
+        self.jobs = JobRunner(master)
+        self.statements_generation = 0
+        self.filter_after_id = None
+        master.after(JOURNAL_COMMIT_MS, self.commit_journal)
+        master.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        # Predefined accounts
-        self.accounts = [
-            # Assets
-            "Cash",
-            "Accounts Receivable",
-            "Inventory",
-            "Prepaid Expenses",
-            "Equipment",
-            "Buildings",
-            "Land",
-            "Accumulated Depreciation",
-            
-            # Liabilities
-            "Accounts Payable",
-            "Notes Payable",
-            "Salaries Payable",
-            "Interest Payable",
-            "Unearned Revenue",
-            "Deferred Revenue",
-            
-            # Equity
-            "Common Stock",
-            "Retained Earnings",
-            "Owner's Capital",
-            "Owner's Draw",
-            
-            # Revenue
-            "Sales Revenue",
-            "Service Revenue",
-            "Interest Revenue",
-            "Rent Revenue",
-            
-            # Expenses
-            "COGS",
-            "Salaries Expense",
-            "Rent Expense",
-            "Utilities Expense",
-            "Insurance Expense",
-            "Depreciation Expense",
-            "Interest Expense",
-            "Advertising Expense",
-            "Office Supplies Expense",
-            "Maintenance Expense",
-            
-            # Custom Account (will be handled separately)
-            "Custom Account"
-        ]
+        # Predefined accounts, from the chart of accounts in account-number order
+        self.chart = DEFAULT_CHART
+        self.accounts = self.chart.names() + ["Custom Account"]  # Custom accounts are handled separately
 
         # Create notebook for tabs
         self.notebook = ttk.Notebook(master)
@@ -143,6 +66,116 @@ class LedgerApp:
         # --- Tax Export Tab ---
         self.setup_tax_export_tab()
 
+        # --- Background job status ---
+        self.setup_status_bar()
+
+        # --- View refreshes after ledger changes ---
+        self.setup_refresh()
+
+    def setup_status_bar(self):
+        status_frame = ttk.Frame(self.master)
+        status_frame.pack(fill='x', padx=5, pady=(0, 5))
+
+        self.status_var = tk.StringVar(value="Ready")
+        ttk.Label(status_frame, textvariable=self.status_var).pack(side='left', padx=5)
+
+        self.cancel_button = ttk.Button(status_frame, text="Cancel", command=self.jobs.cancel_all,
+                                        state='disabled')
+        self.cancel_button.pack(side='right', padx=5)
+
+        self.progress_bar = ttk.Progressbar(status_frame, mode='determinate', length=200)
+        self.progress_bar.pack(side='right', padx=5)
+
+    def setup_refresh(self):
+        # Each view is recomputed only while visible, and only if a change touches what it shows
+        self.refresh = RefreshScheduler(self.master)
+        selected = lambda tab: lambda: self.notebook.select() == str(tab)
+        self.refresh.add_view("ledger", self.refresh_ledger_view, selected(self.transactions_tab))
+        self.refresh.add_view("t_accounts",
+                              lambda change: self.t_account_viewer.refresh(None if change.everything else change.accounts),
+                              self.t_account_viewer.is_open)
+        self.refresh.add_view("statements", lambda change: self.update_financial_statements(),
+                              selected(self.statements_tab), statements_affected(self.chart))
+        self.refresh.add_view("tax_forms", lambda change: self.update_tax_forms(), selected(self.tax_export_tab),
+                              tax_forms_affected(self.chart, (FORM_1120, FORM_1065)))
+        self.notebook.bind("<<NotebookTabChanged>>", lambda event: self.refresh.shown())
+
+    def refresh_ledger_view(self, change):
+        if change.everything:
+            self.update_ledger_display()
+        elif self.ledger_view.rows is None:
+            self.ledger_view.row_appended()
+        else:
+            criteria = self.filter_criteria()
+            accounts = None if criteria["account"] is None else [criteria["account"]]
+            try:
+                start, end = to_ordinal(criteria["start_date"]), to_ordinal(criteria["end_date"])
+            except ValueError:
+                return
+            if change.touches(accounts, start, end):
+                self.apply_filter(keep_position=True)  # New rows may match the filter
+
+    def ledger_replaced(self):
+        # Every view is out of date; the visible ones are redrawn now
+        self.refresh.invalidate()
+        self.refresh.flush()
+
+    def run_job(self, name, func, on_done, error_title):
+        """Run func(job) in the background, tracking it in the status bar."""
+        def done(job, result):
+            self.job_finished(f"{job.name} finished")
+            on_done(result)
+
+        def failed(job, error):
+            self.job_finished(f"{job.name} failed")
+            messagebox.showerror("Error", f"{error_title}: {error}")
+
+        def cancelled(job):
+            self.job_finished(f"{job.name} cancelled")
+
+        self.status_var.set(f"{name}...")
+        self.progress_bar.configure(mode='indeterminate')
+        self.progress_bar.start()
+        self.cancel_button.configure(state='normal')
+        return self.jobs.submit(name, func, done, on_error=failed,
+                                on_progress=self.show_job_progress, on_cancel=cancelled)
+
+    def show_job_progress(self, job):
+        done, total = job.progress
+        if total:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode='determinate', maximum=total, value=done)
+            self.status_var.set(f"{job.name}... {100 * done // total}%")
+
+    def job_finished(self, message):
+        if not self.jobs.active_jobs:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode='determinate', value=0)
+            self.cancel_button.configure(state='disabled')
+        self.status_var.set(message)
+
+    def commit_journal(self):
+        # Bounds how long an entry can sit in the journal without an fsync
+        with self.ledger.write_lock:
+            if self.ledger.journal is not None:
+                self.ledger.journal.commit()
+        self.master.after(JOURNAL_COMMIT_MS, self.commit_journal)
+
+    def on_close(self):
+        self.jobs.shutdown()
+        self.release_ledger()
+        if self.workspace is not None:
+            self.workspace.close()
+        self.master.destroy()
+
+    def release_ledger(self):
+        # A workspace entity stays open in its workspace until spilled; other ledgers are closed here
+        if self.workspace is not None and self.workspace.holds(self.ledger):
+            self.workspace.active = None
+            return
+        with self.ledger.write_lock:
+            self.ledger.close_journal()
+
     def setup_transactions_tab(self):
         # Input Section
         input_frame = ttk.LabelFrame(self.transactions_tab, text="Add Transaction")
@@ -190,13 +223,14 @@ class LedgerApp:
         ledger_frame = ttk.LabelFrame(self.transactions_tab, text="General Ledger")
         ledger_frame.pack(fill='both', expand=True, padx=5, pady=5)
 
-        self.ledger_tree = ttk.Treeview(ledger_frame, columns=("Date", "Account", "Debit", "Credit", "Description"))
-        self.ledger_tree.heading("#1", text="Date")
-        self.ledger_tree.heading("#2", text="Account")
-        self.ledger_tree.heading("#3", text="Debit")
-        self.ledger_tree.heading("#4", text="Credit")
-        self.ledger_tree.heading("#5", text="Description")
-        self.ledger_tree.pack(fill='both', expand=True, padx=5, pady=5)
+        self.setup_filter_bar(ledger_frame)
+
+        # Only the visible page of rows is materialised in the Treeview
+        self.ledger_view = VirtualLedgerView(ledger_frame, lambda: self.ledger)
+        self.ledger_view.pack(fill='both', expand=True, padx=5, pady=5)
+        self.ledger_tree = self.ledger_view.tree
+        self.t_account_viewer = TAccountViewer(self.master, lambda: self.ledger)
+        self.diagnostics_viewer = DiagnosticsViewer(self.master)
 
         # Buttons
         button_frame = ttk.Frame(self.transactions_tab)
@@ -217,6 +251,104 @@ class LedgerApp:
         export_excel_button = ttk.Button(button_frame, text="Export to Excel", command=self.export_to_excel)
         export_excel_button.pack(side='left', padx=5)
 
+        diagnostics_button = ttk.Button(button_frame, text="Diagnostics", command=self.diagnostics_viewer.show)
+        diagnostics_button.pack(side='right', padx=5)
+
+        # Workspace of client entities
+        workspace_frame = ttk.LabelFrame(self.transactions_tab, text="Workspace")
+        workspace_frame.pack(fill='x', padx=5, pady=5)
+
+        open_workspace_button = ttk.Button(workspace_frame, text="Open Workspace", command=self.open_workspace)
+        open_workspace_button.pack(side='left', padx=5, pady=5)
+
+        ttk.Label(workspace_frame, text="Entity:").pack(side='left', padx=5)
+        self.entity_var = tk.StringVar()
+        self.entity_dropdown = ttk.Combobox(workspace_frame, textvariable=self.entity_var, state='readonly', width=30)
+        self.entity_dropdown.pack(side='left', padx=5)
+        self.entity_dropdown.bind("<<ComboboxSelected>>", lambda event: self.switch_entity())
+
+        add_entity_button = ttk.Button(workspace_frame, text="Add Entity", command=self.add_entity)
+        add_entity_button.pack(side='left', padx=5)
+
+        batch_close_button = ttk.Button(workspace_frame, text="Batch Close", command=self.batch_close)
+        batch_close_button.pack(side='left', padx=5)
+
+    def setup_filter_bar(self, parent):
+        filter_frame = ttk.Frame(parent)
+        filter_frame.pack(fill='x', padx=5, pady=(5, 0))
+
+        # Filters re-run shortly after the last keystroke
+        self.filter_vars = {}
+        for name, label, width in (("text", "Search:", 24), ("start_date", "From:", 11), ("end_date", "To:", 11),
+                                   ("min_amount", "Min:", 9), ("max_amount", "Max:", 9)):
+            ttk.Label(filter_frame, text=label).pack(side='left', padx=(5, 2))
+            var = tk.StringVar()
+            var.trace_add("write", lambda *args: self.schedule_filter())
+            ttk.Entry(filter_frame, textvariable=var, width=width).pack(side='left')
+            self.filter_vars[name] = var
+            if name == "text":
+                ttk.Label(filter_frame, text="Account:").pack(side='left', padx=(5, 2))
+                self.filter_account_var = tk.StringVar()
+                self.filter_account_dropdown = ttk.Combobox(filter_frame, textvariable=self.filter_account_var,
+                                                            state='readonly', width=28,
+                                                            postcommand=self.update_account_facets)
+                self.filter_account_dropdown.pack(side='left')
+                self.filter_account_dropdown.bind("<<ComboboxSelected>>", lambda event: self.apply_filter())
+                self.filter_accounts = {}  # Dropdown label -> account name
+
+        ttk.Button(filter_frame, text="Clear", command=self.clear_filter).pack(side='left', padx=5)
+        self.filter_status_var = tk.StringVar()
+        ttk.Label(filter_frame, textvariable=self.filter_status_var).pack(side='left', padx=5)
+
+    def filter_criteria(self):
+        criteria = {name: var.get().strip() or None for name, var in self.filter_vars.items()}
+        criteria["text"] = criteria["text"] or ""
+        criteria["account"] = self.filter_accounts.get(self.filter_account_var.get())
+        return criteria
+
+    def schedule_filter(self):
+        if self.filter_after_id is not None:
+            self.master.after_cancel(self.filter_after_id)
+        self.filter_after_id = self.master.after(FILTER_DELAY_MS, self.apply_filter)
+
+    def apply_filter(self, keep_position=False):
+        self.filter_after_id = None
+        criteria = self.filter_criteria()
+        if not any(criteria.values()):
+            self.filter_status_var.set("")
+            self.ledger_view.set_filter(None, keep_position)
+            return
+        try:
+            # Served from the search index; fast enough to run on every keystroke
+            rows = self.ledger.search(**criteria)
+        except ValueError as error:
+            self.filter_status_var.set(f"Invalid filter: {error}")
+            return
+        self.filter_status_var.set(f"{len(rows):,} of {len(self.ledger.transactions):,} rows")
+        self.ledger_view.set_filter(rows, keep_position)
+
+    def update_account_facets(self):
+        # Facet counts: rows per account matching the other filters
+        criteria = self.filter_criteria()
+        criteria["account"] = None
+        try:
+            counts = self.ledger.account_counts(self.ledger.search(**criteria))
+        except ValueError:
+            counts = {}
+        self.filter_accounts = {"All accounts": None}
+        self.filter_accounts.update((f"{account} ({count:,})", account) for account, count in counts.items())
+        selected = self.filter_accounts.get(self.filter_account_var.get())
+        self.filter_account_dropdown.configure(values=list(self.filter_accounts))
+        for label, account in self.filter_accounts.items():
+            if account == selected:
+                self.filter_account_var.set(label)  # Keep the selection with its new count
+
+    def clear_filter(self):
+        for var in self.filter_vars.values():
+            var.set("")
+        self.filter_account_var.set("")
+        self.apply_filter()
+
     def setup_statements_tab(self):
         # Create frames for each statement
         income_frame = ttk.LabelFrame(self.statements_tab, text="Income Statement")
@@ -308,12 +440,9 @@ class LedgerApp:
         description = self.description_entry.get()
 
         try:
-            debit = float(debit_str) if debit_str else 0.0
-            credit = float(credit_str) if credit_str else 0.0
-            self.ledger.add_transaction(date, account, debit, credit, description)
-            self.update_ledger_display()
-            self.update_t_account_display()
-            self.update_financial_statements()
+            # Amounts go to the ledger as text so they are converted to cents exactly
+            self.ledger.add_transaction(date, account, debit_str or 0, credit_str or 0, description)
+            self.refresh.invalidate([account], [date])
             # Clear input fields after adding
             self.date_entry.delete(0, tk.END)
             self.account_dropdown.set(self.accounts[0])  # Reset dropdown to first account
@@ -323,61 +452,53 @@ class LedgerApp:
             self.description_entry.delete(0, tk.END)
             self.use_custom_account.set(False)  # Reset custom account checkbox
             self.toggle_custom_account()  # Update UI
-        except ValueError:
-            messagebox.showerror("Error", "Invalid debit or credit amount.")
+        except ValueError as error:
+            messagebox.showerror("Error", f"Transaction not added: {error}")
 
     def update_ledger_display(self):
-        # Clear existing data in the treeview
-        for item in self.ledger_tree.get_children():
-            self.ledger_tree.delete(item)
-        # Populate with current ledger data
-        for transaction in self.ledger.transactions:
-            self.ledger_tree.insert("", tk.END, values=(
-                transaction.date,
-                transaction.account,
-                f"{transaction.debit:.2f}",
-                f"{transaction.credit:.2f}",
-                transaction.description
-            ))
+        if self.ledger_view.rows is not None:
+            self.apply_filter(keep_position=True)  # Re-run the filter over the current rows
+        else:
+            self.ledger_view.refresh()
 
     def update_t_account_display(self):
-        t_accounts = self.ledger.generate_t_accounts()
-        # Create a new window for T-accounts
-        t_window = tk.Toplevel(self.master)
-        t_window.title("T-Accounts")
-        
-        text = tk.Text(t_window, height=30, width=80)
-        text.pack(padx=10, pady=10)
-        
-        for account, data in t_accounts.items():
-            text.insert(tk.END, f"\n{'='*20} {account} {'='*20}\n")
-            text.insert(tk.END, f"{'Debits':<15} | {'Credits':>15}\n")
-            text.insert(tk.END, "-" * 31 + "\n")
-            
-            max_lines = max(len(data["debits"]), len(data["credits"]))
-            for i in range(max_lines):
-                debit = f"{data['debits'][i]:.2f}" if i < len(data["debits"]) else ""
-                credit = f"{data['credits'][i]:.2f}" if i < len(data["credits"]) else ""
-                text.insert(tk.END, f"{debit:<15} | {credit:>15}\n")
-            
-            text.insert(tk.END, "-" * 31 + "\n")
-            text.insert(tk.END, f"{'Balance:':<15} | {data['balance']:>15.2f}\n")
-        
-        text.config(state='disabled')
+        self.t_account_viewer.show()
+        self.refresh.clean("t_accounts")
 
     def update_financial_statements(self):
+        ledger = self.ledger
+        self.statements_generation += 1
+        generation = self.statements_generation
+
+        def compute(job):
+            # All three statements share one classified balance snapshot
+            engine = StatementEngine(ledger)
+            return (generation,
+                    IncomeStatement(ledger, engine=engine).to_dataframe(),
+                    BalanceSheet(ledger, engine=engine).to_dataframe(),
+                    StatementOfEquity(ledger, engine=engine).to_dataframe())
+
+        self.run_job("Updating statements", compute, self.show_financial_statements,
+                     "Error updating statements")
+
+    def show_financial_statements(self, result):
+        generation, income_df, balance_df, equity_df = result
+        if generation != self.statements_generation:
+            return  # A newer refresh has been requested since this one started
+        with measure("show_financial_statements", len(income_df) + len(balance_df) + len(equity_df)):
+            self.fill_statement_trees(income_df, balance_df, equity_df)
+
+    def fill_statement_trees(self, income_df, balance_df, equity_df):
         # Update Income Statement
         for item in self.income_tree.get_children():
             self.income_tree.delete(item)
-        income_stmt = IncomeStatement(self.ledger)
-        for _, row in income_stmt.to_dataframe().iterrows():
+        for _, row in income_df.iterrows():
             self.income_tree.insert("", tk.END, values=(row['Category'], f"${row['Amount']:.2f}"))
 
         # Update Balance Sheet
         for item in self.balance_tree.get_children():
             self.balance_tree.delete(item)
-        balance_sheet = BalanceSheet(self.ledger)
-        for _, row in balance_sheet.to_dataframe().iterrows():
+        for _, row in balance_df.iterrows():
             self.balance_tree.insert("", tk.END, values=(
                 row['Category'],
                 row['Account'],
@@ -387,8 +508,7 @@ class LedgerApp:
         # Update Statement of Equity
         for item in self.equity_tree.get_children():
             self.equity_tree.delete(item)
-        equity_stmt = StatementOfEquity(self.ledger)
-        for _, row in equity_stmt.to_dataframe().iterrows():
+        for _, row in equity_df.iterrows():
             self.equity_tree.insert("", tk.END, values=(
                 row['Account'],
                 row['Category'],
@@ -396,110 +516,14 @@ class LedgerApp:
             ))
 
     def update_tax_forms(self):
-        # Update Form 1120
-        for item in self.form1120_tree.get_children():
-            self.form1120_tree.delete(item)
-        
-        # Get financial data
-        income_stmt = IncomeStatement(self.ledger)
-        balance_sheet = BalanceSheet(self.ledger)
-        
-        # Form 1120 data
-        form1120_data = [
-            ("1a", "Gross receipts or sales", income_stmt.revenue),
-            ("1b", "Returns and allowances", 0),  # Would need to track this separately
-            ("1c", "Net receipts or sales", income_stmt.revenue),
-            ("2", "Cost of goods sold", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                          for acc in ["COGS"])),
-            ("3", "Gross profit", income_stmt.revenue - sum(self.ledger.get_account_balances().get(acc, 0) 
-                                                          for acc in ["COGS"])),
-            ("4", "Dividends", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                 for acc in ["Dividend Income"])),
-            ("5", "Interest", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                for acc in ["Interest Revenue"])),
-            ("6", "Gross rents", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                   for acc in ["Rent Revenue"])),
-            ("7", "Gross royalties", 0),  # Would need to track this separately
-            ("8", "Capital gain net income", 0),  # Would need to track this separately
-            ("9", "Net gain or loss from Form 4797", 0),  # Would need to track this separately
-            ("10", "Other income", 0),  # Would need to track this separately
-            ("11", "Total income", income_stmt.revenue),
-            ("12", "Compensation of officers", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                                for acc in ["Salaries Expense"])),
-            ("13", "Salaries and wages", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                           for acc in ["Salaries Expense"])),
-            ("14", "Repairs and maintenance", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                                for acc in ["Maintenance Expense"])),
-            ("15", "Bad debts", 0),  # Would need to track this separately
-            ("16", "Rents", sum(self.ledger.get_account_balances().get(acc, 0) 
-                              for acc in ["Rent Expense"])),
-            ("17", "Taxes and licenses", 0),  # Would need to track this separately
-            ("18", "Interest", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                 for acc in ["Interest Expense"])),
-            ("19", "Depreciation", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                     for acc in ["Depreciation Expense"])),
-            ("20", "Depletion", 0),  # Would need to track this separately
-            ("21", "Advertising", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                    for acc in ["Advertising Expense"])),
-            ("22", "Pension, profit-sharing, etc.", 0),  # Would need to track this separately
-            ("23", "Employee benefit programs", 0),  # Would need to track this separately
-            ("24", "Other deductions", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                         for acc in ["Office Supplies Expense", "Utilities Expense", 
-                                                   "Insurance Expense"])),
-            ("25", "Total deductions", income_stmt.expenses),
-            ("26", "Taxable income", income_stmt.net_income)
-        ]
-
-        for line, desc, amount in form1120_data:
-            self.form1120_tree.insert("", tk.END, values=(line, desc, f"${amount:.2f}"))
-
-        # Update Form 1065
-        for item in self.form1065_tree.get_children():
-            self.form1065_tree.delete(item)
-        
-        # Form 1065 data
-        form1065_data = [
-            ("1a", "Gross receipts or sales", income_stmt.revenue),
-            ("1b", "Returns and allowances", 0),  # Would need to track this separately
-            ("1c", "Net receipts or sales", income_stmt.revenue),
-            ("2", "Cost of goods sold", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                          for acc in ["COGS"])),
-            ("3", "Gross profit", income_stmt.revenue - sum(self.ledger.get_account_balances().get(acc, 0) 
-                                                          for acc in ["COGS"])),
-            ("4", "Ordinary income (loss) from other partnerships", 0),  # Would need to track this separately
-            ("5", "Net farm profit (loss)", 0),  # Would need to track this separately
-            ("6", "Net gain (loss) from Form 4797", 0),  # Would need to track this separately
-            ("7", "Other income (loss)", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                           for acc in ["Interest Revenue", "Rent Revenue"])),
-            ("8", "Total income (loss)", income_stmt.revenue),
-            ("9", "Guaranteed payments to partners", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                                      for acc in ["Salaries Expense"])),
-            ("10", "Compensation of partners", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                                for acc in ["Salaries Expense"])),
-            ("11", "Salaries and wages", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                           for acc in ["Salaries Expense"])),
-            ("12", "Repairs and maintenance", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                                for acc in ["Maintenance Expense"])),
-            ("13", "Bad debts", 0),  # Would need to track this separately
-            ("14", "Rents", sum(self.ledger.get_account_balances().get(acc, 0) 
-                              for acc in ["Rent Expense"])),
-            ("15", "Taxes and licenses", 0),  # Would need to track this separately
-            ("16", "Interest", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                 for acc in ["Interest Expense"])),
-            ("17", "Depreciation", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                     for acc in ["Depreciation Expense"])),
-            ("18", "Depletion", 0),  # Would need to track this separately
-            ("19", "Retirement plans", 0),  # Would need to track this separately
-            ("20", "Employee benefit programs", 0),  # Would need to track this separately
-            ("21", "Other deductions", sum(self.ledger.get_account_balances().get(acc, 0) 
-                                         for acc in ["Office Supplies Expense", "Utilities Expense", 
-                                                   "Insurance Expense", "Advertising Expense"])),
-            ("22", "Total deductions", income_stmt.expenses),
-            ("23", "Ordinary business income (loss)", income_stmt.net_income)
-        ]
-
-        for line, desc, amount in form1065_data:
-            self.form1065_tree.insert("", tk.END, values=(line, desc, f"${amount:.2f}"))
+        with measure("update_tax_forms"):
+            # Both forms are evaluated against one balance snapshot
+            forms = evaluate_forms(self.ledger, [FORM_1120.form_id, FORM_1065.form_id])
+            for tree, form in ((self.form1120_tree, FORM_1120), (self.form1065_tree, FORM_1065)):
+                for item in tree.get_children():
+                    tree.delete(item)
+                for line, desc, amount in forms[form.form_id]:
+                    tree.insert("", tk.END, values=(line, desc, f"${amount:.2f}"))
 
     def export_form_1120(self):
         filepath = filedialog.asksaveasfilename(
@@ -538,53 +562,179 @@ class LedgerApp:
     def save_ledger(self):
         filepath = filedialog.asksaveasfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            filetypes=LEDGER_FILETYPES
         )
         if filepath:
-            try:
-                with open(filepath, 'w', newline='') as csvfile:
-                    writer = csv.writer(csvfile)
-                    writer.writerow(["Date", "Account", "Debit", "Credit", "Description"])
-                    for transaction in self.ledger.transactions:
-                        writer.writerow([
-                            transaction.date,
-                            transaction.account,
-                            transaction.debit,
-                            transaction.credit,
-                            transaction.description
-                        ])
+            ledger = self.ledger
+            if isinstance(ledger, SqliteLedger) and os.path.abspath(ledger.file_path) == os.path.abspath(filepath):
+                # Every entry was committed to the database as it was added
                 messagebox.showinfo("Success", "Ledger saved successfully!")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error saving ledger: {e}")
+                return
+            if is_sqlite_file(filepath):
+                if os.path.exists(filepath):
+                    messagebox.showerror("Error saving ledger", "Save to a new database file.")
+                    return
+                row_count = len(ledger.transactions)
+
+                def save(job):
+                    target = SqliteLedger(filepath)
+                    try:
+                        return copy_ledger(ledger, target, row_count, progress=job.report_progress)
+                    finally:
+                        target.close()
+            elif isinstance(ledger, SqliteLedger) and is_ledger_file(filepath):
+                messagebox.showerror("Error saving ledger", "Save a database-backed ledger as CSV or SQLite.")
+                return
+            elif is_ledger_file(filepath):
+                if self.is_journaled_to(filepath) and ledger.journal.record_count < CHECKPOINT_RECORDS:
+                    # Every entry is already in the journal; saving just makes it durable
+                    with ledger.write_lock:
+                        ledger.journal.commit()
+                    messagebox.showinfo("Success", "Ledger saved successfully!")
+                    return
+                # Write the base file and (re)start its journal; this also compacts it
+                save = lambda job: checkpoint(ledger, filepath)
+            else:
+                # Save the rows that exist now; entries added meanwhile are left for the next save
+                row_count = len(ledger.transactions)
+                save = lambda job: save_csv(ledger, filepath, row_count, progress=job.report_progress)
+            self.run_job("Saving ledger", save,
+                         lambda rows: messagebox.showinfo("Success", "Ledger saved successfully!"),
+                         "Error saving ledger")
 
     def load_ledger(self):
         filepath = filedialog.askopenfilename(
             defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            filetypes=LEDGER_FILETYPES
         )
         if filepath:
-            try:
-                self.ledger.transactions = []
-                with open(filepath, 'r', newline='') as csvfile:
-                    reader = csv.reader(csvfile)
-                    next(reader, None)  # Skip the header row
-                    for row in reader:
-                        if len(row) == 5:
-                            date, account, debit, credit, description = row
-                            try:
-                                debit = float(debit)
-                                credit = float(credit)
-                                self.ledger.add_transaction(date, account, debit, credit, description)
-                            except ValueError:
-                                messagebox.showerror("Error", f"Invalid numeric data in CSV: {row}")
-                self.update_ledger_display()
-                self.update_t_account_display()
-                self.update_financial_statements()
-                messagebox.showinfo("Success", "Ledger loaded successfully!")
-            except FileNotFoundError:
-                messagebox.showerror("Error", "File not found.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error loading ledger: {e}")
+            def load(job):
+                # Build a fresh ledger off-thread; it replaces self.ledger only once complete
+                with measure("load_ledger") as timing:
+                    if is_sqlite_file(filepath):
+                        # Queried in place; nothing is loaded into memory
+                        ledger, report = SqliteLedger(filepath, create=False), None
+                    else:
+                        ledger, report = GeneralLedger(), None
+                        if is_ledger_file(filepath):
+                            open_ledger(ledger, filepath)
+                        else:
+                            report = load_csv(ledger, filepath, progress=job.report_progress)
+                    timing.rows = len(ledger.transactions)
+                return ledger, report
+
+            self.run_job("Loading ledger", load, self.ledger_loaded, "Error loading ledger")
+
+    def is_journaled_to(self, filepath):
+        return (self.ledger.journal is not None
+                and os.path.abspath(self.ledger.file_path) == os.path.abspath(filepath))
+
+    def ledger_loaded(self, result):
+        self.release_ledger()
+        self.ledger, report = result
+        self.ledger_replaced()
+        if report is None:
+            messagebox.showinfo("Success", "Ledger loaded successfully!")
+        elif report.rejected:
+            self.show_rejected_rows(report)
+        else:
+            messagebox.showinfo("Success", f"Ledger loaded successfully!\n{report.summary()}")
+
+    def open_workspace(self):
+        directory = filedialog.askdirectory(mustexist=False)
+        if directory:
+            if self.workspace is not None:
+                if self.workspace.holds(self.ledger):
+                    # The workspace is about to close its entities; keep working on a plain ledger
+                    self.ledger = GeneralLedger()
+                    self.ledger_replaced()
+                self.workspace.close()
+            self.workspace = Workspace(directory)
+            self.refresh_entities()
+            self.entity_var.set("")
+
+    def refresh_entities(self):
+        self.entity_dropdown.configure(values=self.workspace.entities())
+
+    def switch_entity(self):
+        workspace, entity = self.workspace, self.entity_var.get()
+        if workspace is None or not entity:
+            return
+        self.run_job(f"Opening {entity}", lambda job: (workspace.get(entity), entity),
+                     self.entity_loaded, "Error opening entity")
+
+    def entity_loaded(self, result):
+        ledger, entity = result
+        if ledger is not self.ledger:
+            self.release_ledger()
+        self.ledger = ledger
+        self.ledger_replaced()
+        # Only now may the entity shown before be spilled (checkpointed), so do it off the UI thread
+        workspace = self.workspace
+        self.run_job("Trimming workspace", lambda job: workspace.activate(entity),
+                     lambda ledger: self.status_var.set(f"Entity: {entity}"), "Error trimming workspace")
+
+    def add_entity(self):
+        if self.workspace is None:
+            messagebox.showerror("Error", "Open a workspace first.")
+            return
+        entity = simpledialog.askstring("Add Entity", "Entity name:", parent=self.master)
+        if not entity:
+            return
+        source = filedialog.askopenfilename(
+            title="Import the entity's books (cancel to start empty)",
+            filetypes=LEDGER_FILETYPES[:2] + LEDGER_FILETYPES[3:]
+        )
+        workspace = self.workspace
+
+        def added(report):
+            self.refresh_entities()
+            self.entity_var.set(entity)
+            self.switch_entity()
+            if report is not None and report.rejected:
+                self.show_rejected_rows(report)
+
+        self.run_job(f"Adding {entity}", lambda job: workspace.create(entity, source or None), added,
+                     "Error adding entity")
+
+    def batch_close(self):
+        if self.workspace is None:
+            messagebox.showerror("Error", "Open a workspace first.")
+            return
+        workspace = self.workspace
+        self.run_job("Closing entities",
+                     lambda job: workspace.close_entities(progress=job.report_progress),
+                     self.batch_closed, "Error closing entities")
+
+    def batch_closed(self, report):
+        message = report.summary()
+        if report.failed:
+            message += "\n\n" + "\n".join(f"{result['entity']}: {result['error']}" for result in report.failed[:5])
+        save_report = messagebox.askyesno("Batch close", f"{message}\n\nSave the per-entity timing report?")
+        if save_report:
+            filepath = filedialog.asksaveasfilename(
+                defaultextension=".csv",
+                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            )
+            if filepath:
+                report.write_timings(filepath)
+
+    def show_rejected_rows(self, report):
+        # One dialog for the whole file instead of one per bad row
+        preview = "\n".join(f"Row {record}: {reason}" for record, _, reason in report.rejected[:5])
+        if len(report.rejected) > 5:
+            preview += f"\n... and {len(report.rejected) - 5} more"
+        save_report = messagebox.askyesno(
+            "Rows rejected",
+            f"{report.summary()}\n\n{preview}\n\nSave the rejected rows to an error report?"
+        )
+        if save_report:
+            filepath = filedialog.asksaveasfilename(
+                defaultextension=".csv",
+                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
+            )
+            if filepath:
+                report.write_errors(filepath)
 
     def export_to_excel(self):
         filepath = filedialog.asksaveasfilename(
@@ -592,11 +742,13 @@ class LedgerApp:
             filetypes=[("Excel files", "*.xlsx"), ("All files", "*.*")]
         )
         if filepath:
-            try:
-                export_to_excel(self.ledger, filepath)
-                messagebox.showinfo("Success", "Financial statements exported to Excel successfully!")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error exporting to Excel: {e}")
+            ledger = self.ledger
+            row_count = len(ledger.transactions)
+            self.run_job("Exporting to Excel",
+                         lambda job: export_to_excel(ledger, filepath, row_count, progress=job.report_progress),
+                         lambda result: messagebox.showinfo(
+                             "Success", "Financial statements exported to Excel successfully!"),
+                         "Error exporting to Excel")
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,235 @@
+"""Timing instrumentation for ledger operations.
+
+Operations are wrapped with the @timed(name) decorator or with
+`with measure(name, rows) as timing:`. Instrumentation is off by default;
+while it is off a wrapped call only tests one module flag, so it can stay
+on hot paths. Once enable()d, every call records its count, errors,
+latency (a histogram with Prometheus-style buckets) and the rows it
+covered. metrics() returns the figures, and write_metrics() dumps them as
+JSON or Prometheus text.
+
+profile_next(name, path) captures a cProfile trace of the next call of
+one operation into `path`, for reading with pstats or snakeviz.
+"""
+import functools
+import json
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds of the latency histogram buckets, in seconds; a last bucket takes the rest (+Inf)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Prefix of the metric names in the Prometheus dump
+METRIC_PREFIX = "ledger_operation"
+
+_enabled = False
+_lock = threading.Lock()
+_stats = {}  # operation -> OperationStats
+_pending_profiles = {}  # operation -> path its next call is profiled into
+_captured_profiles = []  # (operation, path), oldest first
+_declared = set()  # Operations wrapped by @timed, recorded or not
+
+
+class OperationStats:
+    """Count, errors, latency histogram and rows of one operation."""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def record(self, seconds, rows=None, failed=False):
+        self.count += 1
+        self.errors += failed
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        if rows is not None:
+            self.rows += rows
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def quantile(self, fraction):
+        """Estimated latency below which `fraction` of the calls fell: a bucket bound, or the maximum."""
+        wanted = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return min(bound, self.max_seconds)
+        return self.max_seconds
+
+    def to_dict(self):
+        return {"count": self.count, "errors": self.errors, "seconds": self.seconds,
+                "mean_seconds": self.seconds / self.count if self.count else 0.0,
+                "p50_seconds": self.quantile(0.5), "p95_seconds": self.quantile(0.95),
+                "max_seconds": self.max_seconds, "rows": self.rows,
+                "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"], self.buckets))}
+
+
+class Timing:
+    """Context manager timing one call; set `rows` inside the block if it is only known there."""
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+        self.profiler = None
+        self.profile_path = None
+
+    def __enter__(self):
+        if _pending_profiles:
+            with _lock:
+                self.profile_path = _pending_profiles.pop(self.name, None)
+            if self.profile_path is not None:
+                import cProfile  # Imported on demand, like pstats below
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.started
+        if self.profiler is not None:
+            self.profiler.disable()
+            self.profiler.dump_stats(self.profile_path)
+        with _lock:
+            stats = _stats.get(self.name)
+            if stats is None:
+                stats = _stats[self.name] = OperationStats(self.name)
+            stats.record(seconds, self.rows, exc_type is not None)
+            if self.profiler is not None:
+                _captured_profiles.append((self.name, self.profile_path))
+        return False
+
+
+class _NoTiming:
+    """Stand-in returned by measure() while disabled; `rows` may be set on it and is ignored."""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+_NO_TIMING = _NoTiming()
+
+
+def enable(enabled=True):
+    global _enabled
+    _enabled = enabled
+
+
+def is_enabled():
+    return _enabled
+
+
+def measure(name, rows=None):
+    """Context manager recording one call of operation `name` (nothing while disabled)."""
+    if not _enabled:
+        return _NO_TIMING
+    return Timing(name, rows)
+
+
+def timed(name=None, rows=None):
+    """Decorator recording each call as operation `name` (default: the function's qualified name).
+
+    rows, if given, is called with the return value to count the rows
+    the call covered.
+    """
+    def decorate(func):
+        operation = name or func.__qualname__
+        _declared.add(operation)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Timing(operation) as timing:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    timing.rows = rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def reset():
+    """Forget every recorded call (pending profiles stay armed)."""
+    with _lock:
+        _stats.clear()
+
+
+def metrics():
+    """Return {operation: figures} for every operation called since the last reset, by name."""
+    with _lock:
+        return {name: _stats[name].to_dict() for name in sorted(_stats)}
+
+
+def operations():
+    """Names of every operation wrapped with @timed or recorded so far, sorted."""
+    with _lock:
+        return sorted(_declared.union(_stats))
+
+
+def to_json():
+    return json.dumps({"buckets": list(LATENCY_BUCKETS), "operations": metrics()}, indent=2)
+
+
+def to_prometheus():
+    """Metrics in the Prometheus text exposition format."""
+    histogram = f"{METRIC_PREFIX}_seconds"
+    lines = [f"# HELP {histogram} Latency of ledger operations.", f"# TYPE {histogram} histogram"]
+    operations = metrics()
+    for name, figures in operations.items():
+        label = name.replace("\\", "\\\\").replace('"', '\\"')
+        seen = 0
+        for bound, count in figures["buckets"].items():
+            seen += count
+            lines.append(f'{histogram}_bucket{{operation="{label}",le="{bound}"}} {seen}')
+        lines.append(f'{histogram}_sum{{operation="{label}"}} {figures["seconds"]!r}')
+        lines.append(f'{histogram}_count{{operation="{label}"}} {figures["count"]}')
+    for metric, key, help_text in (("errors_total", "errors", "Ledger operations that raised."),
+                                   ("rows_total", "rows", "Rows covered by ledger operations.")):
+        lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{metric} counter")
+        for name, figures in operations.items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{METRIC_PREFIX}_{metric}{{operation="{label}"}} {figures[key]}')
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    """Dump the metrics to `path`: JSON for a .json file, Prometheus text otherwise."""
+    text = to_json() if path.lower().endswith(".json") else to_prometheus()
+    with open(path, "w") as handle:
+        handle.write(text)
+
+
+def profile_next(name, path):
+    """Capture a cProfile trace of the next call of operation `name` into `path`.
+
+    Only calls made while instrumentation is enabled are profiled.
+    """
+    with _lock:
+        _pending_profiles[name] = path
+
+
+def captured_profiles():
+    """Return [(operation, path)] of the traces captured so far, oldest first."""
+    with _lock:
+        return list(_captured_profiles)
+
+
+def profile_summary(path, limit=30):
+    """The `limit` costliest functions of a captured trace by cumulative time, as text."""
+    import io
+    import pstats
+    output = io.StringIO()
+    pstats.Stats(path, stream=output).sort_stats("cumulative").print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,100 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """Handle shared between a background task and the UI.
+
+    The task calls report_progress(); that is also where a pending cancel
+    takes effect, by raising JobCancelled inside the task.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.progress = None  # (done, total); replaced atomically by the worker
+        self.future = None
+        self._cancel_requested = threading.Event()
+
+    def cancel(self):
+        self._cancel_requested.set()
+
+    @property
+    def cancel_requested(self):
+        return self._cancel_requested.is_set()
+
+    def report_progress(self, done, total=None):
+        if self._cancel_requested.is_set():
+            raise JobCancelled(self.name)
+        self.progress = (done, total)
+
+
+class JobRunner:
+    """Runs heavy ledger work on a thread pool and hands results back on the Tk thread.
+
+    Worker functions receive their Job and must not touch Tk. Completion,
+    error, cancellation and progress callbacks are all invoked from the Tk
+    mainloop by polling with after(), so they are free to update widgets.
+    """
+
+    def __init__(self, master, max_workers=2, poll_interval=100):
+        self.master = master
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ledger-job")
+        self._active = []
+        self._polling = False
+
+    @property
+    def active_jobs(self):
+        return [job for job, _ in self._active]
+
+    def submit(self, name, func, on_done, on_error=None, on_progress=None, on_cancel=None):
+        job = Job(name)
+        job.future = self._executor.submit(func, job)
+        self._active.append((job, {"done": on_done, "error": on_error,
+                                   "progress": on_progress, "cancel": on_cancel,
+                                   "last_progress": None}))
+        if not self._polling:
+            self._polling = True
+            self.master.after(self.poll_interval, self._poll)
+        return job
+
+    def cancel_all(self):
+        for job, _ in self._active:
+            job.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self):
+        current, self._active = self._active, []
+        still_active = []
+        for job, callbacks in current:
+            if callbacks["progress"] and job.progress != callbacks["last_progress"]:
+                callbacks["last_progress"] = job.progress
+                callbacks["progress"](job)
+            if not job.future.done():
+                still_active.append((job, callbacks))
+                continue
+            self._finish(job, callbacks)
+        # Callbacks may have submitted follow-up jobs while we were iterating
+        self._active = still_active + self._active
+        if self._active:
+            self.master.after(self.poll_interval, self._poll)
+        else:
+            self._polling = False
+
+    def _finish(self, job, callbacks):
+        error = job.future.exception() if not job.future.cancelled() else JobCancelled(job.name)
+        if isinstance(error, JobCancelled):
+            if callbacks["cancel"]:
+                callbacks["cancel"](job)
+        elif error is not None:
+            if callbacks["error"]:
+                callbacks["error"](job, error)
+        else:
+            callbacks["done"](job, job.future.result())
@@ -0,0 +1,237 @@
+"""Append-only write-ahead journal for .gl ledger files.
+
+A ledger opened from `ledger.gl` logs every appended row to
+`ledger.gl.journal`. The journal starts with a header naming how many
+rows the base file held when the journal was started; each record after
+it is one row and its entry id, framed as (payload length, CRC32,
+payload). Records are flushed to the OS as they are written, so a
+crashed process loses nothing, and fsync is batched (group commit) so power loss can only cost
+the last few hundred rows or second of entries.
+
+checkpoint() folds the journal into the base file and starts a new
+journal holding only rows appended since. Recovery maps the base file
+and replays just the journal records it does not already contain,
+stopping at the first torn or corrupt record.
+"""
+import os
+import struct
+import time
+import zlib
+
+from ledger_format import read_ledger_file, write_ledger_file
+
+JOURNAL_MAGIC = b"GLWJ"
+JOURNAL_VERSION = 2
+JOURNAL_SUFFIX = ".journal"
+
+JOURNAL_HEADER = struct.Struct("<4sIQ")  # magic, version, base row count
+RECORD_FRAME = struct.Struct("<II")  # payload length, crc32
+RECORD_AMOUNTS = struct.Struct("<qqi")  # debit cents, credit cents, entry id
+# Version 1 records predate journal entries and carry no entry id
+RECORD_AMOUNTS_V1 = struct.Struct("<qq")
+STRING_LENGTH = struct.Struct("<I")
+
+# Group commit: fsync after this many records or this many seconds, whichever comes first
+GROUP_COMMIT_RECORDS = 256
+GROUP_COMMIT_SECONDS = 1.0
+
+# Saving a journaled ledger only commits the journal until it holds this many
+# records; past that the save checkpoints (compacts) it into the base file
+CHECKPOINT_RECORDS = 100_000
+
+
+class JournalError(Exception):
+    pass
+
+
+def journal_path(ledger_path):
+    return ledger_path + JOURNAL_SUFFIX
+
+
+def encode_record(row, entry_id=0):
+    date, account, debit_cents, credit_cents, description = row
+    parts = [RECORD_AMOUNTS.pack(debit_cents, credit_cents, entry_id)]
+    for text in (date, account, description):
+        encoded = text.encode("utf-8")
+        parts.append(STRING_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    payload = b"".join(parts)
+    return RECORD_FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def encode_records(rows, entry_ids=None):
+    if entry_ids is None:
+        return b"".join(encode_record(row) for row in rows)
+    return b"".join(encode_record(row, entry_id) for row, entry_id in zip(rows, entry_ids))
+
+
+def decode_record(payload, version=JOURNAL_VERSION):
+    """Return (row, entry id) for one record payload."""
+    if version == 1:
+        debit_cents, credit_cents = RECORD_AMOUNTS_V1.unpack_from(payload, 0)
+        entry_id = 0
+        position = RECORD_AMOUNTS_V1.size
+    else:
+        debit_cents, credit_cents, entry_id = RECORD_AMOUNTS.unpack_from(payload, 0)
+        position = RECORD_AMOUNTS.size
+    texts = []
+    for _ in range(3):
+        length, = STRING_LENGTH.unpack_from(payload, position)
+        position += STRING_LENGTH.size
+        texts.append(payload[position:position + length].decode("utf-8"))
+        position += length
+    date, account, description = texts
+    return (date, account, debit_cents, credit_cents, description), entry_id
+
+
+def read_journal(path):
+    """Return (base row count, rows, their entry ids, length of the valid prefix in bytes)."""
+    with open(path, "rb") as journal_file:
+        data = journal_file.read()
+    if len(data) < JOURNAL_HEADER.size:
+        raise JournalError("Journal header is incomplete.")
+    magic, version, base_rows = JOURNAL_HEADER.unpack_from(data, 0)
+    if magic != JOURNAL_MAGIC:
+        raise JournalError("Not a ledger journal.")
+    if version > JOURNAL_VERSION:
+        raise JournalError(f"Journal version {version} is newer than this application supports.")
+    rows = []
+    entry_ids = []
+    position = JOURNAL_HEADER.size
+    while position + RECORD_FRAME.size <= len(data):
+        length, checksum = RECORD_FRAME.unpack_from(data, position)
+        payload = data[position + RECORD_FRAME.size:position + RECORD_FRAME.size + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break  # Torn write at the tail; everything before it is intact
+        row, entry_id = decode_record(payload, version)
+        rows.append(row)
+        entry_ids.append(entry_id)
+        position += RECORD_FRAME.size + length
+    return base_rows, rows, entry_ids, position
+
+
+class Journal:
+    """Append-only record log with group commit; see the module docstring."""
+
+    def __init__(self, path, base_rows, rows=(), valid_length=None, entry_ids=None):
+        self.path = path
+        self.base_rows = base_rows
+        self.record_count = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        if valid_length is None:
+            self._start(rows, entry_ids)
+        else:
+            # Reopen an existing journal, dropping any torn tail
+            self._file = open(path, "r+b")
+            _, version, _ = JOURNAL_HEADER.unpack(self._file.read(JOURNAL_HEADER.size))
+            if version < JOURNAL_VERSION:
+                # New records are written in the current format; rewrite an older journal in it first
+                self._file.close()
+                self._start(rows, entry_ids)
+                return
+            self._file.truncate(valid_length)
+            self._file.seek(valid_length)
+            self.record_count = len(rows)
+
+    def _start(self, rows, entry_ids=None):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as journal_file:
+            journal_file.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION, self.base_rows))
+            journal_file.write(encode_records(rows, entry_ids))
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, "ab")
+        self.record_count = len(rows)
+
+    def append_many(self, rows, entry_ids=None):
+        self._file.write(encode_records(rows, entry_ids))
+        self._file.flush()
+        self.record_count += len(rows)
+        self._pending += len(rows)
+        if (self._pending >= GROUP_COMMIT_RECORDS
+                or time.monotonic() - self._last_sync >= GROUP_COMMIT_SECONDS):
+            self.commit()
+
+    def commit(self):
+        """Make every record written so far durable."""
+        if self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def restart(self, base_rows, rows, entry_ids=None):
+        """Replace the journal with one based on a newer base file."""
+        self._file.close()
+        self.base_rows = base_rows
+        self._pending = 0
+        self._start(rows, entry_ids)
+
+    def close(self):
+        self.commit()
+        self._file.close()
+
+
+def read_ledger(ledger, path):
+    """Load a .gl file plus its journal into `ledger` without writing to either.
+
+    For read-only use such as reports; returns the number of rows replayed.
+    """
+    base_rows = read_ledger_file(ledger, path)
+    log_path = journal_path(path)
+    if not os.path.exists(log_path):
+        return 0
+    journal_base, rows, entry_ids, _ = read_journal(log_path)
+    if journal_base > base_rows:
+        raise JournalError("Journal is newer than its ledger file.")
+    replayed = rows[base_rows - journal_base:]
+    ledger.append_rows(replayed, entry_ids[base_rows - journal_base:])
+    return len(replayed)
+
+
+def open_ledger(ledger, path):
+    """Load a .gl file plus its journal into `ledger` and keep journaling to it.
+
+    Returns the number of rows replayed from the journal.
+    """
+    if os.path.exists(path):
+        base_rows = read_ledger_file(ledger, path)
+    else:
+        base_rows = write_ledger_file(ledger, path)
+    log_path = journal_path(path)
+    replayed = []
+    if os.path.exists(log_path):
+        journal_base, rows, entry_ids, valid_length = read_journal(log_path)
+        if journal_base > base_rows:
+            raise JournalError("Journal is newer than its ledger file.")
+        # Records up to the base file's row count were already checkpointed into it
+        replayed = rows[base_rows - journal_base:]
+        ledger.append_rows(replayed, entry_ids[base_rows - journal_base:])
+        journal = Journal(log_path, journal_base, rows, valid_length, entry_ids)
+    else:
+        journal = Journal(log_path, base_rows)
+    ledger.attach_journal(journal, path)
+    return len(replayed)
+
+
+def checkpoint(ledger, path):
+    """Rewrite the base file from the ledger and restart its journal (compaction).
+
+    Safe to run in a background thread: rows appended while the base file is
+    being written are carried over into the new journal.
+    """
+    with ledger.write_lock:
+        row_count = len(ledger.transactions)
+    write_ledger_file(ledger, path, row_count)
+    with ledger.write_lock:
+        carried = ledger.get_records(row_count, len(ledger.transactions))
+        carried_entries = ledger.get_entry_ids(row_count, len(ledger.transactions))
+        if ledger.journal is not None and ledger.journal.path == journal_path(path):
+            ledger.journal.restart(row_count, carried, carried_entries)
+        else:
+            if ledger.journal is not None:
+                ledger.journal.close()
+            ledger.attach_journal(Journal(journal_path(path), row_count, carried, entry_ids=carried_entries), path)
+    return row_count
@@ -0,0 +1,462 @@
+import sys
+import threading
+import time
+from array import array
+from ledger_store import (LedgerStore, CENTS_PER_UNIT, NO_ENTRY, format_cents, held_bytes, numpy_module,
+                          to_cents, to_ordinal)
+from instrumentation import measure, timed
+from ledger_batch import assign_entry_ids, entry_rows, prepare_batch, transaction_row
+from ledger_io import LoadReport
+from date_index import DateIndex
+from entry_index import EntryIndex
+from search_index import SearchIndex, account_counts
+from period_snapshots import PeriodSnapshots
+
+# Batches at least this large update the account totals with NumPy
+VECTORIZED_INDEX_ROWS = 10_000
+
+# Rows appended since the period snapshots were taken before they are retaken
+SNAPSHOT_TAIL_ROWS = 20_000
+
+class Transaction:
+    def __init__(self, date, account, debit, credit, description):
+        self.date = date
+        self.account = account
+        # Held as integer cents; debit/credit are derived for display
+        self.debit_cents = to_cents(debit)
+        self.credit_cents = to_cents(credit)
+        self.description = description
+
+    @property
+    def debit(self):
+        return self.debit_cents / CENTS_PER_UNIT
+
+    @property
+    def credit(self):
+        return self.credit_cents / CENTS_PER_UNIT
+
+class GeneralLedger:
+    def __init__(self):
+        self._store = LedgerStore()
+        # Running per-account totals in cents, indexed by the store's account id,
+        # so balance queries cost O(accounts) instead of a scan of every row
+        self._debit_totals = []
+        self._credit_totals = []
+        # Per-account date index for period queries; built on first use
+        self._date_index = None
+        # Per-account row numbers backing the T-accounts; built on first use
+        self._postings = None
+        # Journal entry lines and nets; built on first use
+        self._entries = None
+        # Description words and row filters for search; built on first use
+        self._search = None
+        # Month-end closing totals per account; read from the ledger file or built on first use
+        self._snapshots = None
+        # Id given to the next journal entry; found from the store on first use
+        self._next_entry_id = None
+        # Write-ahead journal of appended rows, when opened from a .gl file
+        self.journal = None
+        self.file_path = None
+        # Held while rows are appended, so checkpoints see the store and journal agree
+        self.write_lock = threading.RLock()
+
+    @property
+    def transactions(self):
+        return self._store.rows()
+
+    def add_transaction(self, date, account, debit, credit, description):
+        """Append one transaction; raises ValueError with the reason add_transactions would reject it for."""
+        self.append_rows([transaction_row(date, account, debit, credit, description)])
+
+    def append_rows(self, rows, entry_ids=None):
+        """Append a list of pre-validated (date, account, debit_cents, credit_cents,
+        description) rows in one batch, journal them, and update the indexes once.
+
+        entry_ids, if given, holds each row's journal entry id (NO_ENTRY for a
+        standalone line).
+        """
+        with self.write_lock:
+            self.release_mapping()
+            start = self._store.extend(rows, entry_ids)
+            if self.journal is not None:
+                self.journal.append_many(rows, entry_ids)
+            if entry_ids and self._next_entry_id is not None:
+                self._next_entry_id = max(self._next_entry_id, max(entry_ids) + 1)
+            self._index_rows(start, len(self._store))
+
+    def add_entry(self, date, lines, description=""):
+        """Post a balanced multi-line journal entry; return its entry id.
+
+        lines is a sequence of (account, debit, credit) in currency units.
+        Raises ValueError, and posts nothing, unless every line is valid and
+        the debits equal the credits.
+        """
+        rows = entry_rows(date, lines, description)
+        with self.write_lock:
+            entry_id = self._allocate_entry_ids(1)
+            self.append_rows(rows, [entry_id] * len(rows))
+        return entry_id
+
+    def _allocate_entry_ids(self, count):
+        """Reserve `count` consecutive entry ids; return the first."""
+        with self.write_lock:
+            if self._next_entry_id is None:
+                entry_ids = self._store.entry_ids
+                np = numpy_module() if len(entry_ids) else None
+                if np is not None:
+                    highest = int(np.frombuffer(entry_ids, dtype=np.int32).max())
+                else:
+                    highest = max(entry_ids, default=NO_ENTRY)
+                self._next_entry_id = max(highest, NO_ENTRY) + 1
+            first = self._next_entry_id
+            self._next_entry_id += count
+            return first
+
+    @timed("add_transactions", rows=lambda report: report.batch_rows)
+    def add_transactions(self, transactions, known_accounts=None, report=None, first_record=1):
+        """Validate and append a batch of transactions; return a LoadReport.
+
+        transactions may be an iterable of (date, account, debit, credit,
+        description) rows, a mapping of those five columns (lists or NumPy
+        arrays, keyed by the CSV header names) or a pandas DataFrame. Amounts
+        are in currency units. An optional sixth field or "Entry" column
+        groups rows into journal entries: rows sharing a label become one
+        entry with a new entry id (blank labels are standalone lines), and
+        the labels seen are kept in report.entry_ids so batches loaded with
+        the same report stay grouped. The whole batch is validated column by column
+        (amounts, debit/credit rules, dates, and accounts against
+        known_accounts when given), and the accepted rows are stored, journaled
+        and indexed at once. Rejected rows are added to the report as
+        (record, row, reason), numbered from first_record; pass a report to
+        accumulate several batches.
+        """
+        report = report if report is not None else LoadReport()
+        start_time = time.perf_counter()
+        columns, rejected = prepare_batch(transactions, known_accounts)
+        if len(columns[0]):
+            columns[5] = assign_entry_ids(columns[5], len(columns[0]), report.entry_ids,
+                                          self._allocate_entry_ids)
+            self._append_columns(columns)
+        report.batch_rows = len(columns[0])
+        report.rows_loaded += report.batch_rows
+        report.rejected.extend((first_record + position, row, reason) for position, row, reason in rejected)
+        report.elapsed += time.perf_counter() - start_time
+        return report
+
+    def _append_columns(self, columns):
+        with self.write_lock:
+            self.release_mapping()
+            start = self._store.extend_columns(*columns)
+            stop = len(self._store)
+            if self.journal is not None:
+                self.journal.append_many(self._store.records(start, stop), self._store.entry_ids[start:stop])
+            self._index_rows(start, stop)
+
+    def attach_journal(self, journal, file_path):
+        self.journal = journal
+        self.file_path = file_path
+
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+            self.file_path = None
+
+    def _index_rows(self, start, stop):
+        store = self._store
+        missing = len(store.accounts) - len(self._debit_totals)
+        if missing > 0:
+            self._debit_totals.extend([0] * missing)
+            self._credit_totals.extend([0] * missing)
+        debit_totals = self._debit_totals
+        credit_totals = self._credit_totals
+        account_ids = store.account_ids[start:stop]
+        debits = store.debits[start:stop]
+        credits = store.credits[start:stop]
+        np = numpy_module() if stop - start >= VECTORIZED_INDEX_ROWS else None
+        if np is not None:
+            ids = np.frombuffer(account_ids, dtype=np.int32)
+            for totals, amounts in ((debit_totals, debits), (credit_totals, credits)):
+                batch = np.zeros(len(totals), dtype=np.int64)
+                np.add.at(batch, ids, np.frombuffer(amounts, dtype=np.int64))
+                for account_id in np.flatnonzero(batch).tolist():
+                    totals[account_id] += int(batch[account_id])
+        else:
+            for account_id, debit, credit in zip(account_ids, debits, credits):
+                debit_totals[account_id] += debit
+                credit_totals[account_id] += credit
+        if self._date_index is not None:
+            ordinals = store.date_ordinals
+            for account_id, date_id, debit, credit in zip(account_ids, store.date_ids[start:stop], debits, credits):
+                self._date_index.add(account_id, ordinals[date_id], debit, credit)
+        if self._postings is not None:
+            postings = self._postings
+            while len(postings) < len(store.accounts):
+                postings.append(array("i"))
+            for index, account_id in enumerate(account_ids, start):
+                postings[account_id].append(index)
+        if self._entries is not None:
+            self._entries.add(store, start, stop)
+        if self._search is not None:
+            self._search.add(store)
+
+    def rebuild_index(self):
+        """Recompute the account totals from the stored columns."""
+        self._debit_totals, self._credit_totals = self._store.account_sums()
+        self._date_index = None
+        self._postings = None
+        self._entries = None
+        self._search = None
+        self._snapshots = None
+        self._next_entry_id = None
+
+    def replace_store(self, store, debit_totals=None, credit_totals=None, snapshots=None):
+        """Swap in a fully built store, e.g. one opened from a ledger file.
+
+        Account totals and period snapshots stored alongside it can be
+        passed in; otherwise they are recomputed from the columns.
+        """
+        self._store = store
+        if debit_totals is None:
+            self.rebuild_index()
+        else:
+            self._debit_totals = debit_totals
+            self._credit_totals = credit_totals
+            self._date_index = None
+            self._postings = None
+            self._entries = None
+            self._search = None
+            self._next_entry_id = None
+        self._snapshots = snapshots
+
+    def release_mapping(self):
+        """Copy a ledger opened from a mapped file into memory and close the mapping."""
+        with self.write_lock:
+            if self._store.mapping is None:
+                return
+            # Snapshots read from the file view the mapping too
+            if self._snapshots is not None:
+                self._snapshots = self._snapshots.copy()
+            self._store.release_mapping()
+
+    def clear(self):
+        self._store.clear()
+        self._debit_totals = []
+        self._credit_totals = []
+        self._date_index = None
+        self._postings = None
+        self._entries = None
+        self._search = None
+        self._snapshots = None
+        self._next_entry_id = None
+
+    def memory_bytes(self):
+        """Approximate bytes held in memory: rows, string pools, totals and every index built.
+
+        Columns and pools still mapped from a ledger file are not counted; the
+        OS pages them in and out as needed.
+        """
+        size = self._store.nbytes() + held_bytes(self._debit_totals) + held_bytes(self._credit_totals)
+        if self._postings is not None:
+            size += sys.getsizeof(self._postings) + sum(held_bytes(rows) for rows in self._postings)
+        for index in (self._date_index, self._entries, self._search, self._snapshots):
+            if index is not None:
+                size += index.nbytes()
+        return size
+
+    def _get_date_index(self):
+        if self._date_index is None:
+            self._date_index = DateIndex.build(self._store)
+        return self._date_index
+
+    def _get_postings(self):
+        if self._postings is None:
+            self._postings = self._store.postings_by_account()
+        return self._postings
+
+    def _get_entries(self):
+        if self._entries is None:
+            # Built under the lock: a background save may ask first, and the build holds NumPy
+            # views of the columns that would stop an append from growing them
+            with self.write_lock:
+                if self._entries is None:
+                    self._entries = EntryIndex.build(self._store)
+        return self._entries
+
+    def _get_search(self):
+        if self._search is None:
+            self._search = SearchIndex.build(self._store)
+        return self._search
+
+    def _get_snapshots(self, build=True):
+        store = self._store
+        if build and (self._snapshots is None or len(store) - self._snapshots.covered > SNAPSHOT_TAIL_ROWS):
+            self._snapshots = PeriodSnapshots.build(store)
+        return self._snapshots
+
+    def get_snapshots(self, store):
+        """Period snapshots over `store`, a copy of this ledger's first rows (see
+        LedgerStore.copy), e.g. to save with a ledger file."""
+        snapshots = self._snapshots
+        if snapshots is not None and snapshots.covered == len(store):
+            return snapshots
+        return PeriodSnapshots.build(store)
+
+    def _snapshot_sums(self, start_ordinal, end_ordinal, build=True):
+        """Return {account_id: (debit_cents, credit_cents)} for accounts with rows dated in
+        [start_ordinal, end_ordinal], from the closing totals of the period before the start
+        and the one at the end; None if the snapshots cannot answer for those dates."""
+        snapshots = self._get_snapshots(build)
+        if snapshots is None:
+            return None
+        through = snapshots.cumulative(self._store, end_ordinal)
+        before = {} if start_ordinal is None else snapshots.cumulative(self._store, start_ordinal - 1)
+        if through is None or before is None:
+            return None
+        sums = {}
+        for account_id, (debit, credit, rows) in through.items():
+            opening_debit, opening_credit, opening_rows = before.get(account_id, (0, 0, 0))
+            if rows > opening_rows:
+                sums[account_id] = (debit - opening_debit, credit - opening_credit)
+        return sums
+
+    def _account_sums(self, start_date=None, end_date=None):
+        """Return {account: (debit_cents, credit_cents)} over all rows, or over the
+        rows dated within [start_date, end_date] when either bound is given.
+
+        Bounded queries start from the period snapshots, so statements for
+        whole months or years need no date index; other dates use it.
+        """
+        accounts = self._store.accounts
+        if start_date is None and end_date is None:
+            return {accounts[account_id]: sums
+                    for account_id, sums in enumerate(zip(self._debit_totals, self._credit_totals))}
+        start_ordinal, end_ordinal = to_ordinal(start_date), to_ordinal(end_date)
+        period = self._snapshot_sums(start_ordinal, end_ordinal)
+        if period is None:
+            period = self._get_date_index().period_totals(start_ordinal, end_ordinal)
+        return {accounts[account_id]: sums for account_id, sums in period.items()}
+
+    def get_period_totals_cents(self, start_date=None, end_date=None):
+        """Return {account: (debit_cents, credit_cents)}, for every account or, with a date
+        bound, for the accounts with rows in the period."""
+        return self._account_sums(start_date, end_date)
+
+    def get_records(self, start, stop):
+        """Return rows [start, stop) in store form, amounts in cents."""
+        return self._store.records(start, stop)
+
+    def get_records_at(self, rows):
+        """Return the given rows in store form, e.g. a page of search results."""
+        return [self._store.record(row) for row in rows]
+
+    @timed("search", rows=len)
+    def search(self, text="", account=None, start_date=None, end_date=None, min_amount=None, max_amount=None):
+        """Return the numbers of the rows matching every given filter, in row order.
+
+        Every word of `text` must start a word of the description; amounts
+        bound the row's debit or credit. Leaving every filter out matches
+        all rows.
+        """
+        account_id = None
+        if account:
+            account_id = self._store.accounts.lookup(account)
+            if account_id is None:
+                return array("i")
+        return self._get_search().match_rows(self._store, account_id, text, start_date, end_date,
+                                             min_amount, max_amount)
+
+    def account_counts(self, rows):
+        """Return {account: number of the given rows posted to it}."""
+        return account_counts(self._store, rows)
+
+    def get_entry_ids(self, start, stop):
+        """Return the entry ids of rows [start, stop)."""
+        return self._store.entry_ids[start:stop]
+
+    def has_entries(self):
+        return bool(len(self._get_entries()))
+
+    def get_entry(self, entry_id):
+        """Return the lines of one journal entry in store form, or [] if there is none."""
+        return [self._store.record(row) for row in self._get_entries().lines(entry_id)]
+
+    def unbalanced_entries(self):
+        """Return {entry_id: debit - credit cents} for every entry whose lines do not balance."""
+        entries = self._get_entries()
+        return {entry_id: entries.nets[entry_id] for entry_id in sorted(entries.unbalanced)}
+
+    def trial_balance(self):
+        """Return {"debit", "credit", "difference"} totals over every account.
+
+        Read from the running account totals, so it is current after every
+        append without a scan.
+        """
+        debit = sum(self._debit_totals)
+        credit = sum(self._credit_totals)
+        return {"debit": debit / CENTS_PER_UNIT,
+                "credit": credit / CENTS_PER_UNIT,
+                "difference": (debit - credit) / CENTS_PER_UNIT}
+
+    def get_rows(self, start, stop):
+        """Return rows [start, stop) as plain tuples, for paged display."""
+        return self._store.page(start, stop)
+
+    def display_ledger(self):
+        print("Date\t\tAccount\t\tDebit\t\tCredit\t\tDescription")
+        print("-" * 80)
+        for date, account, debit, credit, description in self.get_records(0, len(self._store)):
+            print(f"{date}\t{account}\t\t{format_cents(debit)}\t\t{format_cents(credit)}\t\t{description}")
+
+    def get_balances_cents(self, start_date=None, end_date=None):
+        """Return {account: debit - credit} in exact integer cents."""
+        return {account: debit - credit
+                for account, (debit, credit) in self._account_sums(start_date, end_date).items()}
+
+    def get_account_balances(self, start_date=None, end_date=None):
+        with measure("get_account_balances", len(self._store)):
+            return {account: balance / CENTS_PER_UNIT
+                    for account, balance in self.get_balances_cents(start_date, end_date).items()}
+
+    def get_account_totals(self, start_date=None, end_date=None):
+        """Return {account: {"debit", "credit", "balance"}}, optionally for a date range."""
+        return {account: {"debit": debit / CENTS_PER_UNIT,
+                          "credit": credit / CENTS_PER_UNIT,
+                          "balance": (debit - credit) / CENTS_PER_UNIT}
+                for account, (debit, credit) in self._account_sums(start_date, end_date).items()}
+
+    def get_accounts(self):
+        """Return every account that has at least one transaction, in first-use order."""
+        return list(self._store.accounts.strings)
+
+    def get_t_account(self, account):
+        """Return {"debits", "credits", "balance"} for one account from its posting list."""
+        store = self._store
+        account_id = store.accounts.lookup(account)
+        if account_id is None:
+            return {"debits": [], "credits": [], "balance": 0}
+        debits = store.debits
+        credits = store.credits
+        rows = self._get_postings()[account_id]
+        return {
+            "debits": [debits[i] / CENTS_PER_UNIT for i in rows if debits[i] > 0],
+            "credits": [credits[i] / CENTS_PER_UNIT for i in rows if credits[i] > 0],
+            "balance": (self._debit_totals[account_id] - self._credit_totals[account_id]) / CENTS_PER_UNIT,
+        }
+
+    def generate_t_accounts(self):
+        return {account: self.get_t_account(account) for account in self.get_accounts()}
+
+    def display_t_accounts(self):
+        t_accounts = self.generate_t_accounts()
+        for account, data in t_accounts.items():
+            print(f"\n{'='*20} {account} {'='*20}")
+            print(f"{'Debits':<15} | {'Credits':>15}")
+            print("-" * 31)
+            max_lines = max(len(data["debits"]), len(data["credits"]))
+            for i in range(max_lines):
+                debit = f"{data['debits'][i]:.2f}" if i < len(data["debits"]) else ""
+                credit = f"{data['credits'][i]:.2f}" if i < len(data["credits"]) else ""
+                print(f"{debit:<15} | {credit:>15}")
+            print("-" * 31)
+            print(f"{'Balance:':<15} | {data['balance']:>15.2f}")
@@ -0,0 +1,274 @@
+"""Batch validation for bulk transaction ingest.
+
+A batch arrives as rows, a mapping of columns or a DataFrame and is turned
+into five columns, plus the entry labels that group rows into journal
+entries when it has them. Each check then runs once over a whole column: amounts
+are converted to cents in one vectorized step when they are numeric NumPy
+columns (text amounts are parsed once per distinct value), and dates and
+accounts are checked once per distinct value. Rejected rows are returned
+with a reason rather than printed.
+"""
+from array import array
+from itertools import compress
+
+from ledger_store import (CENTS_PER_UNIT, MAX_CENTS, NO_ENTRY, UNDATED, amount_error, format_cents, numpy_module,
+                          parse_date, to_cents)
+
+BATCH_COLUMNS = ("Date", "Account", "Debit", "Credit", "Description")
+ENTRY_COLUMN = "Entry"
+
+INVALID_AMOUNT = "Invalid numeric data."
+
+
+def batch_columns(transactions):
+    """Return (columns, positions, malformed) for a batch.
+
+    columns holds the five column sequences and then the entry labels, or
+    None when the batch has none; positions maps each column index back to
+    its place in the input (None when nothing was dropped); malformed lists
+    (position, row, reason) for rows without five or six fields.
+    """
+    if hasattr(transactions, "keys"):  # Mapping of columns, or a DataFrame
+        names = {str(name).lower(): name for name in transactions.keys()}
+        columns = []
+        for name in BATCH_COLUMNS + (ENTRY_COLUMN,):
+            if name.lower() not in names:
+                if name == ENTRY_COLUMN:
+                    columns.append(None)
+                    continue
+                raise ValueError(f"Missing column {name!r}.")
+            column = transactions[names[name.lower()]]
+            columns.append(column.to_numpy() if hasattr(column, "to_numpy") else column)
+        np = numpy_module()
+        if np is not None and isinstance(columns[0], np.ndarray) and columns[0].dtype.kind == "M":
+            columns[0] = np.datetime_as_string(columns[0], unit="D").tolist()
+        return columns, None, []
+    rows = transactions if isinstance(transactions, list) else list(transactions)
+    malformed = [(position, row, f"Expected 5 or 6 columns, found {len(row)}.")
+                 for position, row in enumerate(rows) if len(row) not in (5, 6)]
+    positions = None
+    if malformed:
+        positions = [position for position, row in enumerate(rows) if len(row) in (5, 6)]
+        rows = [rows[position] for position in positions]
+    if not rows:
+        return [[] for _ in BATCH_COLUMNS] + [None], positions, malformed
+    if any(len(row) == 6 for row in rows):
+        # Rows without an entry label are standalone lines
+        rows = [row if len(row) == 6 else tuple(row) + ("",) for row in rows]
+        return [list(column) for column in zip(*rows)], positions, malformed
+    return [list(column) for column in zip(*rows)] + [None], positions, malformed
+
+
+def entry_label(label):
+    """Return an entry label as text; blank labels (None, "", NaN, 0) become ""."""
+    if label is None or label != label:
+        return ""
+    if isinstance(label, float) and label.is_integer():
+        label = int(label)  # Integer labels read back as floats from a DataFrame
+    text = str(label).strip()
+    return "" if text == "0" else text
+
+
+def entry_labels(column):
+    np = numpy_module()
+    if np is not None and isinstance(column, np.ndarray):
+        column = column.tolist()
+    labels = {label: entry_label(label) for label in dict.fromkeys(column)}
+    return [labels[label] for label in column]
+
+
+def assign_entry_ids(labels, count, assigned, allocate):
+    """Map a column of entry labels (or None) to an array of entry ids.
+
+    assigned maps labels already seen to their ids and is updated; new
+    labels get ids from allocate(n), which returns the first of n fresh ids.
+    """
+    if labels is None:
+        return array("i", bytes(4 * count))
+    labels = entry_labels(labels)
+    new_labels = [label for label in dict.fromkeys(labels) if label and label not in assigned]
+    if new_labels:
+        first = allocate(len(new_labels))
+        assigned.update(zip(new_labels, range(first, first + len(new_labels))))
+    return array("i", [assigned[label] if label else NO_ENTRY for label in labels])
+
+
+def entry_rows(date, lines, description=""):
+    """Validate a journal entry's (account, debit, credit) lines; return its store rows.
+
+    Raises ValueError unless the date and every line are valid and the
+    debits equal the credits.
+    """
+    if not isinstance(date, str) or parse_date(date) == UNDATED:
+        raise ValueError(f"Unrecognised date: {date!r}.")
+    if len(lines) < 2:
+        raise ValueError("A journal entry needs at least two lines.")
+    rows = []
+    for account, debit, credit in lines:
+        debit_cents = to_cents(debit or 0)
+        credit_cents = to_cents(credit or 0)
+        error = amount_error(debit_cents, credit_cents)
+        if error is not None:
+            raise ValueError(f"{account}: {error}")
+        if not isinstance(account, str) or not account.strip():
+            raise ValueError("Missing account.")
+        rows.append((date, account, debit_cents, credit_cents, description))
+    difference = sum(row[2] - row[3] for row in rows)
+    if difference:
+        raise ValueError(f"Entry is out of balance by {format_cents(difference)}.")
+    return rows
+
+
+def description_text(description):
+    """Return a description as text; blank descriptions arrive as None or NaN from some sources."""
+    if isinstance(description, str):
+        return description
+    return "" if description is None or description != description else str(description)
+
+
+def cell_cents(amount):
+    """Return the cents in one amount cell, or None if it is not an amount."""
+    if amount is None or amount != amount:  # Blank, or NaN from a DataFrame
+        return 0
+    if isinstance(amount, str) and not amount.strip():
+        return 0
+    try:
+        return to_cents(amount)
+    except (ValueError, TypeError):
+        return None
+
+
+def amount_column_cents(column):
+    """Convert a column of amounts to cents; return (cents, indexes of invalid amounts).
+
+    Blank cells (None, empty text, NaN) count as 0, as bank exports leave
+    the unused side of a line blank. Amounts whose cents do not fit the
+    int64 columns are invalid, as they are for to_cents.
+    """
+    np = numpy_module()
+    if (np is not None and isinstance(column, list) and column
+            and all(isinstance(amount, (int, float, np.number)) for amount in column)):
+        column = np.asarray(column)  # Numbers from rows (Python or NumPy scalars) convert in one step
+    if np is not None and isinstance(column, np.ndarray) and column.dtype.kind in "iuf":
+        if column.dtype.kind == "f":
+            values = np.nan_to_num(column, nan=0.0, posinf=0.0, neginf=0.0)
+            scaled = values * CENTS_PER_UNIT
+            # Floats below 2 ** 63 in magnitude are at most MAX_CENTS once rounded
+            out_of_range = np.isinf(column) | (np.abs(scaled) >= 2.0 ** 63)
+            invalid = np.flatnonzero(out_of_range).tolist()
+            if invalid:
+                values = np.where(out_of_range, 0.0, values)
+                scaled = np.where(out_of_range, 0.0, scaled)
+            cents = np.rint(scaled).astype(np.int64)
+            # Within float noise of a half cent, round the decimal repr the way to_cents does
+            for index in np.flatnonzero(np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5)
+                                        < np.maximum(1e-6, np.abs(scaled) * 1e-14)).tolist():
+                cents[index] = to_cents(float(values[index]))
+            return cents, invalid
+        limit = MAX_CENTS // CENTS_PER_UNIT
+        out_of_range = (column > limit) | (column < -limit)
+        invalid = np.flatnonzero(out_of_range).tolist()
+        if invalid:
+            column = np.where(out_of_range, 0, column)
+        return column.astype(np.int64) * CENTS_PER_UNIT, invalid
+    cents = []
+    invalid = []
+    # Ledgers repeat the same few amounts (and blanks) constantly; parse each once
+    parsed = {}
+    for index, amount in enumerate(column):
+        value = parsed.get(amount)
+        if value is None:
+            value = cell_cents(amount)
+            if value is None:
+                invalid.append(index)
+                value = 0
+            else:
+                parsed[amount] = value
+        cents.append(value)
+    return cents, invalid
+
+
+def validate_batch(dates, accounts, debit_cents, credit_cents, invalid_amounts=(), known_accounts=None):
+    """Return {index: reason} for every row of the batch that cannot be stored.
+
+    known_accounts, if given (e.g. a ChartOfAccounts), restricts accounts to its members.
+    """
+    reasons = {index: INVALID_AMOUNT for index in invalid_amounts}
+    np = numpy_module() if len(dates) else None
+    if np is not None:
+        debits = np.asarray(debit_cents, dtype=np.int64)
+        credits = np.asarray(credit_cents, dtype=np.int64)
+        for index in np.flatnonzero((debits < 0) | (credits < 0) | (debits == credits)).tolist():
+            reasons.setdefault(index, amount_error(int(debits[index]), int(credits[index])))
+    else:
+        for index, (debit, credit) in enumerate(zip(debit_cents, credit_cents)):
+            error = amount_error(debit, credit)
+            if error is not None:
+                reasons.setdefault(index, error)
+
+    bad_dates = {date for date in set(dates)
+                 if not isinstance(date, str) or parse_date(date) == UNDATED}
+    if bad_dates:
+        for index, date in enumerate(dates):
+            if date in bad_dates:
+                reasons.setdefault(index, f"Unrecognised date: {date!r}.")
+
+    bad_accounts = {account for account in set(accounts)
+                    if not isinstance(account, str) or not account.strip()
+                    or (known_accounts is not None and account not in known_accounts)}
+    if bad_accounts:
+        for index, account in enumerate(accounts):
+            if account in bad_accounts:
+                named = isinstance(account, str) and account.strip()
+                reasons.setdefault(index, f"Unknown account: {account!r}." if named else "Missing account.")
+    return reasons
+
+
+def keep_rows(column, keep):
+    np = numpy_module()
+    if np is not None and isinstance(column, np.ndarray):
+        return column[np.asarray(keep, dtype=bool)]
+    return list(compress(column, keep))
+
+
+def prepare_batch(transactions, known_accounts=None):
+    """Validate a batch; return (accepted columns, rejected [(position, row, reason)]).
+
+    The accepted columns are (dates, accounts, debit_cents, credit_cents,
+    descriptions, entry labels); the labels are None when the batch has none.
+    """
+    columns, positions, rejected = batch_columns(transactions)
+    dates, accounts, debits, credits, descriptions, entries = columns
+    if not all(isinstance(description, str) for description in descriptions):
+        descriptions = columns[4] = [description_text(description) for description in descriptions]
+    debit_cents, invalid_debits = amount_column_cents(debits)
+    credit_cents, invalid_credits = amount_column_cents(credits)
+    reasons = validate_batch(dates, accounts, debit_cents, credit_cents,
+                             sorted(set(invalid_debits) | set(invalid_credits)), known_accounts)
+    accepted = [dates, accounts, debit_cents, credit_cents, descriptions, entries]
+    if reasons:
+        for index, reason in reasons.items():
+            position = index if positions is None else positions[index]
+            row = tuple(column[index] for column in columns if column is not None)
+            rejected.append((position, row, reason))
+        keep = [True] * len(dates)
+        for index in reasons:
+            keep[index] = False
+        accepted = [None if column is None else keep_rows(column, keep) for column in accepted]
+    rejected.sort(key=lambda rejection: rejection[0])
+    return accepted, rejected
+
+
+def transaction_row(date, account, debit, credit, description):
+    """Validate one transaction by the rules of prepare_batch; return its store row.
+
+    Raises ValueError with the reason prepare_batch would reject the row for.
+    """
+    debit_cents = cell_cents(debit)
+    credit_cents = cell_cents(credit)
+    if debit_cents is None or credit_cents is None:
+        raise ValueError(INVALID_AMOUNT)
+    reason = validate_batch([date], [account], [debit_cents], [credit_cents]).get(0)
+    if reason is not None:
+        raise ValueError(reason)
+    return (date, account, debit_cents, credit_cents, description_text(description))
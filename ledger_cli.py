@@ -0,0 +1,286 @@
+"""Command-line interface to the general ledger, for scripted and scheduled use.
+
+Usage: python ledger_cli.py COMMAND ...
+
+    import SOURCE.csv LEDGER       append a CSV to a .gl, .db or .csv ledger
+    balances LEDGER                account balances
+    statements LEDGER              income statement, balance sheet, statement of equity
+    export LEDGER OUTPUT           write .xlsx, .csv, .gl or .db
+    tax-forms LEDGER               tax form lines
+    check LEDGER                   trial balance and unbalanced journal entries
+    close-all WORKSPACE            statements and tax forms for every entity, in parallel
+
+Report commands accept --workers N to aggregate the file in N processes
+without loading it (see parallel_ledger). SQLite ledgers (.db) are queried
+in place (see sqlite_ledger). A workspace is a directory of per-entity
+.gl ledgers (see workspace).
+
+--metrics FILE records how long each ledger operation took and writes the
+figures to FILE (JSON for .json, Prometheus text otherwise);
+--profile OPERATION FILE saves a cProfile trace of one operation, e.g.
+`--profile statement_engine engine.prof` (see instrumentation).
+
+Nothing here imports tkinter, and pandas/openpyxl, sqlite3 and the process
+pools are only imported by the commands and options that need them, so
+report commands start quickly and run without a display.
+"""
+import argparse
+import os
+import sys
+
+from financial_statements import StatementEngine, IncomeStatement, BalanceSheet, StatementOfEquity, export_to_excel
+from instrumentation import enable, profile_next, timed, write_metrics
+from ledger import GeneralLedger
+from ledger_format import LedgerFormatError, is_ledger_file, write_ledger_file
+from ledger_io import is_sqlite_file, load_csv, save_csv
+from ledger_store import CENTS_PER_UNIT
+from journal import JournalError, checkpoint, open_ledger, read_ledger
+from tax_forms import FORMS, TaxFormError, evaluate_forms
+
+# Errors reported as "error: ..." with exit status 2 rather than a traceback,
+# e.g. a missing, corrupt or unreadable ledger file
+COMMAND_ERRORS = (OSError, ValueError, JournalError, LedgerFormatError, TaxFormError)
+
+
+def command_errors():
+    """COMMAND_ERRORS, plus sqlite3.Error once a command has opened a database."""
+    sqlite3 = sys.modules.get("sqlite3")
+    return COMMAND_ERRORS if sqlite3 is None else COMMAND_ERRORS + (sqlite3.Error,)
+
+
+@timed("load_ledger", rows=lambda ledger: len(ledger.transactions))
+def load_ledger(path):
+    """Open a .gl, .db or CSV ledger for reading."""
+    if is_sqlite_file(path):
+        from sqlite_ledger import SqliteLedger
+        return SqliteLedger(path, create=False)
+    ledger = GeneralLedger()
+    if is_ledger_file(path):
+        read_ledger(ledger, path)
+    else:
+        report = load_csv(ledger, path)
+        if report.rejected:
+            print(f"{path}: {len(report.rejected):,} rows rejected", file=sys.stderr)
+    return ledger
+
+
+def scanned_in_parallel(args):
+    return bool(args.workers) and not is_sqlite_file(args.ledger)
+
+
+def load_report_ledger(args):
+    """Ledger for a report command: loaded in full, or scanned in parallel with --workers."""
+    if scanned_in_parallel(args):
+        from parallel_ledger import PartitionedLedger
+        return PartitionedLedger(args.ledger, args.workers)
+    return load_ledger(args.ledger)
+
+
+def report_rejected(args, ledger):
+    """Print the CSV rows a --workers scan skipped, as load_ledger does for a full load."""
+    if scanned_in_parallel(args) and ledger.rows_rejected:
+        print(f"{args.ledger}: {ledger.rows_rejected:,} rows rejected", file=sys.stderr)
+
+
+def format_amount(amount):
+    return f"{amount:,.2f}"
+
+
+def print_table(columns, rows):
+    rows = [[format_amount(value) if isinstance(value, (int, float)) else str(value) for value in row]
+            for row in rows]
+    widths = [max([len(column)] + [len(row[number]) for row in rows])
+              for number, column in enumerate(columns)]
+    for row in [columns, ["-" * width for width in widths]] + rows:
+        print("  ".join(value.rjust(width) if column == "Amount" else value.ljust(width)
+                        for column, value, width in zip(columns, row, widths)).rstrip())
+
+
+def command_import(args):
+    if is_ledger_file(args.ledger):
+        ledger = GeneralLedger()
+        open_ledger(ledger, args.ledger)
+        report = load_csv(ledger, args.source)
+        checkpoint(ledger, args.ledger)
+        ledger.close_journal()
+    elif is_sqlite_file(args.ledger):
+        from sqlite_ledger import SqliteLedger
+        ledger = SqliteLedger(args.ledger)
+        report = load_csv(ledger, args.source)
+        ledger.close()
+    else:
+        ledger = load_ledger(args.ledger) if os.path.exists(args.ledger) else GeneralLedger()
+        report = load_csv(ledger, args.source)
+        save_csv(ledger, args.ledger)
+    print(report.summary())
+    if report.rejected and args.errors:
+        report.write_errors(args.errors)
+        print(f"Rejected rows written to {args.errors}")
+    return 1 if report.rejected else 0
+
+
+def command_balances(args):
+    ledger = load_report_ledger(args)
+    balances = ledger.get_account_balances(args.start, args.end)
+    print_table(("Account", "Amount"), sorted(balances.items()))
+    report_rejected(args, ledger)
+    return 0
+
+
+def command_statements(args):
+    ledger = load_report_ledger(args)
+    engine = StatementEngine(ledger, args.start, args.end)
+    statements = (("Income Statement", IncomeStatement(ledger, engine=engine)),
+                  ("Balance Sheet", BalanceSheet(ledger, engine=engine)),
+                  ("Statement of Equity", StatementOfEquity(ledger, engine=engine)))
+    for number, (title, statement) in enumerate(statements):
+        if number:
+            print()
+        print(title)
+        print_table(statement.COLUMNS, [[record[column] for column in statement.COLUMNS]
+                                        for record in statement.to_records()])
+    report_rejected(args, ledger)
+    return 0
+
+
+def command_export(args):
+    ledger = load_ledger(args.ledger)
+    extension = os.path.splitext(args.output)[1].lower()
+    if extension == ".xlsx":
+        export_to_excel(ledger, args.output)
+    elif is_sqlite_file(args.output):
+        from sqlite_ledger import SqliteLedger, copy_ledger
+        if os.path.exists(args.output):
+            raise ValueError(f"{args.output} already exists; export to a new database.")
+        target = SqliteLedger(args.output)
+        copy_ledger(ledger, target)
+        target.close()
+    elif is_ledger_file(args.output):
+        if is_sqlite_file(args.ledger):
+            from sqlite_ledger import copy_ledger
+            source, ledger = ledger, GeneralLedger()
+            copy_ledger(source, ledger)
+        write_ledger_file(ledger, args.output)
+    else:
+        save_csv(ledger, args.output)
+    print(f"Exported {len(ledger.transactions):,} rows to {args.output}")
+    return 0
+
+
+def command_tax_forms(args):
+    ledger = load_report_ledger(args)
+    forms = evaluate_forms(ledger, args.form)
+    for number, (form_id, lines) in enumerate(forms.items()):
+        if number:
+            print()
+        print(FORMS[form_id].title)
+        print_table(("Line", "Description", "Amount"), lines)
+    report_rejected(args, ledger)
+    return 0
+
+
+def command_check(args):
+    ledger = load_ledger(args.ledger)
+    totals = ledger.trial_balance()
+    print_table(("Account", "Amount"), [("Total debits", totals["debit"]), ("Total credits", totals["credit"]),
+                                        ("Difference", totals["difference"])])
+    unbalanced = ledger.unbalanced_entries()
+    if unbalanced:
+        print()
+        print(f"{len(unbalanced):,} unbalanced journal entries")
+        print_table(("Entry", "Amount"), [(f"#{entry_id}", net / CENTS_PER_UNIT) for entry_id, net in unbalanced.items()])
+    return 1 if unbalanced or totals["difference"] else 0
+
+
+def command_close_all(args):
+    from workspace import Workspace
+    workspace = Workspace(args.workspace, workers=args.workers)
+    try:
+        report = workspace.close_entities(args.entity, args.start, args.end, args.form)
+    finally:
+        workspace.close()
+    print_table(("Entity", "Rows", "Total (s)", "Error"),
+                [(entity, f"{rows:,}", f"{total:.3f}", error)
+                 for entity, rows, _, _, _, total, error in report.timing_rows()])
+    print(report.summary())
+    if args.report:
+        report.write_timings(args.report)
+        print(f"Timings written to {args.report}")
+    return 1 if report.failed else 0
+
+
+def add_workers_argument(command):
+    command.add_argument("--workers", type=int,
+                         help="aggregate the file in parallel with this many processes instead of loading it")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ledger_cli.py", description="General ledger command-line interface.")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="write operation timings to FILE (.json, or Prometheus text otherwise)")
+    parser.add_argument("--profile", nargs=2, metavar=("OPERATION", "FILE"),
+                        help="save a cProfile trace of the first call of OPERATION to FILE")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import", help="append a CSV file to a ledger")
+    command.add_argument("source", help="CSV file to import")
+    command.add_argument("ledger", help="ledger to append to (.gl, .db or .csv); created if missing")
+    command.add_argument("--errors", help="write rejected rows to this CSV file")
+    command.set_defaults(func=command_import)
+
+    for name, func, help_text in (("balances", command_balances, "print account balances"),
+                                  ("statements", command_statements, "print the financial statements")):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("ledger", help="ledger file (.gl, .db or .csv)")
+        command.add_argument("--start", help="first date of the period (YYYY-MM-DD)")
+        command.add_argument("--end", help="last date of the period (YYYY-MM-DD)")
+        add_workers_argument(command)
+        command.set_defaults(func=func)
+
+    command = commands.add_parser("export", help="export a ledger to .xlsx, .csv, .gl or .db")
+    command.add_argument("ledger", help="ledger file (.gl, .db or .csv)")
+    command.add_argument("output", help="output file; the extension picks the format")
+    command.set_defaults(func=command_export)
+
+    command = commands.add_parser("tax-forms", help="print tax form lines")
+    command.add_argument("ledger", help="ledger file (.gl, .db or .csv)")
+    command.add_argument("--form", action="append", choices=list(FORMS),
+                         help="form to print; repeatable (default: all)")
+    add_workers_argument(command)
+    command.set_defaults(func=command_tax_forms)
+
+    command = commands.add_parser("check", help="check the trial balance and journal entries")
+    command.add_argument("ledger", help="ledger file (.gl, .db or .csv)")
+    command.set_defaults(func=command_check)
+
+    command = commands.add_parser("close-all", help="close the books of every entity in a workspace")
+    command.add_argument("workspace", help="workspace directory of .gl ledgers, one per entity")
+    command.add_argument("--entity", action="append", help="entity to close; repeatable (default: all)")
+    command.add_argument("--start", help="first date of the period (YYYY-MM-DD)")
+    command.add_argument("--end", help="last date of the period (YYYY-MM-DD)")
+    command.add_argument("--form", action="append", choices=list(FORMS),
+                         help="tax form to evaluate; repeatable (default: all)")
+    command.add_argument("--workers", type=int, help="number of processes (default: one per CPU)")
+    command.add_argument("--report", help="write per-entity timings to this CSV file")
+    command.set_defaults(func=command_close_all)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics or args.profile:
+        enable()
+    if args.profile:
+        profile_next(*args.profile)
+    try:
+        return args.func(args)
+    except command_errors() as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 2
+    finally:
+        if args.metrics:
+            write_metrics(args.metrics)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
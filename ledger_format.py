@@ -0,0 +1,207 @@
+"""Native binary ledger file (.gl).
+
+Layout, all little-endian:
+
+    header    magic b"GLDG", format version (u32), row count (u64), section count (u32)
+    sections  section count x (name: 8 bytes, offset: u64, length: u64)
+    payload   sections, each starting on an 8-byte boundary
+
+Columns are stored exactly as LedgerStore holds them (int32 ids, int64
+cents), so opening a file maps it with mmap and hands the store
+memoryviews over the mapping: no parsing, and only the pages that are
+touched are read. String tables are u64 count, (count + 1) u64 offsets,
+then the UTF-8 blob. Per-account totals are stored too, so balances are
+available without scanning the rows, and so are the month-end period
+snapshots (see period_snapshots); files written before snapshots were
+added simply build them on first use. Unknown sections are ignored.
+Version 1 files predate journal entries and have no entry column; their
+rows read as standalone lines.
+"""
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from instrumentation import timed
+from ledger_store import COLUMN_TYPES, LedgerStore, StringPool
+from period_snapshots import PeriodSnapshots
+
+MAGIC = b"GLDG"
+FORMAT_VERSION = 2
+FILE_EXTENSION = ".gl"
+
+HEADER = struct.Struct("<4sIQI")
+SECTION = struct.Struct("<8sQQ")
+ALIGNMENT = 8
+
+STRING_TABLES = (("accounts", b"accounts"), ("dates", b"dates"), ("descriptions", b"descrips"))
+COLUMN_SECTIONS = {
+    "account_ids": b"c_acct",
+    "date_ids": b"c_date",
+    "debits": b"c_debit",
+    "credits": b"c_credit",
+    "description_ids": b"c_desc",
+    "entry_ids": b"c_entry",
+    "date_ordinals": b"ordinals",
+}
+TOTAL_SECTIONS = (b"t_debit", b"t_credit")
+SNAPSHOT_SECTIONS = (("ends", "i", b"s_ends"), ("firsts", "i", b"s_first"), ("debits", "q", b"s_debit"),
+                     ("credits", "q", b"s_credit"), ("counts", "q", b"s_rows"))
+
+
+class LedgerFormatError(Exception):
+    pass
+
+
+def _little_endian(column, typecode):
+    if sys.byteorder == "little":
+        return memoryview(column).cast("B")
+    swapped = array(typecode, column)
+    swapped.byteswap()
+    return memoryview(swapped).cast("B")
+
+
+def _encode_string_table(strings):
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = array("q", [0])
+    position = 0
+    for value in encoded:
+        position += len(value)
+        offsets.append(position)
+    return (struct.pack("<Q", len(encoded)) + bytes(_little_endian(offsets, "q")) + b"".join(encoded))
+
+
+@timed("write_ledger_file", rows=lambda rows: rows)
+def write_ledger_file(ledger, path, row_count=None):
+    """Write the first `row_count` rows (default: all) of `ledger` to a .gl file.
+
+    The file is written beside the target and renamed over it, so a crash
+    never leaves a half-written ledger behind.
+    """
+    live = ledger._store
+    row_count = len(live) if row_count is None else row_count
+    # A live ledger may be appended to from another thread while it is being
+    # written; the sections, totals and snapshots are built from a copy of its
+    # rows and pools, since NumPy views of the live columns would stop them growing
+    with ledger.write_lock:
+        if live.mapping is not None and os.path.exists(path) and os.path.samefile(path, live.mapped_path):
+            # Saving over the file the ledger is mapped from
+            ledger.release_mapping()
+        store = live.copy(row_count)
+    debit_totals, credit_totals = store.account_sums()
+    # Accounts first used after row_count (a snapshot of a live ledger) are left out;
+    # ids are handed out in first-use order, so they are all at the end of the pool
+    account_count = len(store.accounts)
+    if row_count < len(live):
+        account_count = max(store.account_ids, default=-1) + 1
+        debit_totals = debit_totals[:account_count]
+        credit_totals = credit_totals[:account_count]
+
+    pool_sizes = {"accounts": account_count, "dates": len(store.dates), "descriptions": len(store.descriptions)}
+    sections = []
+    for attribute, name in STRING_TABLES:
+        strings = getattr(store, attribute).strings[:pool_sizes[attribute]]
+        sections.append((name, _encode_string_table(strings)))
+    for attribute, typecode in COLUMN_TYPES:
+        sections.append((COLUMN_SECTIONS[attribute], _little_endian(getattr(store, attribute), typecode)))
+    for name, totals in zip(TOTAL_SECTIONS, (debit_totals, credit_totals)):
+        sections.append((name, _little_endian(array("q", totals), "q")))
+    snapshots = ledger.get_snapshots(store)
+    for attribute, typecode, name in SNAPSHOT_SECTIONS:
+        sections.append((name, _little_endian(getattr(snapshots, attribute), typecode)))
+
+    offset = HEADER.size + SECTION.size * len(sections)
+    table = []
+    for name, payload in sections:
+        offset += -offset % ALIGNMENT
+        table.append((name, offset, len(payload)))
+        offset += len(payload)
+
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as ledger_file:
+        ledger_file.write(HEADER.pack(MAGIC, FORMAT_VERSION, row_count, len(sections)))
+        for name, section_offset, length in table:
+            ledger_file.write(SECTION.pack(name, section_offset, length))
+        for (name, section_offset, length), (_, payload) in zip(table, sections):
+            ledger_file.write(b"\0" * (section_offset - ledger_file.tell()))
+            ledger_file.write(payload)
+        ledger_file.flush()
+        os.fsync(ledger_file.fileno())
+    os.replace(temp_path, path)
+    return row_count
+
+
+def read_sections(mapping):
+    view = memoryview(mapping)
+    if len(view) < HEADER.size:
+        raise LedgerFormatError("File is too short to be a ledger file.")
+    magic, version, row_count, section_count = HEADER.unpack_from(view, 0)
+    if magic != MAGIC:
+        raise LedgerFormatError("Not a ledger file.")
+    if version > FORMAT_VERSION:
+        raise LedgerFormatError(f"Ledger file version {version} is newer than this application supports.")
+    sections = {}
+    for number in range(section_count):
+        name, offset, length = SECTION.unpack_from(view, HEADER.size + number * SECTION.size)
+        sections[name.rstrip(b"\0")] = view[offset:offset + length]
+    return row_count, sections
+
+
+def _column(section, typecode):
+    if sys.byteorder == "little":
+        return section.cast(typecode)
+    column = array(typecode, section.tobytes())
+    column.byteswap()
+    return column
+
+
+def _string_table(section):
+    count, = struct.unpack_from("<Q", section, 0)
+    offsets_end = 8 + 8 * (count + 1)
+    offsets = _column(section[8:offsets_end], "q")
+    return StringPool.from_table(offsets, section[offsets_end:])
+
+
+def map_ledger_file(path):
+    """Map a .gl file read-only; return (mapping, row count, {section name: memoryview})."""
+    with open(path, "rb") as ledger_file:
+        mapping = mmap.mmap(ledger_file.fileno(), 0, access=mmap.ACCESS_READ)
+    row_count, sections = read_sections(mapping)
+    return mapping, row_count, sections
+
+
+def column_view(sections, attribute):
+    """Return one store column (see COLUMN_TYPES) from mapped sections, without copying."""
+    return _column(sections[COLUMN_SECTIONS[attribute]], dict(COLUMN_TYPES)[attribute])
+
+
+@timed("read_ledger_file", rows=lambda rows: rows)
+def read_ledger_file(ledger, path):
+    """Replace the contents of `ledger` with a memory-mapped .gl file."""
+    mapping, row_count, sections = map_ledger_file(path)
+
+    store = LedgerStore()
+    for attribute, name in STRING_TABLES:
+        setattr(store, attribute, _string_table(sections[name]))
+    for attribute, typecode in COLUMN_TYPES:
+        if COLUMN_SECTIONS[attribute] in sections:
+            column = column_view(sections, attribute)
+        elif attribute == "entry_ids":  # Version 1 file
+            column = array(typecode, bytes(row_count * array(typecode).itemsize))
+        else:
+            raise LedgerFormatError(f"Ledger file has no {attribute} column.")
+        setattr(store, attribute, column)
+    store.mapping = mapping
+    store.mapped_path = path
+    totals = [list(_column(sections[name], "q")) for name in TOTAL_SECTIONS]
+    snapshots = None
+    if all(name in sections for _, _, name in SNAPSHOT_SECTIONS):
+        snapshots = PeriodSnapshots(*(_column(sections[name], typecode) for _, typecode, name in SNAPSHOT_SECTIONS),
+                                    covered=row_count)
+    ledger.replace_store(store, *totals, snapshots=snapshots)
+    return row_count
+
+
+def is_ledger_file(path):
+    return os.path.splitext(path)[1].lower() == FILE_EXTENSION
@@ -0,0 +1,120 @@
+import csv
+import os
+import time
+from itertools import islice
+
+from instrumentation import timed
+from ledger_batch import prepare_batch
+from ledger_store import format_cents
+
+LEDGER_HEADER = ["Date", "Account", "Debit", "Credit", "Description"]
+# Appended to the header when the ledger holds multi-line journal entries
+ENTRY_HEADER = "Entry"
+
+# Rows parsed and appended to the ledger per batch
+DEFAULT_CHUNK_SIZE = 50_000
+
+# Ledgers kept in an SQLite database (see sqlite_ledger)
+SQLITE_EXTENSIONS = (".db", ".sqlite", ".sqlite3")
+
+
+class LoadReport:
+    """Outcome of a bulk load: accepted row count, rejected rows and throughput."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.rows_loaded = 0
+        self.batch_rows = 0  # Rows accepted by the latest add_transactions call
+        self.rejected = []  # (record number, raw row, reason)
+        self.elapsed = 0.0
+        self.entry_ids = {}  # entry label in the source -> entry id given in the ledger
+
+    @property
+    def rows_read(self):
+        return self.rows_loaded + len(self.rejected)
+
+    @property
+    def rows_per_second(self):
+        return self.rows_read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        text = (f"{self.rows_loaded:,} rows loaded in {self.elapsed:.2f}s "
+                f"({self.rows_per_second:,.0f} rows/s)")
+        if self.rejected:
+            text += f", {len(self.rejected):,} rejected"
+        return text
+
+    def write_errors(self, path):
+        with open(path, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["Record", "Reason"] + LEDGER_HEADER + [ENTRY_HEADER])
+            for record, row, reason in self.rejected:
+                writer.writerow([record, reason] + list(row))
+
+
+def is_sqlite_file(path):
+    return os.path.splitext(path)[1].lower() in SQLITE_EXTENSIONS
+
+
+def parse_rows(rows, first_record, report):
+    """Validate raw CSV rows, returning the store-ready ones and recording rejects."""
+    (dates, accounts, debits, credits, descriptions, _), rejected = prepare_batch(rows)
+    report.rejected.extend((first_record + position, row, reason) for position, row, reason in rejected)
+    return list(zip(dates, accounts, debits, credits, descriptions))
+
+
+@timed("load_csv", rows=lambda report: report.rows_loaded)
+def load_csv(ledger, path, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Append a ledger CSV to `ledger` in chunks, without any UI.
+
+    Rows are read with the C csv reader and handed a chunk at a time to
+    ledger.add_transactions, which validates the chunk as a batch and
+    updates the indexes once.
+    Bad rows never abort the load; they are collected in the returned
+    LoadReport. Record numbers count data rows from 1, excluding the header.
+    progress, if given, is called after each chunk with (bytes read, file size).
+    """
+    report = LoadReport(path)
+    start = time.perf_counter()
+    total_bytes = os.path.getsize(path)
+    with open(path, 'r', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)  # Skip the header row
+        record = 1
+        while True:
+            chunk = list(islice(reader, chunk_size))
+            if not chunk:
+                break
+            ledger.add_transactions(chunk, report=report, first_record=record)
+            record += len(chunk)
+            if progress is not None:
+                progress(csvfile.buffer.tell(), total_bytes)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+@timed("save_csv", rows=lambda rows: rows)
+def save_csv(ledger, path, row_count=None, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """Write the first `row_count` rows (default: all) of `ledger` as CSV.
+
+    Passing the row count taken when the save was requested lets the save run
+    in the background while new rows are appended to the live ledger. An
+    Entry column with each row's journal entry id is added when the ledger
+    has multi-line entries (0 marks a standalone line).
+    """
+    total = len(ledger.transactions) if row_count is None else row_count
+    with_entries = ledger.has_entries()
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(LEDGER_HEADER + [ENTRY_HEADER] if with_entries else LEDGER_HEADER)
+        for start in range(0, total, chunk_size):
+            stop = min(start + chunk_size, total)
+            # Amounts are written from exact cents, e.g. 12.50 rather than 12.5
+            rows = ((date, account, format_cents(debit), format_cents(credit), description)
+                    for date, account, debit, credit, description in ledger.get_records(start, stop))
+            if with_entries:
+                rows = (row + (entry_id,) for row, entry_id in zip(rows, ledger.get_entry_ids(start, stop)))
+            writer.writerows(rows)
+            if progress is not None:
+                progress(stop, total)
+    return total
@@ -0,0 +1,516 @@
+import sys
+from array import array
+from datetime import date as date_type, datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+_numpy = None
+
+CENTS_PER_UNIT = 100
+
+# Largest amount in cents the int64 columns can hold
+MAX_CENTS = 2 ** 63 - 1
+
+
+def numpy_module():
+    """Return numpy, imported on first use, or None when it is not installed.
+
+    numpy only speeds up bulk column work, so it is not imported until some
+    needs doing; short-lived command-line runs skip its startup cost.
+    """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:  # numpy ships with pandas, but the store works without it
+            _numpy = False
+    return _numpy or None
+
+# Date formats accepted at ingest, tried in order
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d", "%d-%b-%Y", "%b %d, %Y")
+
+# Column attributes of LedgerStore and their array typecodes
+COLUMN_TYPES = (("account_ids", "i"), ("date_ids", "i"), ("debits", "q"), ("credits", "q"),
+                ("description_ids", "i"), ("date_ordinals", "i"), ("entry_ids", "i"))
+
+# Entry id of lines that are not part of a multi-line journal entry
+NO_ENTRY = 0
+
+# Ordinal given to dates that cannot be parsed; sorts before every real date
+UNDATED = 0
+
+
+# Bytes of an int object held in a list, beyond the list's own pointer to it
+INT_BYTES = 28
+
+
+def held_bytes(values):
+    """Approximate bytes held by an array or a list of ints; mapped memoryviews count as 0."""
+    if isinstance(values, array):
+        return values.itemsize * len(values)
+    if isinstance(values, list):
+        return sys.getsizeof(values) + INT_BYTES * len(values)
+    return 0
+
+
+def to_cents(amount):
+    """Convert an amount (str, int, float or Decimal) to integer cents without float arithmetic.
+
+    Sub-cent digits are rounded half away from zero. Floats are taken at their
+    shortest repr, so 0.1 is ten cents; NumPy scalars are converted like the
+    Python numbers they hold. Raises ValueError for non-amounts and for
+    amounts too large to store.
+    """
+    cents = _parse_cents(amount)
+    if not -MAX_CENTS <= cents <= MAX_CENTS:
+        raise ValueError(f"Amount out of range: {amount!r}")
+    return cents
+
+
+def _parse_cents(amount):
+    if isinstance(amount, int):
+        return amount * CENTS_PER_UNIT
+    if hasattr(amount, "item") and not isinstance(amount, (str, bytes)):
+        amount = amount.item()  # NumPy scalar; repr(np.float64(1.5)) is "np.float64(1.5)"
+        if isinstance(amount, int):
+            return amount * CENTS_PER_UNIT
+    text = repr(float(amount)) if isinstance(amount, float) else str(amount)
+    # Fast path for plain decimals with at most two places, the usual CSV case
+    digits = text.strip()
+    sign = 1
+    if digits[:1] in ("-", "+"):
+        sign = -1 if digits[0] == "-" else 1
+        digits = digits[1:]
+    units, _, fraction = digits.partition(".")
+    if ((units.isdecimal() or (not units and fraction))
+            and (fraction.isdecimal() or not fraction) and len(fraction) <= 2):
+        return sign * (int(units or 0) * CENTS_PER_UNIT + int(fraction.ljust(2, "0")))
+    try:
+        value = Decimal(text.strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {amount!r}") from None
+    if not value.is_finite():
+        raise ValueError(f"Invalid amount: {amount!r}")
+    try:
+        return int((value * CENTS_PER_UNIT).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation:  # More digits than the decimal context holds
+        raise ValueError(f"Amount out of range: {amount!r}") from None
+
+
+def format_cents(cents):
+    """Format integer cents as a plain decimal string, e.g. -1234 -> "-12.34"."""
+    sign = "-" if cents < 0 else ""
+    units, cents = divmod(abs(cents), CENTS_PER_UNIT)
+    return f"{sign}{units}.{cents:02d}"
+
+
+def amount_error(debit_cents, credit_cents):
+    """Return why a debit/credit pair is not a valid ledger line, or None if it is."""
+    if debit_cents < 0 or credit_cents < 0:
+        return "Debits and credits must be non-negative."
+    if debit_cents == credit_cents:
+        return "Debit and credit must be unequal."
+    return None
+
+
+def parse_date(text):
+    """Return the proleptic Gregorian ordinal for a date string, or UNDATED."""
+    text = text.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).toordinal()
+        except ValueError:
+            continue
+    return UNDATED
+
+
+def to_ordinal(value):
+    """Normalise a query bound (None, ordinal, date or date string) to an ordinal."""
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, date_type):
+        return value.toordinal()
+    ordinal = parse_date(value)
+    if ordinal == UNDATED:
+        raise ValueError(f"Unrecognised date: {value!r}")
+    return ordinal
+
+
+class StringPool:
+    """Interns strings so each distinct value is stored once and referenced by an int id.
+
+    A pool opened from a mapped ledger file starts as the raw string table
+    (offsets + UTF-8 blob); single lookups decode one string, and the full
+    list and reverse index are only built when something needs them.
+    """
+
+    def __init__(self):
+        self._strings = []
+        self._ids = {}
+        self._table = None
+        # Bytes of the first _sized strings, so nbytes() only measures strings added since
+        self._sized = 0
+        self._string_bytes = 0
+
+    @classmethod
+    def from_table(cls, offsets, blob):
+        pool = cls()
+        pool._strings = None
+        pool._ids = None
+        pool._table = (offsets, blob)
+        return pool
+
+    @property
+    def strings(self):
+        if self._strings is None:
+            offsets, blob = self._table
+            data = bytes(blob)
+            self._strings = [data[offsets[i]:offsets[i + 1]].decode("utf-8")
+                             for i in range(len(offsets) - 1)]
+            self._table = None
+        return self._strings
+
+    def _index(self):
+        if self._ids is None:
+            self._ids = {value: string_id for string_id, value in enumerate(self.strings)}
+        return self._ids
+
+    def intern(self, value):
+        ids = self._index()
+        string_id = ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            ids[value] = string_id
+        return string_id
+
+    def lookup(self, value):
+        return self._index().get(value)
+
+    def __getitem__(self, string_id):
+        if self._strings is None:
+            offsets, blob = self._table
+            return str(blob[offsets[string_id]:offsets[string_id + 1]], "utf-8")
+        return self._strings[string_id]
+
+    def __len__(self):
+        if self._strings is None:
+            return len(self._table[0]) - 1
+        return len(self._strings)
+
+    def nbytes(self):
+        """Approximate bytes of the decoded strings and reverse index; a mapped table counts as 0."""
+        strings = self._strings
+        if strings is None:
+            return 0
+        self._string_bytes += sum(sys.getsizeof(strings[i]) for i in range(self._sized, len(strings)))
+        self._sized = len(strings)
+        size = sys.getsizeof(strings) + self._string_bytes
+        if self._ids is not None:
+            size += sys.getsizeof(self._ids)
+        return size
+
+    def copy(self, size=None):
+        """Return a pool of the first `size` strings (default: all) that later interns leave alone."""
+        size = len(self) if size is None else min(size, len(self))
+        if self._strings is None:
+            # A mapped table never changes, so the copy can share it
+            offsets, blob = self._table
+            return StringPool.from_table(offsets[:size + 1], blob)
+        pool = StringPool()
+        pool._strings = self._strings[:size]
+        pool._ids = None
+        return pool
+
+
+class TransactionRow:
+    """Read-only view of one stored row; exposes the same attributes as Transaction."""
+
+    __slots__ = ("_store", "index")
+
+    def __init__(self, store, index):
+        self._store = store
+        self.index = index
+
+    @property
+    def date(self):
+        return self._store.dates[self._store.date_ids[self.index]]
+
+    @property
+    def account(self):
+        return self._store.accounts[self._store.account_ids[self.index]]
+
+    @property
+    def debit(self):
+        return self._store.debits[self.index] / CENTS_PER_UNIT
+
+    @property
+    def credit(self):
+        return self._store.credits[self.index] / CENTS_PER_UNIT
+
+    @property
+    def description(self):
+        return self._store.descriptions[self._store.description_ids[self.index]]
+
+    def __repr__(self):
+        return (f"TransactionRow({self.date!r}, {self.account!r}, "
+                f"{format_cents(self._store.debits[self.index])}, "
+                f"{format_cents(self._store.credits[self.index])}, {self.description!r})")
+
+
+class TransactionList:
+    """Sequence of TransactionRow views over a LedgerStore, used as GeneralLedger.transactions."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __len__(self):
+        return len(self._store)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [TransactionRow(self._store, i) for i in range(*index.indices(len(self._store)))]
+        if index < 0:
+            index += len(self._store)
+        if not 0 <= index < len(self._store):
+            raise IndexError("transaction index out of range")
+        return TransactionRow(self._store, index)
+
+    def __iter__(self):
+        store = self._store
+        for i in range(len(store)):
+            yield TransactionRow(store, i)
+
+    def __bool__(self):
+        return len(self._store) > 0
+
+
+class LedgerStore:
+    """Columnar transaction storage.
+
+    Accounts, dates and descriptions are interned into string pools and
+    referenced by int32 ids; debits and credits are int64 cents. A row
+    costs 28 bytes of column data instead of a Python object per line.
+    Each distinct date string is parsed once, when it is first interned,
+    and its ordinal kept in date_ordinals (indexed by date id).
+    """
+
+    def __init__(self):
+        self.accounts = StringPool()
+        self.dates = StringPool()
+        self.date_ordinals = array("i")
+        self.descriptions = StringPool()
+        self.account_ids = array("i")
+        self.date_ids = array("i")
+        self.debits = array("q")
+        self.credits = array("q")
+        self.description_ids = array("i")
+        # Journal entry each row belongs to (NO_ENTRY for standalone lines)
+        self.entry_ids = array("i")
+        # Open mmap (and the file it maps) when the columns are zero-copy views of a ledger file
+        self.mapping = None
+        self.mapped_path = None
+
+    def __len__(self):
+        return len(self.account_ids)
+
+    def copy(self, row_count=None):
+        """Return a detached store holding the first `row_count` rows (default: all).
+
+        An array cannot grow while a memoryview or NumPy view of it is
+        alive, so work done off the Tk thread on a live ledger (saving,
+        checkpoints) reads a copy taken under the ledger's write_lock
+        instead of viewing the columns being appended to.
+        """
+        row_count = len(self) if row_count is None else row_count
+        store = LedgerStore()
+        store.accounts = self.accounts.copy()
+        store.dates = self.dates.copy(len(self.date_ordinals))
+        store.descriptions = self.descriptions.copy()
+        for attribute, typecode in COLUMN_TYPES:
+            size = len(store.dates) if attribute == "date_ordinals" else row_count
+            column = getattr(self, attribute)[:size]
+            if not isinstance(column, array):  # Slice of a mapped column
+                column = array(typecode, bytes(column))
+            setattr(store, attribute, column)
+        return store
+
+    def release_mapping(self):
+        """Copy mapped columns and pools into memory and close the mapping.
+
+        Pools are decoded so nothing views the mapping any more; the file
+        can then be replaced, which Windows refuses while it is mapped.
+        """
+        if self.mapping is None:
+            return
+        for name, typecode in COLUMN_TYPES:
+            column = array(typecode)
+            column.frombytes(memoryview(getattr(self, name)).cast("B"))
+            setattr(self, name, column)
+        for pool in (self.accounts, self.dates, self.descriptions):
+            pool.strings
+        try:
+            self.mapping.close()
+        except BufferError:
+            pass  # A copy being written elsewhere still views a pool; the mapping closes once it is gone
+        self.mapping = None
+        self.mapped_path = None
+
+    def _ensure_writable(self):
+        # Mapped columns are read-only memoryviews; copy them into arrays on first write
+        self.release_mapping()
+
+    def append(self, date, account, debit_cents, credit_cents, description, entry_id=NO_ENTRY):
+        return self.extend([(date, account, debit_cents, credit_cents, description)], [entry_id])
+
+    def _extend_rows(self, start, new_columns):
+        """Extend every row column by its new values (arrays of the same length), all or none.
+
+        A column cannot grow while a view of it is alive (BufferError); if
+        one fails, the columns already extended are cut back to `start`, so
+        the columns never disagree on the number of rows.
+        """
+        extended = []
+        try:
+            for column, values in new_columns:
+                column.extend(values)
+                extended.append(column)
+        except BaseException:
+            for column in extended:
+                del column[start:]
+            raise
+
+    def extend(self, rows, entry_ids=None):
+        """Append (date, account, debit_cents, credit_cents, description) rows; return the first index.
+
+        entry_ids gives each row's journal entry; by default they are standalone lines.
+        """
+        self._ensure_writable()
+        start = len(self.account_ids)
+        intern_date = self.intern_date
+        intern_account = self.accounts.intern
+        intern_description = self.descriptions.intern
+        date_ids = []
+        account_ids = []
+        debits = []
+        credits = []
+        description_ids = []
+        for date, account, debit_cents, credit_cents, description in rows:
+            date_ids.append(intern_date(date))
+            account_ids.append(intern_account(account))
+            debits.append(debit_cents)
+            credits.append(credit_cents)
+            description_ids.append(intern_description(description))
+        # Converted before any column is touched, so an out-of-range value changes nothing
+        entry_ids = array("i", bytes(4 * len(description_ids)) if entry_ids is None else entry_ids)
+        self._extend_rows(start, ((self.date_ids, array("i", date_ids)), (self.account_ids, array("i", account_ids)),
+                                  (self.debits, array("q", debits)), (self.credits, array("q", credits)),
+                                  (self.description_ids, array("i", description_ids)),
+                                  (self.entry_ids, entry_ids)))
+        return start
+
+    def extend_columns(self, dates, accounts, debit_cents, credit_cents, descriptions, entry_ids):
+        """Append a validated batch given as six columns; return the first index.
+
+        Each distinct string is interned once, in first-use order, and cent
+        columns that are NumPy arrays are copied in as raw bytes.
+        """
+        self._ensure_writable()
+        start = len(self.account_ids)
+        new_columns = []
+        for column, values, intern in ((self.date_ids, dates, self.intern_date),
+                                       (self.account_ids, accounts, self.accounts.intern),
+                                       (self.description_ids, descriptions, self.descriptions.intern)):
+            ids = {value: intern(value) for value in dict.fromkeys(values)}
+            new_columns.append((column, array("i", map(ids.__getitem__, values))))
+        for column, values in ((self.debits, debit_cents), (self.credits, credit_cents),
+                               (self.entry_ids, entry_ids)):
+            if isinstance(values, (list, array)):
+                new_columns.append((column, array(column.typecode, values)))
+            else:
+                new_columns.append((column, array(column.typecode, values.astype(f"={column.typecode}").tobytes())))
+        self._extend_rows(start, new_columns)
+        return start
+
+    def intern_date(self, date):
+        date_id = self.dates.lookup(date)
+        if date_id is None:
+            # The ordinal goes in first: if its column cannot grow, the pool is left as it was
+            self.date_ordinals.append(parse_date(date))
+            date_id = self.dates.intern(date)
+        return date_id
+
+    def ordinal(self, index):
+        return self.date_ordinals[self.date_ids[index]]
+
+    def clear(self):
+        self.__init__()
+
+    def rows(self):
+        return TransactionList(self)
+
+    def record(self, index):
+        """Return row `index` as (date, account, debit_cents, credit_cents, description)."""
+        return (self.dates[self.date_ids[index]], self.accounts[self.account_ids[index]],
+                self.debits[index], self.credits[index], self.descriptions[self.description_ids[index]])
+
+    def records(self, start, stop):
+        """Return rows [start, stop) as (date, account, debit_cents, credit_cents, description)."""
+        stop = min(stop, len(self))
+        return [(self.dates[self.date_ids[i]], self.accounts[self.account_ids[i]],
+                 self.debits[i], self.credits[i], self.descriptions[self.description_ids[i]])
+                for i in range(start, stop)]
+
+    def page(self, start, stop):
+        """Return rows [start, stop) as (date, account, debit, credit, description) tuples."""
+        stop = min(stop, len(self))
+        dates = self.dates.strings
+        accounts = self.accounts.strings
+        descriptions = self.descriptions
+        return [(dates[self.date_ids[i]], accounts[self.account_ids[i]],
+                 self.debits[i] / CENTS_PER_UNIT, self.credits[i] / CENTS_PER_UNIT,
+                 descriptions[self.description_ids[i]])
+                for i in range(start, stop)]
+
+    def nbytes(self):
+        """Approximate bytes of the columns and string pools; parts still mapped from a file count as 0."""
+        return (sum(held_bytes(getattr(self, name)) for name, _ in COLUMN_TYPES)
+                + self.accounts.nbytes() + self.dates.nbytes() + self.descriptions.nbytes())
+
+    def postings_by_account(self):
+        """Return, per account id, an array of the row numbers posted to it, in row order."""
+        size = len(self.accounts)
+        np = numpy_module() if len(self) else None
+        if np is not None:
+            ids = np.frombuffer(self.account_ids, dtype=np.int32)
+            order = np.argsort(ids, kind="stable").astype(np.int32)
+            bounds = np.searchsorted(ids[order], np.arange(size + 1)).tolist()
+            postings = []
+            for account_id in range(size):
+                rows = array("i")
+                rows.frombytes(order[bounds[account_id]:bounds[account_id + 1]].tobytes())
+                postings.append(rows)
+            return postings
+        postings = [array("i") for _ in range(size)]
+        for index, account_id in enumerate(self.account_ids):
+            postings[account_id].append(index)
+        return postings
+
+    def account_sums(self, stop=None):
+        """Return per-account-id (debit_cents, credit_cents) lists over rows [0, stop)."""
+        size = len(self.accounts)
+        stop = len(self) if stop is None else stop
+        np = numpy_module() if stop else None
+        if np is not None:
+            ids = np.frombuffer(self.account_ids, dtype=np.int32, count=stop)
+            debit_totals = np.zeros(size, dtype=np.int64)
+            credit_totals = np.zeros(size, dtype=np.int64)
+            np.add.at(debit_totals, ids, np.frombuffer(self.debits, dtype=np.int64, count=stop))
+            np.add.at(credit_totals, ids, np.frombuffer(self.credits, dtype=np.int64, count=stop))
+            return debit_totals.tolist(), credit_totals.tolist()
+        debit_totals = [0] * size
+        credit_totals = [0] * size
+        for account_id, debit, credit in zip(self.account_ids[:stop], self.debits[:stop], self.credits[:stop]):
+            debit_totals[account_id] += debit
+            credit_totals[account_id] += credit
+        return debit_totals, credit_totals
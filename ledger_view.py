@@ -0,0 +1,144 @@
+import tkinter as tk
+from tkinter import ttk
+
+from instrumentation import timed
+from ledger_store import format_cents
+
+LEDGER_COLUMNS = ("Date", "Account", "Debit", "Credit", "Description")
+
+
+class VirtualLedgerView:
+    """Ledger Treeview that only holds the rows currently on screen.
+
+    The Treeview keeps one item per visible line; scrolling asks the ledger
+    for the matching page of rows and rewrites those items in place, so
+    widget memory and redraw cost depend on the window height, not on the
+    number of transactions. The scrollbar is driven by row offsets.
+
+    A filter (set_filter) restricts the view to a list of row numbers, e.g.
+    search results; offsets then index into that list.
+    """
+
+    def __init__(self, parent, get_ledger, row_height=20):
+        self.get_ledger = get_ledger
+        self.row_height = row_height
+        self.first_row = 0
+        self.visible_rows = 20
+        self.known_rows = 0
+        self.rows = None  # Row numbers shown when filtered
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=LEDGER_COLUMNS, height=self.visible_rows)
+        for number, column in enumerate(LEDGER_COLUMNS, 1):
+            self.tree.heading(f"#{number}", text=column)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self.yview)
+        self.scrollbar.pack(side='right', fill='y')
+        self.tree.pack(side='left', fill='both', expand=True)
+
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<MouseWheel>", self.on_mousewheel)
+        self.tree.bind("<Button-4>", lambda event: self.scroll_rows(-3))
+        self.tree.bind("<Button-5>", lambda event: self.scroll_rows(3))
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def total_rows(self):
+        if self.rows is not None:
+            return len(self.rows)
+        return len(self.get_ledger().transactions)
+
+    def set_filter(self, rows, keep_position=False):
+        """Show only the given row numbers, in order, or every row for None."""
+        self.rows = rows
+        if not keep_position:
+            self.first_row = 0
+        self.refresh()
+
+    def at_end(self):
+        return self.first_row + self.visible_rows >= self.known_rows
+
+    @timed("ledger_view.refresh")
+    def refresh(self):
+        """Redraw the current window, e.g. after the ledger has been replaced."""
+        self.known_rows = self.total_rows()
+        self.first_row = max(0, min(self.first_row, self.known_rows - self.visible_rows))
+        ledger = self.get_ledger()
+        if self.rows is None:
+            rows = ledger.get_records(self.first_row, self.first_row + self.visible_rows)
+        else:
+            rows = ledger.get_records_at(self.rows[self.first_row:self.first_row + self.visible_rows])
+        items = self.tree.get_children()
+        for item, row in zip(items, rows):
+            self.tree.item(item, values=self.format_row(row))
+        for row in rows[len(items):]:
+            self.tree.insert("", tk.END, values=self.format_row(row))
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+        self.update_scrollbar()
+
+    def row_appended(self):
+        """Show rows added since the last draw without redrawing the whole window."""
+        if self.rows is not None:
+            return  # New rows join a filtered view when the filter is re-run
+        total = self.total_rows()
+        if total == self.known_rows:
+            return
+        was_at_end = self.at_end()
+        first_new = self.known_rows
+        self.known_rows = total
+        if not was_at_end:
+            self.update_scrollbar()
+            return
+        if total - first_new >= self.visible_rows:
+            self.first_row = total - self.visible_rows
+            self.refresh()
+            return
+        new_rows = self.get_ledger().get_records(first_new, total)
+        # Follow the tail: append the new lines and drop the ones scrolled off the top
+        for row in new_rows:
+            self.tree.insert("", tk.END, values=self.format_row(row))
+        items = self.tree.get_children()
+        overflow = len(items) - self.visible_rows
+        if overflow > 0:
+            self.tree.delete(*items[:overflow])
+            self.first_row += overflow
+        self.update_scrollbar()
+
+    def format_row(self, row):
+        date, account, debit_cents, credit_cents, description = row
+        return (date, account, format_cents(debit_cents), format_cents(credit_cents), description)
+
+    def update_scrollbar(self):
+        if self.known_rows <= self.visible_rows:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.first_row / self.known_rows,
+                               (self.first_row + self.visible_rows) / self.known_rows)
+
+    def scroll_to(self, first_row):
+        first_row = max(0, min(int(first_row), self.known_rows - self.visible_rows))
+        if first_row != self.first_row:
+            self.first_row = first_row
+            self.refresh()
+
+    def scroll_rows(self, count):
+        self.scroll_to(self.first_row + count)
+
+    def yview(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to(float(args[1]) * self.known_rows)
+        elif args[0] == 'scroll':
+            step = self.visible_rows if args[2] == 'pages' else 1
+            self.scroll_rows(int(args[1]) * step)
+
+    def on_mousewheel(self, event):
+        self.scroll_rows(-3 if event.delta > 0 else 3)
+        return "break"
+
+    def on_resize(self, event):
+        # Header row takes roughly one line of the widget height
+        visible_rows = max(1, event.height // self.row_height - 1)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.refresh()
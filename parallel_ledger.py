@@ -0,0 +1,215 @@
+"""Partitioned, multi-process balance aggregation over ledger files.
+
+PartitionedLedger answers balance queries for a .gl or CSV file without
+loading it: the file is split into partitions (row ranges of the mapped
+.gl columns, or line-aligned byte ranges of a CSV), each partition is
+summed per account in a worker process, and the partial sums are merged.
+Workers only touch their own slice of the file, so memory stays bounded
+however large the ledger is, and throughput scales with the worker count.
+
+It has the balance methods StatementEngine and the tax forms use, so it
+can stand in for a GeneralLedger there:
+
+    engine = StatementEngine(PartitionedLedger("books.gl", workers=8), end_date="2024-12-31")
+
+CSV partitions assume one record per line, which holds for files written
+by this application.
+"""
+import csv
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from journal import JournalError, journal_path, read_journal
+from ledger import GeneralLedger
+from ledger_format import column_view, is_ledger_file, map_ledger_file, read_ledger_file
+from ledger_io import LoadReport, parse_rows
+from ledger_store import CENTS_PER_UNIT, numpy_module, parse_date, to_ordinal
+
+# Rows of a .gl file, or bytes of a CSV file, summed by one task
+PARTITION_ROWS = 4_000_000
+PARTITION_BYTES = 64 * 1024 * 1024
+
+
+def in_period(ordinal, start, end):
+    return (start is None or ordinal >= start) and (end is None or ordinal <= end)
+
+
+def sum_ledger_partition(path, start, stop, start_ordinal, end_ordinal):
+    """Sum rows [start, stop) of a .gl file per account id, within the date bounds.
+
+    Returns (debits, credits, counts), each a list indexed by account id.
+    """
+    _, _, sections = map_ledger_file(path)
+    account_ids = column_view(sections, "account_ids")[start:stop]
+    date_ids = column_view(sections, "date_ids")[start:stop]
+    debits = column_view(sections, "debits")[start:stop]
+    credits = column_view(sections, "credits")[start:stop]
+    date_ordinals = column_view(sections, "date_ordinals")
+
+    np = numpy_module() if len(account_ids) else None
+    if np is not None:
+        ids = np.frombuffer(account_ids, dtype=np.int32)
+        size = int(ids.max()) + 1
+        debit_values = np.frombuffer(debits, dtype=np.int64)
+        credit_values = np.frombuffer(credits, dtype=np.int64)
+        if start_ordinal is not None or end_ordinal is not None:
+            ordinals = np.frombuffer(date_ordinals, dtype=np.int32)[np.frombuffer(date_ids, dtype=np.int32)]
+            mask = np.ones(len(ids), dtype=bool)
+            if start_ordinal is not None:
+                mask &= ordinals >= start_ordinal
+            if end_ordinal is not None:
+                mask &= ordinals <= end_ordinal
+            ids, debit_values, credit_values = ids[mask], debit_values[mask], credit_values[mask]
+        debit_totals = np.zeros(size, dtype=np.int64)
+        credit_totals = np.zeros(size, dtype=np.int64)
+        np.add.at(debit_totals, ids, debit_values)
+        np.add.at(credit_totals, ids, credit_values)
+        counts = np.bincount(ids, minlength=size)
+        return debit_totals.tolist(), credit_totals.tolist(), counts.tolist()
+
+    size = max(account_ids, default=-1) + 1
+    debit_totals = [0] * size
+    credit_totals = [0] * size
+    counts = [0] * size
+    for account_id, date_id, debit, credit in zip(account_ids, date_ids, debits, credits):
+        if in_period(date_ordinals[date_id], start_ordinal, end_ordinal):
+            debit_totals[account_id] += debit
+            credit_totals[account_id] += credit
+            counts[account_id] += 1
+    return debit_totals, credit_totals, counts
+
+
+def sum_csv_partition(path, start, stop, start_ordinal, end_ordinal):
+    """Sum the CSV records that begin in bytes [start, stop) per account name.
+
+    Returns ({account: [debit, credit, rows]}, rejected row count). The
+    header is skipped by the partition that starts at 0.
+    """
+    with open(path, "rb") as csvfile:
+        csvfile.seek(max(start - 1, 0))
+        # From 0 this skips the header; otherwise it finishes the line that straddles
+        # the boundary, which belongs to the previous partition
+        csvfile.readline()
+        begin = csvfile.tell()
+        data = csvfile.read(max(stop - begin, 0))
+        if data and not data.endswith(b"\n"):
+            data += csvfile.readline()  # Finish the last line that starts before stop
+    report = LoadReport(path)
+    # Read as load_csv does (newline=""), so \r, \x0b, \u2028 etc. inside a quoted field stay in it
+    rows = parse_rows(csv.reader(io.StringIO(data.decode("utf-8"), newline="")), 0, report)
+    totals = {}
+    ordinals = {}
+    bounded = start_ordinal is not None or end_ordinal is not None
+    for date, account, debit, credit, _ in rows:
+        if bounded:
+            ordinal = ordinals.get(date)
+            if ordinal is None:
+                ordinal = ordinals[date] = parse_date(date)
+            if not in_period(ordinal, start_ordinal, end_ordinal):
+                continue
+        sums = totals.get(account)
+        if sums is None:
+            sums = totals[account] = [0, 0, 0]
+        sums[0] += debit
+        sums[1] += credit
+        sums[2] += 1
+    return totals, len(report.rejected)
+
+
+class PartitionedLedger:
+    """Read-only, file-backed ledger whose balance queries run as partitioned parallel scans."""
+
+    def __init__(self, path, workers=None, partition_rows=PARTITION_ROWS, partition_bytes=PARTITION_BYTES):
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        self.partition_rows = partition_rows
+        self.partition_bytes = partition_bytes
+        self.rows_rejected = 0
+
+    def partitions(self, total, size):
+        # At least one partition per worker, and none larger than `size`
+        count = max(self.workers, -(-total // size))
+        step = max(-(-total // count), 1)
+        return [(start, min(start + step, total)) for start in range(0, total, step)]
+
+    def run(self, func, ranges, start_ordinal, end_ordinal):
+        tasks = [(self.path, start, stop, start_ordinal, end_ordinal) for start, stop in ranges]
+        if self.workers == 1 or len(tasks) <= 1:
+            return [func(*task) for task in tasks]
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(func, *zip(*tasks)))
+
+    def account_sums(self, start_date=None, end_date=None):
+        """Return {account: (debit_cents, credit_cents)}; with a date bound, only
+        accounts that have rows in the period are included."""
+        start_ordinal = to_ordinal(start_date)
+        end_ordinal = to_ordinal(end_date)
+        if is_ledger_file(self.path):
+            totals = self._ledger_file_sums(start_ordinal, end_ordinal)
+        else:
+            totals = self._csv_sums(start_ordinal, end_ordinal)
+        bounded = start_ordinal is not None or end_ordinal is not None
+        return {account: (debit, credit) for account, (debit, credit, rows) in totals.items()
+                if rows or not bounded}
+
+    def _ledger_file_sums(self, start_ordinal, end_ordinal):
+        base = GeneralLedger()
+        row_count = read_ledger_file(base, self.path)
+        accounts = base.get_accounts()
+        if start_ordinal is None and end_ordinal is None:
+            # Whole-file totals are stored in the file; no scan needed
+            totals = {account: [debit, credit, 1] for account, (debit, credit)
+                      in base._account_sums().items()}
+        else:
+            totals = {account: [0, 0, 0] for account in accounts}
+            # Month-end snapshots stored in the file answer most period queries without a scan
+            period = base._snapshot_sums(start_ordinal, end_ordinal, build=False)
+            if period is not None:
+                for account_id, (debit, credit) in period.items():
+                    totals[accounts[account_id]] = [debit, credit, 1]
+                ranges = []
+            else:
+                ranges = self.partitions(row_count, self.partition_rows)
+            for debits, credits, counts in self.run(sum_ledger_partition, ranges, start_ordinal, end_ordinal):
+                for account_id, (debit, credit, rows) in enumerate(zip(debits, credits, counts)):
+                    sums = totals[accounts[account_id]]
+                    sums[0] += debit
+                    sums[1] += credit
+                    sums[2] += rows
+        # Rows still in the journal are few (it is checkpointed); fold them in here
+        log_path = journal_path(self.path)
+        if os.path.exists(log_path):
+            journal_base, rows, _, _ = read_journal(log_path)
+            if journal_base > row_count:
+                raise JournalError("Journal is newer than its ledger file.")
+            for date, account, debit, credit, _ in rows[row_count - journal_base:]:
+                if in_period(parse_date(date), start_ordinal, end_ordinal):
+                    sums = totals.setdefault(account, [0, 0, 0])
+                    sums[0] += debit
+                    sums[1] += credit
+                    sums[2] += 1
+        return totals
+
+    def _csv_sums(self, start_ordinal, end_ordinal):
+        ranges = self.partitions(os.path.getsize(self.path), self.partition_bytes)
+        totals = {}
+        self.rows_rejected = 0
+        for partial, rejected in self.run(sum_csv_partition, ranges, start_ordinal, end_ordinal):
+            self.rows_rejected += rejected
+            for account, (debit, credit, rows) in partial.items():
+                sums = totals.setdefault(account, [0, 0, 0])
+                sums[0] += debit
+                sums[1] += credit
+                sums[2] += rows
+        return totals
+
+    get_period_totals_cents = account_sums
+
+    def get_balances_cents(self, start_date=None, end_date=None):
+        return {account: debit - credit
+                for account, (debit, credit) in self.account_sums(start_date, end_date).items()}
+
+    def get_account_balances(self, start_date=None, end_date=None):
+        return {account: balance / CENTS_PER_UNIT
+                for account, balance in self.get_balances_cents(start_date, end_date).items()}
@@ -0,0 +1,131 @@
+from array import array
+from bisect import bisect_right
+from datetime import date
+
+from ledger_store import UNDATED, held_bytes, numpy_module
+
+# Sorts after every date ordinal; the first row date of a period with no rows
+NO_ROWS = 2 ** 31 - 1
+
+
+def period_end(ordinal):
+    """Ordinal of the last day of the month `ordinal` falls in (UNDATED stays UNDATED)."""
+    if ordinal == UNDATED:
+        return UNDATED
+    day = date.fromordinal(ordinal)
+    if day.month == 12:
+        return date(day.year + 1, 1, 1).toordinal() - 1
+    return date(day.year, day.month + 1, 1).toordinal() - 1
+
+
+def period_start(ordinal):
+    """Ordinal of the first day of the month `ordinal` falls in (UNDATED stays UNDATED)."""
+    if ordinal == UNDATED:
+        return UNDATED
+    return date.fromordinal(ordinal).replace(day=1).toordinal()
+
+
+class PeriodSnapshots:
+    """Per-account closing totals at every month end, over the first `covered` rows.
+
+    For each period (a month with rows; undated rows form a period ending
+    at UNDATED) the debit, credit and row totals of every account over the
+    rows dated up to the period's end are stored as one row of a
+    periods x accounts grid, flattened. Year-end balances are the December
+    rows. firsts[k] is the earliest row date within period k, so a
+    snapshot also answers for any date before the next period's first row.
+
+    A cumulative query is the nearest snapshot plus the rows appended
+    after `covered`; dates the snapshots cannot answer return None, and
+    the caller falls back on the date index.
+    """
+
+    def __init__(self, ends=(), firsts=(), debits=(), credits=(), counts=(), covered=0):
+        self.ends = ends
+        self.firsts = firsts
+        self.debits = debits
+        self.credits = credits
+        self.counts = counts
+        self.covered = covered
+        self.account_count = len(debits) // len(ends) if len(ends) else 0
+
+    def nbytes(self):
+        """Bytes of the period grids; grids still mapped from a ledger file count as 0."""
+        return sum(held_bytes(values) for values in (self.ends, self.firsts, self.debits, self.credits, self.counts))
+
+    def copy(self):
+        """Return the snapshots with their grids copied into arrays, e.g. to outlive a mapped ledger file."""
+        return PeriodSnapshots(*(array(typecode, bytes(values)) for values, typecode in
+                                 ((self.ends, "i"), (self.firsts, "i"), (self.debits, "q"),
+                                  (self.credits, "q"), (self.counts, "q"))), self.covered)
+
+    @classmethod
+    def build(cls, store, stop=None):
+        stop = len(store) if stop is None else stop
+        ordinals = store.date_ordinals
+        ends = sorted({period_end(ordinal) for ordinal in ordinals[:len(store.dates)]})
+        period_of_date = [bisect_right(ends, period_end(ordinal)) - 1 for ordinal in ordinals]
+        account_count = len(store.accounts)
+        size = len(ends) * account_count
+        np = numpy_module() if stop else None
+        if np is not None:
+            date_ids = np.frombuffer(store.date_ids, dtype=np.int32, count=stop)
+            account_ids = np.frombuffer(store.account_ids, dtype=np.int32, count=stop)
+            keys = np.asarray(period_of_date, dtype=np.int64)[date_ids] * account_count + account_ids
+            grids = []
+            for amounts in (store.debits, store.credits):
+                grid = np.zeros(size, dtype=np.int64)
+                np.add.at(grid, keys, np.frombuffer(amounts, dtype=np.int64, count=stop))
+                grids.append(grid)
+            grids.append(np.bincount(keys, minlength=size).astype(np.int64))
+            grids = [array("q", grid.reshape(len(ends), account_count).cumsum(axis=0).tobytes()) for grid in grids]
+            used = np.flatnonzero(np.bincount(date_ids, minlength=len(ordinals)))
+            firsts = np.full(len(ends), NO_ROWS, dtype=np.int32)
+            np.minimum.at(firsts, np.asarray(period_of_date, dtype=np.int64)[used],
+                          np.frombuffer(ordinals, dtype=np.int32)[used])
+            return cls(array("i", ends), array("i", firsts.tobytes()), *grids, stop)
+
+        debits, credits, counts = (array("q", bytes(8 * size)) for _ in range(3))
+        firsts = array("i", [NO_ROWS] * len(ends))
+        for row in range(stop):
+            date_id = store.date_ids[row]
+            period = period_of_date[date_id]
+            key = period * account_count + store.account_ids[row]
+            debits[key] += store.debits[row]
+            credits[key] += store.credits[row]
+            counts[key] += 1
+            firsts[period] = min(firsts[period], ordinals[date_id])
+        for grid in (debits, credits, counts):
+            for key in range(account_count, size):
+                grid[key] += grid[key - account_count]
+        return cls(array("i", ends), firsts, debits, credits, counts, stop)
+
+    def cumulative(self, store, ordinal=None):
+        """Return {account_id: (debit, credit, rows)} over rows dated up to `ordinal` (None: all).
+
+        Returns None when `ordinal` falls after a snapshot but on or after
+        rows dated later in the following period.
+        """
+        if ordinal is None:
+            period = len(self.ends) - 1
+        else:
+            period = bisect_right(self.ends, ordinal) - 1
+            if period + 1 < len(self.ends) and self.firsts[period + 1] <= ordinal:
+                return None
+        totals = {}
+        if period >= 0:
+            lo = period * self.account_count
+            for account_id, (debit, credit, rows) in enumerate(zip(
+                    self.debits[lo:lo + self.account_count], self.credits[lo:lo + self.account_count],
+                    self.counts[lo:lo + self.account_count])):
+                if rows:
+                    totals[account_id] = (debit, credit, rows)
+        # Rows appended since the snapshots were taken
+        ordinals = store.date_ordinals
+        for row in range(self.covered, len(store)):
+            if ordinal is not None and ordinals[store.date_ids[row]] > ordinal:
+                continue
+            account_id = store.account_ids[row]
+            debit, credit, rows = totals.get(account_id, (0, 0, 0))
+            totals[account_id] = (debit + store.debits[row], credit + store.credits[row], rows + 1)
+        return totals
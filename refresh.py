@@ -0,0 +1,110 @@
+from ledger_store import UNDATED, parse_date
+
+# Quiet time after the last change of a burst before the refresh it triggers
+REFRESH_DELAY_MS = 100
+
+# Account types behind the statement figures (revenue, expenses, net income) tax forms read
+INCOME_TYPES = ("revenue", "expense")
+
+
+class Change:
+    """What has changed since a view last refreshed: some accounts over a span of dates, or everything."""
+
+    def __init__(self):
+        self.everything = False
+        self.accounts = set()
+        self.first_date = None  # Date ordinals spanned by the changed rows
+        self.last_date = None
+
+    def add(self, accounts=None, dates=None):
+        if accounts is None:
+            self.everything = True
+            return
+        self.accounts.update(accounts)
+        for date in dates or ():
+            ordinal = parse_date(date)
+            if ordinal == UNDATED:
+                continue
+            if self.first_date is None or ordinal < self.first_date:
+                self.first_date = ordinal
+            if self.last_date is None or ordinal > self.last_date:
+                self.last_date = ordinal
+
+    def touches(self, accounts=None, start=None, end=None):
+        """Whether the change can affect a view of `accounts` (None: all) over [start, end] ordinals."""
+        if self.everything:
+            return True
+        if accounts is not None and not self.accounts.intersection(accounts):
+            return False
+        if self.first_date is None:
+            return True  # Rows without a usable date may land in any period
+        return (start is None or self.last_date >= start) and (end is None or self.first_date <= end)
+
+
+def statements_affected(chart):
+    """affected() test for the financial statements: a change to any account `chart` classifies.
+
+    The statements cover every date, so the changed dates do not matter.
+    """
+    return lambda change: change.touches([account for account in change.accounts
+                                          if chart.classify(account) is not None])
+
+
+def tax_forms_affected(chart, forms):
+    """affected() test for tax forms: a change to an account a line reads, or to a revenue or
+    expense account behind the statement figures. Like the statements, the forms cover every date.
+    """
+    form_accounts = set().union(*(form.accounts() for form in forms))
+    return lambda change: change.touches([account for account in change.accounts
+                                          if account in form_accounts or chart.classify(account) in INCOME_TYPES])
+
+
+class RefreshScheduler:
+    """Coalesces ledger changes into as few view refreshes as possible.
+
+    Views are registered with a refresh callback, a visibility test and
+    optionally an `affected(change)` test. invalidate() only records the
+    change against every view (O(views), whatever the ledger size) and
+    (re)schedules a flush for delay_ms later, so a burst of edits less than
+    delay_ms apart becomes one flush after the last of them. A flush refreshes the visible views the accumulated change
+    affects and drops the change for unaffected ones; hidden views keep
+    theirs until shown() flushes them.
+    """
+
+    def __init__(self, master, delay_ms=REFRESH_DELAY_MS):
+        self.master = master
+        self.delay_ms = delay_ms
+        self.views = {}  # name -> [refresh, is_visible, affected, pending Change or None]
+        self.after_id = None
+
+    def add_view(self, name, refresh, is_visible, affected=None):
+        self.views[name] = [refresh, is_visible, affected, None]
+
+    def invalidate(self, accounts=None, dates=None):
+        """Record a change to `accounts` on `dates`; leave both out when the whole ledger changed."""
+        for view in self.views.values():
+            if view[3] is None:
+                view[3] = Change()
+            view[3].add(accounts, dates)
+        if self.after_id is not None:
+            self.master.after_cancel(self.after_id)
+        self.after_id = self.master.after(self.delay_ms, self.flush)
+
+    def clean(self, name):
+        """Mark a view as current, e.g. after it was redrawn by other means."""
+        self.views[name][3] = None
+
+    def flush(self):
+        if self.after_id is not None:
+            self.master.after_cancel(self.after_id)
+            self.after_id = None
+        for view in self.views.values():
+            refresh, is_visible, affected, change = view
+            if change is None or not is_visible():
+                continue
+            view[3] = None
+            if affected is None or affected(change):
+                refresh(change)
+
+    # A tab or window that has just become visible catches up at once
+    shown = flush
@@ -0,0 +1,211 @@
+import re
+import sys
+from array import array
+from bisect import bisect_left, insort
+
+from ledger_store import held_bytes, numpy_module, to_cents, to_ordinal
+
+TOKEN = re.compile(r"\w+")
+
+# Descriptions interned since the last build that trigger a rebuild (or a quarter of the indexed ones)
+REBUILD_DESCRIPTIONS = 10_000
+
+# Sorts after every character a token can contain, so [prefix, prefix + END) spans the prefix's tokens
+END = "\U0010ffff"
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def account_counts(store, rows):
+    """Return {account: number of the given rows posted to it}, for showing facet counts."""
+    accounts = store.accounts
+    np = numpy_module() if len(rows) else None
+    if np is not None:
+        ids = np.frombuffer(store.account_ids, dtype=np.int32, count=len(store))
+        counts = np.bincount(ids[np.frombuffer(rows, dtype=np.int32)], minlength=len(accounts))
+        return {accounts[account_id]: int(counts[account_id]) for account_id in np.flatnonzero(counts).tolist()}
+    counts = {}
+    for row in rows:
+        account = accounts[store.account_ids[row]]
+        counts[account] = counts.get(account, 0) + 1
+    return counts
+
+
+class SearchIndex:
+    """Inverted index from description words to description ids, for filtering rows.
+
+    Descriptions are pooled, so the index maps each lower-cased word to the
+    ids of the distinct descriptions containing it, not to rows. Words are
+    kept sorted with their ids in one flat array (word i owns
+    ids[offsets[i]:offsets[i + 1]]), so the ids of every word starting with
+    a prefix are a single slice. Descriptions interned after the build go
+    to a small `recent` map until there are enough of them to rebuild.
+
+    match_rows narrows the candidate rows facet by facet (account, text,
+    date, amount), so each facet only looks at the rows the previous ones
+    kept.
+    """
+
+    def __init__(self):
+        self.words = []
+        self.offsets = array("q", [0])
+        self.ids = array("i")
+        self.recent = {}  # word -> description ids interned since the build
+        self.recent_words = []
+        self.indexed = 0  # Descriptions of the pool indexed so far
+
+    @classmethod
+    def build(cls, store):
+        index = cls()
+        index._build(store)
+        return index
+
+    def _build(self, store):
+        words = {}
+        for description_id, description in enumerate(store.descriptions.strings):
+            for word in tokenize(description):
+                ids = words.get(word)
+                if ids is None:
+                    words[word] = [description_id]
+                elif ids[-1] != description_id:
+                    ids.append(description_id)
+        self.words = sorted(words)
+        self.ids = array("i")
+        self.offsets = array("q", [0])
+        for word in self.words:
+            self.ids.extend(words[word])
+            self.offsets.append(len(self.ids))
+        self.recent = {}
+        self.recent_words = []
+        self.indexed = len(store.descriptions)
+
+    def nbytes(self):
+        """Approximate bytes of the words, their postings and the recent map."""
+        size = sys.getsizeof(self.words) + sum(map(sys.getsizeof, self.words))
+        size += held_bytes(self.offsets) + held_bytes(self.ids)
+        size += sys.getsizeof(self.recent) + held_bytes(self.recent_words)
+        size += sum(sys.getsizeof(word) + held_bytes(ids) for word, ids in self.recent.items())
+        return size
+
+    def add(self, store):
+        """Index descriptions interned since the last call."""
+        descriptions = store.descriptions
+        if len(descriptions) - self.indexed > max(REBUILD_DESCRIPTIONS, self.indexed // 4):
+            self._build(store)
+            return
+        for description_id in range(self.indexed, len(descriptions)):
+            for word in tokenize(descriptions[description_id]):
+                ids = self.recent.get(word)
+                if ids is None:
+                    self.recent[word] = [description_id]
+                    insort(self.recent_words, word)
+                elif ids[-1] != description_id:
+                    ids.append(description_id)
+        self.indexed = len(descriptions)
+
+    def prefix_ids(self, prefix):
+        """Return (slice of the flat id array, recent ids) of the descriptions with a word starting with `prefix`."""
+        start = bisect_left(self.words, prefix)
+        stop = bisect_left(self.words, prefix + END, start)
+        recent = []
+        first = bisect_left(self.recent_words, prefix)
+        for word in self.recent_words[first:bisect_left(self.recent_words, prefix + END, first)]:
+            recent.extend(self.recent[word])
+        return self.offsets[start], self.offsets[stop], recent
+
+    def description_ids(self, text):
+        """Set of the description ids matching every word of `text` as a prefix; None if text has no words."""
+        matched = None
+        for prefix in tokenize(text):
+            lo, hi, recent = self.prefix_ids(prefix)
+            ids = set(self.ids[lo:hi])
+            ids.update(recent)
+            matched = ids if matched is None else matched & ids
+            if not matched:
+                break
+        return matched
+
+    def description_mask(self, np, text, size):
+        """Boolean array over description ids, like description_ids(); None if text has no words."""
+        matched = None
+        flat = np.frombuffer(self.ids, dtype=np.int32)
+        for prefix in tokenize(text):
+            lo, hi, recent = self.prefix_ids(prefix)
+            hit = np.zeros(size, dtype=bool)
+            hit[flat[lo:hi]] = True
+            hit[recent] = True
+            matched = hit if matched is None else matched & hit
+        return matched
+
+    def match_rows(self, store, account_id=None, text="", start_date=None, end_date=None,
+                   min_amount=None, max_amount=None):
+        """Return the row numbers matching every given filter, ascending.
+
+        Amounts are compared with each row's debit or credit, in units.
+        """
+        start_ordinal = to_ordinal(start_date)
+        end_ordinal = to_ordinal(end_date)
+        min_cents = None if min_amount in (None, "") else to_cents(min_amount)
+        max_cents = None if max_amount in (None, "") else to_cents(max_amount)
+        np = numpy_module() if len(store) else None
+        if np is not None:
+            return self._match_vectorized(np, store, account_id, text, start_ordinal, end_ordinal,
+                                          min_cents, max_cents)
+
+        description_ids = self.description_ids(text)
+        ordinals = store.date_ordinals
+        matched = array("i")
+        for row in range(len(store)):
+            if account_id is not None and store.account_ids[row] != account_id:
+                continue
+            if description_ids is not None and store.description_ids[row] not in description_ids:
+                continue
+            ordinal = ordinals[store.date_ids[row]]
+            if (start_ordinal is not None and ordinal < start_ordinal) or \
+                    (end_ordinal is not None and ordinal > end_ordinal):
+                continue
+            amount = store.debits[row] + store.credits[row]
+            if (min_cents is not None and amount < min_cents) or (max_cents is not None and amount > max_cents):
+                continue
+            matched.append(row)
+        return matched
+
+    def _match_vectorized(self, np, store, account_id, text, start_ordinal, end_ordinal, min_cents, max_cents):
+        row_count = len(store)
+        rows = None  # Candidate row numbers; None while every row is still a candidate
+
+        def column(values, dtype):
+            data = np.frombuffer(values, dtype=dtype, count=row_count)
+            return data if rows is None else data[rows]
+
+        def keep(condition):
+            return np.flatnonzero(condition).astype(np.int32) if rows is None else rows[condition]
+
+        if account_id is not None:
+            rows = keep(column(store.account_ids, np.int32) == account_id)
+        # Description and date facets go through per-id lookup tables, one gather per facet
+        wanted = self.description_mask(np, text, len(store.descriptions))
+        if wanted is not None:
+            rows = keep(wanted[column(store.description_ids, np.int32)])
+        if start_ordinal is not None or end_ordinal is not None:
+            ordinals = np.frombuffer(store.date_ordinals, dtype=np.int32)
+            in_period = np.ones(len(ordinals), dtype=bool)
+            if start_ordinal is not None:
+                in_period &= ordinals >= start_ordinal
+            if end_ordinal is not None:
+                in_period &= ordinals <= end_ordinal
+            rows = keep(in_period[column(store.date_ids, np.int32)])
+        if min_cents is not None or max_cents is not None:
+            amounts = column(store.debits, np.int64) + column(store.credits, np.int64)
+            in_range = np.ones(len(amounts), dtype=bool)
+            if min_cents is not None:
+                in_range &= amounts >= min_cents
+            if max_cents is not None:
+                in_range &= amounts <= max_cents
+            rows = keep(in_range)
+
+        if rows is None:
+            rows = np.arange(row_count, dtype=np.int32)
+        return array("i", rows.tobytes())
@@ -0,0 +1,479 @@
+"""SQLite-backed ledger for books larger than memory.
+
+SqliteLedger has the GeneralLedger methods the GUI, the statements, the
+tax forms and the command line use, but keeps its rows in an SQLite
+database instead of in memory. Queries are pushed down to SQL:
+
+    transactions   one row per line; row n of the ledger is id n + 1. An
+                   index on account_id serves the T-accounts, and one on the
+                   date's ordinal the search date filters
+    daily_totals   per (account, date) debit and credit sums, keyed on
+                   (account_id, ordinal); balance and period queries are
+                   SUM aggregates over it, so they cost O(accounts * days)
+                   however many rows the ledger holds
+    monthly_totals the same sums per (account, month end); a balance as of a
+                   date adds the months before it to the days of its own
+                   month, so it costs O(accounts * (months + 31))
+    entries        running net of every journal entry, with a partial
+                   index on the unbalanced ones
+
+daily_totals, monthly_totals and entries are maintained as each batch is inserted, the
+same way GeneralLedger keeps its running totals. Batches are inserted
+with executemany in one transaction, and the database runs in WAL mode.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+from instrumentation import measure, timed
+from ledger_batch import assign_entry_ids, entry_rows, prepare_batch, transaction_row
+from ledger_io import LoadReport
+from ledger_store import CENTS_PER_UNIT, NO_ENTRY, format_cents, parse_date, to_cents, to_ordinal
+from period_snapshots import period_end, period_start
+from search_index import tokenize
+
+# Rows copied per batch by copy_ledger
+COPY_CHUNK_ROWS = 50_000
+
+# Row numbers bound per query by account_counts and get_records_at; SQLite allows 32766 parameters
+COUNT_CHUNK_ROWS = 10_000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    account_id INTEGER NOT NULL REFERENCES accounts (id),
+    debit INTEGER NOT NULL,
+    credit INTEGER NOT NULL,
+    description TEXT NOT NULL,
+    entry_id INTEGER NOT NULL,
+    ordinal INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS transactions_account ON transactions (account_id);
+CREATE INDEX IF NOT EXISTS transactions_entry ON transactions (entry_id) WHERE entry_id != 0;
+CREATE TABLE IF NOT EXISTS daily_totals (
+    account_id INTEGER NOT NULL,
+    ordinal INTEGER NOT NULL,
+    debit INTEGER NOT NULL,
+    credit INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    PRIMARY KEY (account_id, ordinal)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS monthly_totals (
+    account_id INTEGER NOT NULL,
+    period_end INTEGER NOT NULL,
+    debit INTEGER NOT NULL,
+    credit INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    PRIMARY KEY (account_id, period_end)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    net INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_unbalanced ON entries (id) WHERE net != 0;
+"""
+
+UPSERT_DAILY_TOTALS = """
+INSERT INTO daily_totals (account_id, ordinal, debit, credit, rows) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (account_id, ordinal) DO UPDATE SET
+    debit = debit + excluded.debit, credit = credit + excluded.credit, rows = rows + excluded.rows
+"""
+
+UPSERT_MONTHLY_TOTALS = """
+INSERT INTO monthly_totals (account_id, period_end, debit, credit, rows) VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (account_id, period_end) DO UPDATE SET
+    debit = debit + excluded.debit, credit = credit + excluded.credit, rows = rows + excluded.rows
+"""
+
+# Databases created before monthly_totals existed get it from daily_totals on open
+BACKFILL_MONTHLY_TOTALS = """
+INSERT INTO monthly_totals (account_id, period_end, debit, credit, rows)
+SELECT account_id, period_end(ordinal), SUM(debit), SUM(credit), SUM(rows) FROM daily_totals
+GROUP BY account_id, period_end(ordinal)
+"""
+
+# Databases created before transactions had an ordinal column get it on open
+BACKFILL_ORDINALS = """
+BEGIN;
+ALTER TABLE transactions ADD COLUMN ordinal INTEGER NOT NULL DEFAULT 0;
+UPDATE transactions SET ordinal = date_ordinal(date);
+COMMIT;
+"""
+
+UPSERT_ENTRIES = """
+INSERT INTO entries (id, net) VALUES (?, ?)
+ON CONFLICT (id) DO UPDATE SET net = net + excluded.net
+"""
+
+
+def words_match(description, prefixes):
+    """SQL function: whether every space-separated prefix starts a word of the description."""
+    words = tokenize(description)
+    return all(any(word.startswith(prefix) for word in words) for prefix in prefixes.split())
+
+
+class SqliteRows:
+    """Sized, indexable view of a SqliteLedger's rows (the `transactions` attribute)."""
+
+    def __init__(self, ledger):
+        self._ledger = ledger
+
+    def __len__(self):
+        return self._ledger.row_count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("transaction index out of range")
+        return self._ledger.get_rows(index, index + 1)[0]
+
+    def __iter__(self):
+        for start in range(0, len(self), COPY_CHUNK_ROWS):
+            yield from self._ledger.get_rows(start, start + COPY_CHUNK_ROWS)
+
+
+class SqliteLedger:
+    def __init__(self, path, create=True):
+        if not create and not os.path.exists(path):
+            raise FileNotFoundError(f"No such ledger database: {path!r}")
+        # The GUI queries from worker threads; write_lock serialises every use of the connection
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        # Search filters use the same date parsing and word matching as GeneralLedger.search
+        self.connection.create_function("date_ordinal", 1, parse_date, deterministic=True)
+        self.connection.create_function("words_match", 2, words_match, deterministic=True)
+        self.connection.create_function("period_end", 1, period_end, deterministic=True)
+        with self.connection:
+            if (not self.connection.execute("SELECT 1 FROM monthly_totals LIMIT 1").fetchone()
+                    and self.connection.execute("SELECT 1 FROM daily_totals LIMIT 1").fetchone()):
+                self.connection.execute(BACKFILL_MONTHLY_TOTALS)
+        if "ordinal" not in {column[1] for column in self.connection.execute("PRAGMA table_info(transactions)")}:
+            self.connection.executescript(BACKFILL_ORDINALS)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS transactions_ordinal ON transactions (ordinal)")
+        self.write_lock = threading.RLock()
+        self.file_path = path
+        # Each batch is committed as it is inserted; there is no separate journal
+        self.journal = None
+        self._account_ids = dict(self.connection.execute("SELECT name, id FROM accounts"))
+        self._ordinals = {}
+        self.row_count = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+        self._next_entry_id = None
+
+    @property
+    def transactions(self):
+        return SqliteRows(self)
+
+    def close(self):
+        with self.write_lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    # The GUI and the CLI release a ledger they are done with through close_journal
+    close_journal = close
+
+    def _query(self, sql, parameters=()):
+        with self.write_lock:
+            return self.connection.execute(sql, parameters).fetchall()
+
+    def _account_id(self, account):
+        account_id = self._account_ids.get(account)
+        if account_id is None:
+            account_id = self.connection.execute("INSERT INTO accounts (name) VALUES (?)", (account,)).lastrowid
+            self._account_ids[account] = account_id
+        return account_id
+
+    def _ordinal(self, date):
+        ordinal = self._ordinals.get(date)
+        if ordinal is None:
+            ordinal = self._ordinals[date] = parse_date(date)
+        return ordinal
+
+    def add_transaction(self, date, account, debit, credit, description):
+        """Append one transaction; raises ValueError with the reason add_transactions would reject it for."""
+        self.append_rows([transaction_row(date, account, debit, credit, description)])
+
+    def append_rows(self, rows, entry_ids=None):
+        """Insert pre-validated (date, account, debit_cents, credit_cents, description)
+        rows as one transaction, updating the daily and entry totals with them."""
+        if entry_ids is None:
+            entry_ids = [NO_ENTRY] * len(rows)
+        with self.write_lock:
+            try:
+                inserted, nets = self._insert(rows, entry_ids)
+            except Exception:
+                # The transaction was rolled back; forget account ids handed out inside it
+                self._account_ids = dict(self.connection.execute("SELECT name, id FROM accounts"))
+                raise
+            self.row_count += inserted
+            if nets and self._next_entry_id is not None:
+                self._next_entry_id = max(self._next_entry_id, max(nets) + 1)
+
+    def _insert(self, rows, entry_ids):
+        records = []
+        daily = {}  # (account id, ordinal) -> [debit, credit, rows]
+        nets = {}  # entry id -> debit - credit
+        with self.connection:
+            for (date, account, debit, credit, description), entry_id in zip(rows, entry_ids):
+                account_id = self._account_id(account)
+                ordinal = self._ordinal(date)
+                records.append((date, account_id, debit, credit, description, entry_id, ordinal))
+                key = (account_id, ordinal)
+                sums = daily.get(key)
+                if sums is None:
+                    sums = daily[key] = [0, 0, 0]
+                sums[0] += debit
+                sums[1] += credit
+                sums[2] += 1
+                if entry_id != NO_ENTRY:
+                    nets[entry_id] = nets.get(entry_id, 0) + debit - credit
+            self.connection.executemany(
+                "INSERT INTO transactions (date, account_id, debit, credit, description, entry_id, ordinal)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)", records)
+            self.connection.executemany(UPSERT_DAILY_TOTALS, [key + tuple(sums) for key, sums in daily.items()])
+            monthly = {}
+            for (account_id, ordinal), (debit, credit, count) in daily.items():
+                sums = monthly.setdefault((account_id, period_end(ordinal)), [0, 0, 0])
+                sums[0] += debit
+                sums[1] += credit
+                sums[2] += count
+            self.connection.executemany(UPSERT_MONTHLY_TOTALS, [key + tuple(sums) for key, sums in monthly.items()])
+            self.connection.executemany(UPSERT_ENTRIES, nets.items())
+        return len(records), nets
+
+    @timed("add_transactions", rows=lambda report: report.batch_rows)
+    def add_transactions(self, transactions, known_accounts=None, report=None, first_record=1):
+        """Validate and insert a batch of transactions; see GeneralLedger.add_transactions."""
+        report = report if report is not None else LoadReport()
+        start_time = time.perf_counter()
+        columns, rejected = prepare_batch(transactions, known_accounts)
+        count = len(columns[0])
+        if count:
+            entry_ids = assign_entry_ids(columns[5], count, report.entry_ids, self._allocate_entry_ids)
+            columns = [column.tolist() if hasattr(column, "tolist") else column for column in columns[:5]]
+            self.append_rows(list(zip(*columns)), entry_ids)
+        report.batch_rows = count
+        report.rows_loaded += count
+        report.rejected.extend((first_record + position, row, reason) for position, row, reason in rejected)
+        report.elapsed += time.perf_counter() - start_time
+        return report
+
+    def add_entry(self, date, lines, description=""):
+        """Post a balanced multi-line journal entry; see GeneralLedger.add_entry."""
+        rows = entry_rows(date, lines, description)
+        with self.write_lock:
+            entry_id = self._allocate_entry_ids(1)
+            self.append_rows(rows, [entry_id] * len(rows))
+        return entry_id
+
+    def _allocate_entry_ids(self, count):
+        with self.write_lock:
+            if self._next_entry_id is None:
+                highest = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM entries").fetchone()[0]
+                self._next_entry_id = max(highest, NO_ENTRY) + 1
+            first = self._next_entry_id
+            self._next_entry_id += count
+            return first
+
+    def get_records(self, start, stop):
+        """Return rows [start, stop) in store form, amounts in cents."""
+        return self._query(
+            "SELECT t.date, a.name, t.debit, t.credit, t.description FROM transactions t"
+            " JOIN accounts a ON a.id = t.account_id WHERE t.id > ? AND t.id <= ? ORDER BY t.id",
+            (start, stop))
+
+    def get_rows(self, start, stop):
+        """Return rows [start, stop) as plain tuples, for paged display."""
+        return [(date, account, debit / CENTS_PER_UNIT, credit / CENTS_PER_UNIT, description)
+                for date, account, debit, credit, description in self.get_records(start, stop)]
+
+    def get_records_at(self, rows):
+        """Return the given rows in store form, e.g. a page of search results."""
+        rows = list(rows)
+        records = {}
+        for start in range(0, len(rows), COUNT_CHUNK_ROWS):
+            chunk = rows[start:start + COUNT_CHUNK_ROWS]
+            records.update((row_id, record) for row_id, *record in self._query(
+                "SELECT t.id, t.date, a.name, t.debit, t.credit, t.description FROM transactions t"
+                " JOIN accounts a ON a.id = t.account_id WHERE t.id IN (%s)" % ",".join("?" * len(chunk)),
+                [row + 1 for row in chunk]))
+        return [tuple(records[row + 1]) for row in rows]
+
+    @timed("search", rows=len)
+    def search(self, text="", account=None, start_date=None, end_date=None, min_amount=None, max_amount=None):
+        """Return the numbers of the rows matching every given filter, in row order (see GeneralLedger.search)."""
+        conditions = []
+        parameters = []
+        if account:
+            account_id = self._account_ids.get(account)
+            if account_id is None:
+                return []
+            conditions.append("account_id = ?")
+            parameters.append(account_id)
+        prefixes = tokenize(text)
+        if prefixes:
+            # LIKE discards most rows cheaply; words_match then checks word starts
+            for prefix in prefixes:
+                conditions.append("description LIKE ? ESCAPE '\\'")
+                parameters.append("%" + prefix.replace("_", "\\_") + "%")
+            conditions.append("words_match(description, ?)")
+            parameters.append(" ".join(prefixes))
+        for condition, value in (("ordinal >= ?", to_ordinal(start_date)),
+                                 ("ordinal <= ?", to_ordinal(end_date)),
+                                 ("debit + credit >= ?", None if min_amount in (None, "") else to_cents(min_amount)),
+                                 ("debit + credit <= ?", None if max_amount in (None, "") else to_cents(max_amount))):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        if not conditions:
+            return range(self.row_count)
+        return [row_id - 1 for row_id, in self._query(
+            "SELECT id FROM transactions WHERE " + " AND ".join(conditions) + " ORDER BY id", parameters)]
+
+    def account_counts(self, rows):
+        """Return {account: number of the given rows posted to it}."""
+        counts = {}
+        for start in range(0, len(rows), COUNT_CHUNK_ROWS):
+            chunk = rows[start:start + COUNT_CHUNK_ROWS]
+            for account, count in self._query(
+                    "SELECT a.name, COUNT(*) FROM transactions t JOIN accounts a ON a.id = t.account_id"
+                    " WHERE t.id IN (%s) GROUP BY a.id" % ",".join("?" * len(chunk)), [row + 1 for row in chunk]):
+                counts[account] = counts.get(account, 0) + count
+        return counts
+
+    def get_entry_ids(self, start, stop):
+        return [entry_id for entry_id, in self._query(
+            "SELECT entry_id FROM transactions WHERE id > ? AND id <= ? ORDER BY id", (start, stop))]
+
+    def has_entries(self):
+        return bool(self._query("SELECT 1 FROM entries LIMIT 1"))
+
+    def get_entry(self, entry_id):
+        return self._query(
+            "SELECT t.date, a.name, t.debit, t.credit, t.description FROM transactions t"
+            " JOIN accounts a ON a.id = t.account_id WHERE t.entry_id = ? AND t.entry_id != 0 ORDER BY t.id",
+            (entry_id,))
+
+    def unbalanced_entries(self):
+        return dict(self._query("SELECT id, net FROM entries WHERE net != 0 ORDER BY id"))
+
+    def trial_balance(self):
+        debit, credit = self._query("SELECT COALESCE(SUM(debit), 0), COALESCE(SUM(credit), 0) FROM daily_totals")[0]
+        return {"debit": debit / CENTS_PER_UNIT,
+                "credit": credit / CENTS_PER_UNIT,
+                "difference": (debit - credit) / CENTS_PER_UNIT}
+
+    def _cumulative_sums(self, ordinal):
+        """Return {account_id: (debit, credit, rows)} over the rows dated up to `ordinal`."""
+        return {account_id: sums for account_id, *sums in self._query(
+            "SELECT account_id, SUM(debit), SUM(credit), SUM(rows) FROM ("
+            " SELECT account_id, debit, credit, rows FROM monthly_totals WHERE period_end < ?"
+            " UNION ALL"
+            " SELECT account_id, debit, credit, rows FROM daily_totals WHERE ordinal >= ? AND ordinal <= ?"
+            ") GROUP BY account_id", (period_end(ordinal), period_start(ordinal), ordinal))}
+
+    def _account_sums(self, start_date=None, end_date=None):
+        """Return {account: (debit_cents, credit_cents)}; with a date bound, only
+        accounts that have rows in the period are included.
+
+        A bounded query is the difference of two balances as of a date, each
+        read from the monthly totals plus the daily totals of one month.
+        """
+        start_ordinal = to_ordinal(start_date)
+        end_ordinal = to_ordinal(end_date)
+        if start_ordinal is None and end_ordinal is None:
+            rows = self._query(
+                "SELECT a.name, COALESCE(SUM(d.debit), 0), COALESCE(SUM(d.credit), 0) FROM accounts a"
+                " LEFT JOIN monthly_totals d ON d.account_id = a.id GROUP BY a.id ORDER BY a.id")
+            return {account: (debit, credit) for account, debit, credit in rows}
+        if end_ordinal is None:
+            through = {account_id: tuple(sums) for account_id, *sums in self._query(
+                "SELECT account_id, SUM(debit), SUM(credit), SUM(rows) FROM monthly_totals GROUP BY account_id")}
+        else:
+            through = self._cumulative_sums(end_ordinal)
+        before = {} if start_ordinal is None else self._cumulative_sums(start_ordinal - 1)
+        names = {account_id: name for name, account_id in self._account_ids.items()}
+        sums = {}
+        for account_id in sorted(through):
+            debit, credit, rows = through[account_id]
+            opening_debit, opening_credit, opening_rows = before.get(account_id, (0, 0, 0))
+            if rows > opening_rows:
+                sums[names[account_id]] = (debit - opening_debit, credit - opening_credit)
+        return sums
+
+    def get_period_totals_cents(self, start_date=None, end_date=None):
+        """Return {account: (debit_cents, credit_cents)}, for every account or, with a date
+        bound, for the accounts with rows in the period."""
+        return self._account_sums(start_date, end_date)
+
+    def get_balances_cents(self, start_date=None, end_date=None):
+        """Return {account: debit - credit} in exact integer cents."""
+        return {account: debit - credit
+                for account, (debit, credit) in self._account_sums(start_date, end_date).items()}
+
+    def get_account_balances(self, start_date=None, end_date=None):
+        with measure("get_account_balances", self.row_count):
+            return {account: balance / CENTS_PER_UNIT
+                    for account, balance in self.get_balances_cents(start_date, end_date).items()}
+
+    def get_account_totals(self, start_date=None, end_date=None):
+        """Return {account: {"debit", "credit", "balance"}}, optionally for a date range."""
+        return {account: {"debit": debit / CENTS_PER_UNIT,
+                          "credit": credit / CENTS_PER_UNIT,
+                          "balance": (debit - credit) / CENTS_PER_UNIT}
+                for account, (debit, credit) in self._account_sums(start_date, end_date).items()}
+
+    def get_accounts(self):
+        """Return every account that has at least one transaction, in first-use order."""
+        return [name for name, in self._query("SELECT name FROM accounts ORDER BY id")]
+
+    def get_t_account(self, account):
+        """Return {"debits", "credits", "balance"} for one account."""
+        account_id = self._account_ids.get(account)
+        if account_id is None:
+            return {"debits": [], "credits": [], "balance": 0}
+        rows = self._query("SELECT debit, credit FROM transactions WHERE account_id = ? ORDER BY id",
+                           (account_id,))
+        debit, credit = self._query("SELECT COALESCE(SUM(debit), 0), COALESCE(SUM(credit), 0)"
+                                    " FROM daily_totals WHERE account_id = ?", (account_id,))[0]
+        return {
+            "debits": [debit / CENTS_PER_UNIT for debit, _ in rows if debit > 0],
+            "credits": [credit / CENTS_PER_UNIT for _, credit in rows if credit > 0],
+            "balance": (debit - credit) / CENTS_PER_UNIT,
+        }
+
+    def generate_t_accounts(self):
+        return {account: self.get_t_account(account) for account in self.get_accounts()}
+
+    def display_ledger(self):
+        print("Date\t\tAccount\t\tDebit\t\tCredit\t\tDescription")
+        print("-" * 80)
+        for start in range(0, self.row_count, COPY_CHUNK_ROWS):
+            for date, account, debit, credit, description in self.get_records(start, start + COPY_CHUNK_ROWS):
+                print(f"{date}\t{account}\t\t{format_cents(debit)}\t\t{format_cents(credit)}\t\t{description}")
+
+
+def copy_ledger(source, target, row_count=None, chunk_size=COPY_CHUNK_ROWS, progress=None):
+    """Append the first `row_count` rows (default: all) of one ledger to another,
+    a chunk at a time, keeping their journal entries. Returns the rows copied.
+
+    Either side may be a GeneralLedger or a SqliteLedger, e.g. to save the
+    in-memory ledger to a database or to load a database into memory.
+    Entry ids are kept as they are, so the target should be empty.
+    """
+    total = len(source.transactions) if row_count is None else row_count
+    for start in range(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        target.append_rows(source.get_records(start, stop), list(source.get_entry_ids(start, stop)))
+        if progress is not None:
+            progress(stop, total)
+    return total
@@ -0,0 +1,111 @@
+import tkinter as tk
+from tkinter import ttk
+from itertools import zip_longest
+
+from instrumentation import timed
+
+# T-account lines rendered per page; "Show More" appends the next page
+PAGE_LINES = 500
+
+
+def format_t_account_lines(debits, credits):
+    return "".join(f"{debit:<15} | {credit:>15}\n" for debit, credit in zip_longest(
+        (f"{amount:.2f}" for amount in debits),
+        (f"{amount:.2f}" for amount in credits),
+        fillvalue=""))
+
+
+class TAccountViewer:
+    """A single, reusable T-account window that renders one account at a time.
+
+    The window is created on first use and hidden (not destroyed) when
+    closed. Each account is rendered a page at a time with one Text insert
+    per page, so opening it costs the same however large the ledger is.
+    """
+
+    def __init__(self, master, get_ledger):
+        self.master = master
+        self.get_ledger = get_ledger
+        self.window = None
+        self.t_account = None
+        self.lines_shown = 0
+
+    def show(self):
+        if self.window is None:
+            self.build_window()
+        self.window.deiconify()
+        self.window.lift()
+        self.reload()
+
+    def is_open(self):
+        return self.window is not None and self.window.state() != 'withdrawn'
+
+    def build_window(self):
+        self.window = tk.Toplevel(self.master)
+        self.window.title("T-Accounts")
+        self.window.protocol("WM_DELETE_WINDOW", self.window.withdraw)
+
+        top = ttk.Frame(self.window)
+        top.pack(fill='x', padx=10, pady=(10, 0))
+        ttk.Label(top, text="Account:").pack(side='left')
+        self.account_var = tk.StringVar()
+        self.account_dropdown = ttk.Combobox(top, textvariable=self.account_var, state="readonly", width=30)
+        self.account_dropdown.pack(side='left', padx=5)
+        self.account_dropdown.bind("<<ComboboxSelected>>", lambda event: self.render())
+        self.balance_var = tk.StringVar()
+        ttk.Label(top, textvariable=self.balance_var).pack(side='right')
+
+        body = ttk.Frame(self.window)
+        body.pack(fill='both', expand=True, padx=10, pady=10)
+        self.text = tk.Text(body, height=30, width=80)
+        scrollbar = ttk.Scrollbar(body, orient='vertical', command=self.text.yview)
+        self.text.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.text.pack(side='left', fill='both', expand=True)
+
+        self.more_button = ttk.Button(self.window, text="Show More", command=self.show_more)
+        self.more_button.pack(pady=(0, 10))
+
+    def refresh(self, accounts=None):
+        """Re-read the ledger if the window is showing; hidden windows catch up in show().
+
+        When only `accounts` changed and the shown account is not one of
+        them, just the account list is updated.
+        """
+        if not self.is_open():
+            return
+        if accounts is not None and self.account_var.get() not in accounts:
+            self.account_dropdown.configure(values=self.get_ledger().get_accounts())
+            return
+        self.reload()
+
+    def reload(self):
+        accounts = self.get_ledger().get_accounts()
+        self.account_dropdown.configure(values=accounts)
+        if self.account_var.get() not in accounts:
+            self.account_var.set(accounts[0] if accounts else "")
+        self.render()
+
+    @timed("t_account_view.render")
+    def render(self):
+        account = self.account_var.get()
+        self.t_account = self.get_ledger().get_t_account(account)
+        self.lines_shown = 0
+        self.balance_var.set(f"Balance: {self.t_account['balance']:.2f}")
+        self.text.config(state='normal')
+        self.text.delete("1.0", tk.END)
+        self.text.insert(tk.END, f"{'='*20} {account} {'='*20}\n"
+                                 f"{'Debits':<15} | {'Credits':>15}\n" + "-" * 31 + "\n")
+        self.show_more()
+
+    def show_more(self):
+        debits = self.t_account["debits"]
+        credits = self.t_account["credits"]
+        start = self.lines_shown
+        stop = start + PAGE_LINES
+        self.text.config(state='normal')
+        self.text.insert(tk.END, format_t_account_lines(debits[start:stop], credits[start:stop]))
+        self.text.config(state='disabled')
+        self.lines_shown = stop
+        remaining = max(len(debits), len(credits)) > stop
+        self.more_button.configure(state='normal' if remaining else 'disabled')
@@ -0,0 +1,193 @@
+"""Declarative tax-form definitions and a single-pass evaluator.
+
+A form is a list of lines. Each line takes its amount from one of:
+
+    accounts   the summed balances of a set of ledger accounts
+    statement  a figure from the StatementEngine ('revenue', 'expenses', 'net_income')
+    terms      other lines on the same form, as (line, sign) pairs
+
+A statement figure may also be adjusted by terms, e.g. total expenses less
+cost of goods sold. Lines with no source are reported as 0 (not tracked by
+the ledger).
+Derived lines are put in dependency order once, when the form is defined,
+so evaluating a form is one walk over its lines against one balance
+snapshot. Several forms, or several ledgers, can share that snapshot.
+"""
+from graphlib import CycleError, TopologicalSorter
+
+from financial_statements import StatementEngine
+from instrumentation import timed
+from ledger_store import CENTS_PER_UNIT
+
+STATEMENT_FIGURES = ('revenue', 'expenses', 'net_income')
+
+
+class TaxFormError(Exception):
+    pass
+
+
+class FormLine:
+    __slots__ = ("number", "description", "accounts", "statement", "terms")
+
+    def __init__(self, number, description, accounts=(), statement=None, terms=()):
+        if accounts and (statement or terms):
+            raise TaxFormError(f"Line {number} has more than one source.")
+        if statement is not None and statement not in STATEMENT_FIGURES:
+            raise TaxFormError(f"Line {number}: unknown statement figure {statement!r}.")
+        self.number = number
+        self.description = description
+        self.accounts = tuple(accounts)
+        self.statement = statement
+        self.terms = tuple(terms)
+
+
+class TaxForm:
+    def __init__(self, form_id, title, lines):
+        self.form_id = form_id
+        self.title = title
+        self.lines = list(lines)
+        by_number = {line.number: line for line in self.lines}
+        if len(by_number) != len(self.lines):
+            raise TaxFormError(f"{form_id} defines a line number twice.")
+        graph = {}
+        for line in self.lines:
+            for number, _ in line.terms:
+                if number not in by_number:
+                    raise TaxFormError(f"{form_id} line {line.number} refers to unknown line {number}.")
+            graph[line.number] = {number for number, _ in line.terms}
+        try:
+            order = TopologicalSorter(graph).static_order()
+            self.evaluation_order = [by_number[number] for number in order]
+        except CycleError as error:
+            raise TaxFormError(f"{form_id} has circular line references: {error.args[1]}") from None
+
+    def accounts(self):
+        """Every account the form reads."""
+        return {account for line in self.lines for account in line.accounts}
+
+    def evaluate(self, engine):
+        """Return [(line, description, amount)] in form order.
+
+        Lines are computed in integer cents and converted once at the end.
+        """
+        balances = engine.balance_cents
+        amounts = {}
+        for line in self.evaluation_order:
+            if line.accounts:
+                amount = sum(balances.get(account, 0) for account in line.accounts)
+            else:
+                amount = getattr(engine, line.statement + '_cents') if line.statement else 0
+                amount += sum(sign * amounts[number] for number, sign in line.terms)
+            amounts[line.number] = amount
+        return [(line.number, line.description, amounts[line.number] / CENTS_PER_UNIT) for line in self.lines]
+
+
+OTHER_DEDUCTION_ACCOUNTS = ("Office Supplies Expense", "Utilities Expense", "Insurance Expense")
+
+FORM_1120 = TaxForm("1120", "Form 1120 (C Corporation)", [
+    FormLine("1a", "Gross receipts or sales", statement='revenue'),
+    FormLine("1b", "Returns and allowances"),
+    FormLine("1c", "Net receipts or sales", terms=(("1a", 1), ("1b", -1))),
+    FormLine("2", "Cost of goods sold", accounts=("COGS",)),
+    FormLine("3", "Gross profit", terms=(("1c", 1), ("2", -1))),
+    FormLine("4", "Dividends", accounts=("Dividend Income",)),
+    FormLine("5", "Interest", accounts=("Interest Revenue",)),
+    FormLine("6", "Gross rents", accounts=("Rent Revenue",)),
+    FormLine("7", "Gross royalties"),
+    FormLine("8", "Capital gain net income"),
+    FormLine("9", "Net gain or loss from Form 4797"),
+    FormLine("10", "Other income"),
+    FormLine("11", "Total income", statement='revenue', terms=(("2", -1),)),
+    FormLine("12", "Compensation of officers", accounts=("Salaries Expense",)),
+    FormLine("13", "Salaries and wages", accounts=("Salaries Expense",)),
+    FormLine("14", "Repairs and maintenance", accounts=("Maintenance Expense",)),
+    FormLine("15", "Bad debts"),
+    FormLine("16", "Rents", accounts=("Rent Expense",)),
+    FormLine("17", "Taxes and licenses"),
+    FormLine("18", "Interest", accounts=("Interest Expense",)),
+    FormLine("19", "Depreciation", accounts=("Depreciation Expense",)),
+    FormLine("20", "Depletion"),
+    FormLine("21", "Advertising", accounts=("Advertising Expense",)),
+    FormLine("22", "Pension, profit-sharing, etc."),
+    FormLine("23", "Employee benefit programs"),
+    FormLine("24", "Other deductions", accounts=OTHER_DEDUCTION_ACCOUNTS),
+    FormLine("25", "Total deductions", statement='expenses', terms=(("2", -1),)),
+    FormLine("26", "Taxable income", statement='net_income'),
+])
+
+FORM_1065 = TaxForm("1065", "Form 1065 (Partnership)", [
+    FormLine("1a", "Gross receipts or sales", statement='revenue'),
+    FormLine("1b", "Returns and allowances"),
+    FormLine("1c", "Net receipts or sales", terms=(("1a", 1), ("1b", -1))),
+    FormLine("2", "Cost of goods sold", accounts=("COGS",)),
+    FormLine("3", "Gross profit", terms=(("1c", 1), ("2", -1))),
+    FormLine("4", "Ordinary income (loss) from other partnerships"),
+    FormLine("5", "Net farm profit (loss)"),
+    FormLine("6", "Net gain (loss) from Form 4797"),
+    FormLine("7", "Other income (loss)", accounts=("Interest Revenue", "Rent Revenue")),
+    FormLine("8", "Total income (loss)", statement='revenue', terms=(("2", -1),)),
+    FormLine("9", "Guaranteed payments to partners", accounts=("Salaries Expense",)),
+    FormLine("10", "Compensation of partners", accounts=("Salaries Expense",)),
+    FormLine("11", "Salaries and wages", accounts=("Salaries Expense",)),
+    FormLine("12", "Repairs and maintenance", accounts=("Maintenance Expense",)),
+    FormLine("13", "Bad debts"),
+    FormLine("14", "Rents", accounts=("Rent Expense",)),
+    FormLine("15", "Taxes and licenses"),
+    FormLine("16", "Interest", accounts=("Interest Expense",)),
+    FormLine("17", "Depreciation", accounts=("Depreciation Expense",)),
+    FormLine("18", "Depletion"),
+    FormLine("19", "Retirement plans"),
+    FormLine("20", "Employee benefit programs"),
+    FormLine("21", "Other deductions", accounts=OTHER_DEDUCTION_ACCOUNTS + ("Advertising Expense",)),
+    FormLine("22", "Total deductions", statement='expenses', terms=(("2", -1),)),
+    FormLine("23", "Ordinary business income (loss)", statement='net_income'),
+])
+
+SCHEDULE_C = TaxForm("schedule-c", "Schedule C (Sole Proprietorship)", [
+    FormLine("1", "Gross receipts or sales", statement='revenue'),
+    FormLine("2", "Returns and allowances"),
+    FormLine("3", "Subtract line 2 from line 1", terms=(("1", 1), ("2", -1))),
+    FormLine("4", "Cost of goods sold", accounts=("COGS",)),
+    FormLine("5", "Gross profit", terms=(("3", 1), ("4", -1))),
+    FormLine("6", "Other income"),
+    FormLine("7", "Gross income", terms=(("5", 1), ("6", 1))),
+    FormLine("8", "Advertising", accounts=("Advertising Expense",)),
+    FormLine("13", "Depreciation", accounts=("Depreciation Expense",)),
+    FormLine("15", "Insurance", accounts=("Insurance Expense",)),
+    FormLine("16b", "Interest (other)", accounts=("Interest Expense",)),
+    FormLine("20b", "Rent or lease (other business property)", accounts=("Rent Expense",)),
+    FormLine("21", "Repairs and maintenance", accounts=("Maintenance Expense",)),
+    FormLine("22", "Supplies", accounts=("Office Supplies Expense",)),
+    FormLine("25", "Utilities", accounts=("Utilities Expense",)),
+    FormLine("26", "Wages", accounts=("Salaries Expense",)),
+    FormLine("28", "Total expenses", statement='expenses', terms=(("4", -1),)),
+    FormLine("29", "Tentative profit (loss)", terms=(("7", 1), ("28", -1))),
+    FormLine("31", "Net profit (loss)", terms=(("29", 1),)),
+])
+
+FORMS = {form.form_id: form for form in (FORM_1120, FORM_1065, SCHEDULE_C)}
+
+
+def get_form(form_id):
+    try:
+        return FORMS[form_id]
+    except KeyError:
+        raise TaxFormError(f"Unknown tax form {form_id!r}.") from None
+
+
+@timed("evaluate_forms")
+def evaluate_forms(ledger, form_ids=None, engine=None):
+    """Evaluate several forms against one balance snapshot of `ledger`.
+
+    Returns {form_id: [(line, description, amount)]}; form_ids defaults to
+    every registered form.
+    """
+    if engine is None:
+        engine = StatementEngine(ledger)
+    forms = [get_form(form_id) for form_id in (form_ids or FORMS)]
+    return {form.form_id: form.evaluate(engine) for form in forms}
+
+
+def evaluate_entities(ledgers, form_ids=None):
+    """Batch-run forms over many ledgers, e.g. {entity name: ledger}."""
+    return {name: evaluate_forms(ledger, form_ids) for name, ledger in ledgers.items()}
@@ -0,0 +1,141 @@
+import threading
+
+import pytest
+
+from journal import JournalError, checkpoint, journal_path, open_ledger, read_journal, read_ledger
+from ledger import GeneralLedger
+from ledger_format import write_ledger_file
+
+
+def build_ledger(rows):
+    ledger = GeneralLedger()
+    ledger.add_transactions([(f"2024-{row % 12 + 1:02d}-{row % 28 + 1:02d}", f"Account {row % 7}",
+                              row % 500 + 1, 0, f"Row {row}") for row in range(rows)])
+    return ledger
+
+
+def records(ledger):
+    return ledger.get_records(0, len(ledger.transactions))
+
+
+def test_checkpoint_in_background_while_appending(tmp_path, monkeypatch):
+    path = str(tmp_path / "books.gl")
+    write_ledger_file(build_ledger(20_000), path)
+    ledger = GeneralLedger()
+    open_ledger(ledger, path)
+    ledger.add_transaction("2025-01-01", "Cash", 1, 0, "Opening")  # Columns are now arrays, not the mapping
+
+    # Pause the checkpoint at its first NumPy view of a column, while the view is alive
+    np = pytest.importorskip("numpy")
+    writing, appended = threading.Event(), threading.Event()
+    frombuffer = np.frombuffer
+
+    def paused_frombuffer(*args, **kwargs):
+        view = frombuffer(*args, **kwargs)
+        if threading.current_thread() is worker and not writing.is_set():
+            writing.set()
+            appended.wait(10)
+        return view
+
+    monkeypatch.setattr(np, "frombuffer", paused_frombuffer)
+    worker = threading.Thread(target=checkpoint, args=(ledger, path))
+    worker.start()
+    assert writing.wait(10)
+    try:
+        for number in range(10):
+            ledger.add_transaction("2025-01-02", "Cash", number + 1, 0, f"Added {number}")
+    finally:
+        appended.set()
+        worker.join()
+
+    store = ledger._store
+    assert {len(getattr(store, name)) for name in
+            ("account_ids", "date_ids", "debits", "credits", "description_ids", "entry_ids")} == {20_011}
+    assert len(store.dates) == len(store.date_ordinals)
+    expected = records(ledger)
+    ledger.close_journal()
+
+    # Rows appended during the checkpoint were carried into the new journal
+    reopened = GeneralLedger()
+    read_ledger(reopened, path)
+    assert records(reopened) == expected
+    assert reopened.get_account_balances() == ledger.get_account_balances()
+
+
+def test_journal_is_restarted_after_checkpoint(tmp_path):
+    path = str(tmp_path / "books.gl")
+    ledger = GeneralLedger()
+    open_ledger(ledger, path)
+    ledger.add_transaction("2024-01-01", "Cash", 10, 0, "Sale")
+    assert ledger.journal.record_count == 1
+    checkpoint(ledger, path)
+    assert ledger.journal.record_count == 0
+    assert ledger.journal.path == journal_path(path)
+    ledger.close_journal()
+
+
+def journaled_ledger(path, rows):
+    ledger = GeneralLedger()
+    open_ledger(ledger, path)
+    for row in range(rows):
+        ledger.add_transaction(f"2024-02-{row % 28 + 1:02d}", "Cash", row + 1, 0, f"Journaled {row}")
+    expected = records(ledger)
+    ledger.close_journal()
+    return expected
+
+
+def test_journal_replay(tmp_path):
+    path = str(tmp_path / "books.gl")
+    expected = journaled_ledger(path, 5)
+    assert read_journal(journal_path(path))[:2] == (0, expected)
+
+    reopened = GeneralLedger()
+    assert read_ledger(reopened, path) == 5
+    assert records(reopened) == expected
+
+
+def test_journal_rows_already_in_the_base_file_are_skipped(tmp_path):
+    path = str(tmp_path / "books.gl")
+    expected = journaled_ledger(path, 5)
+    ledger = GeneralLedger()
+    read_ledger(ledger, path)
+    # A crash after the checkpoint wrote the base file but before it restarted the journal
+    write_ledger_file(ledger, path)
+    reopened = GeneralLedger()
+    assert open_ledger(reopened, path) == 0
+    assert records(reopened) == expected
+    reopened.close_journal()
+
+
+@pytest.mark.parametrize("damage", ["truncate", "corrupt"])
+def test_torn_journal_tail_is_dropped(tmp_path, damage):
+    path = str(tmp_path / "books.gl")
+    expected = journaled_ledger(path, 5)
+    log_path = journal_path(path)
+    with open(log_path, "r+b") as handle:
+        data = handle.read()
+        if damage == "truncate":
+            handle.truncate(len(data) - 3)
+        else:
+            handle.seek(len(data) - 1)
+            handle.write(bytes([data[-1] ^ 0xFF]))
+
+    assert read_journal(log_path)[1] == expected[:4]
+    ledger = GeneralLedger()
+    assert open_ledger(ledger, path) == 4
+    # The torn record is cut off, so rows appended now follow the intact ones
+    ledger.add_transaction("2024-03-01", "Cash", 9, 0, "After recovery")
+    expected = records(ledger)
+    ledger.close_journal()
+    reopened = GeneralLedger()
+    assert read_ledger(reopened, path) == 5
+    assert records(reopened) == expected
+
+
+def test_journal_with_a_bad_header_is_rejected(tmp_path):
+    path = str(tmp_path / "books.gl")
+    journaled_ledger(path, 1)
+    with open(journal_path(path), "r+b") as handle:
+        handle.write(b"XXXX")
+    with pytest.raises(JournalError, match="Not a ledger journal"):
+        read_ledger(GeneralLedger(), path)
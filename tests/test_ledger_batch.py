@@ -0,0 +1,87 @@
+import pytest
+
+from ledger import GeneralLedger
+from ledger_batch import INVALID_AMOUNT
+from sqlite_ledger import SqliteLedger
+
+np = pytest.importorskip("numpy")
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def ledger(request, tmp_path):
+    if request.param == "memory":
+        yield GeneralLedger()
+    else:
+        ledger = SqliteLedger(str(tmp_path / "books.db"))
+        yield ledger
+        ledger.close()
+
+
+def test_rows_carrying_numpy_scalars(ledger):
+    dates = ["2024-01-01", "2024-01-01"]
+    accounts = ["Cash", "Sales Revenue"]
+    report = ledger.add_transactions(zip(dates, accounts, np.array([10.5, 0.]), np.array([0., 10.5]),
+                                         ["Sale", "Sale"]))
+    assert report.rejected == []
+    assert ledger.get_balances_cents() == {"Cash": 1050, "Sales Revenue": -1050}
+
+
+def test_rejection_rules(ledger):
+    report = ledger.add_transactions([
+        ("2024-01-01", "Cash", "12.50", "", "Kept"),
+        ("2024-01-01", "Cash", "abc", 0, "Bad amount"),
+        ("2024-01-01", "Cash", 5, 5, "Equal sides"),
+        ("2024-01-01", "Cash", -5, 0, "Negative"),
+        ("2024-13-40", "Cash", 5, 0, "Bad date"),
+        ("2024-01-01", " ", 5, 0, "No account"),
+        ("2024-01-01", "Petty Cash", 5, 0, "Unknown account"),
+        ("2024-01-01", "Cash", 5, 0),
+    ], known_accounts={"Cash"})
+    assert report.rows_loaded == 1
+    reasons = {record: reason for record, _, reason in report.rejected}
+    assert sorted(reasons) == [2, 3, 4, 5, 6, 7, 8]
+    assert reasons[2] == INVALID_AMOUNT
+    assert reasons[5] == "Unrecognised date: '2024-13-40'."
+    assert reasons[6] == "Missing account."
+    assert reasons[7] == "Unknown account: 'Petty Cash'."
+    assert reasons[8].startswith("Expected 5 or 6 columns")
+
+    # Amounts whose cents overflow int64, from NumPy columns and from rows
+    for debits in (np.array([2 ** 62, 7], dtype=np.int64), np.array([1e18, 7.0])):
+        report = ledger.add_transactions({"Date": ["2024-01-02"] * 2, "Account": ["Cash"] * 2, "Debit": debits,
+                                          "Credit": np.zeros(2, dtype=debits.dtype), "Description": ["Huge", "Kept"]})
+        assert report.rows_loaded == 1
+        assert [(record, reason) for record, _, reason in report.rejected] == [(1, INVALID_AMOUNT)]
+    report = ledger.add_transactions([("2024-01-02", "Cash", 2 ** 62, 0, "Huge"),
+                                      ("2024-01-02", "Cash", "1e30", 0, "Huge")])
+    assert [reason for _, _, reason in report.rejected] == [INVALID_AMOUNT] * 2
+
+
+def test_add_transaction_uses_the_batch_rules(ledger):
+    ledger.add_transaction("2024-01-01", "Cash", np.float64(1.5), 0, "Float")
+    for date, debit, credit, reason in (("2024-01-01", "abc", 0, INVALID_AMOUNT),
+                                        ("2024-01-01", 5, 5, None),
+                                        ("not a date", 5, 0, "Unrecognised date: 'not a date'.")):
+        with pytest.raises(ValueError) as error:
+            ledger.add_transaction(date, "Cash", debit, credit, "Rejected")
+        if reason is not None:
+            assert str(error.value) == reason
+    assert len(ledger.transactions) == 1
+    assert ledger.get_balances_cents() == {"Cash": 150}
+
+
+def test_unbalanced_entries(ledger):
+    with pytest.raises(ValueError, match="out of balance by 1.00"):
+        ledger.add_entry("2024-01-01", [("Cash", 10, 0), ("Sales Revenue", 0, 9)], "Short")
+    with pytest.raises(ValueError, match="at least two lines"):
+        ledger.add_entry("2024-01-01", [("Cash", 10, 0)])
+    assert len(ledger.transactions) == 0
+
+    balanced = ledger.add_entry("2024-01-01", [("Cash", 10, 0), ("Sales Revenue", 0, 10)], "Sale")
+    report = ledger.add_transactions([("2024-01-02", "Cash", 5, 0, "Refund", "R"),
+                                      ("2024-01-02", "Sales Revenue", 0, 4, "Refund", "R")])
+    # Batches are stored line by line; an entry that does not balance is reported, not rejected
+    assert report.rows_loaded == 2
+    unbalanced = ledger.unbalanced_entries()
+    assert balanced not in unbalanced
+    assert list(unbalanced.values()) == [100]
@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from ledger_cli import main
+
+
+@pytest.mark.parametrize("name", ["books.gl", "books.db"])
+def test_corrupt_ledger_is_reported_without_a_traceback(tmp_path, capsys, name):
+    path = tmp_path / name
+    path.write_bytes(b"not a ledger")
+    assert main(["balances", str(path)]) == 2
+    assert capsys.readouterr().err.startswith("error: ")
+
+
+def test_journal_newer_than_its_ledger_is_reported(tmp_path, capsys):
+    from journal import Journal, journal_path
+    from ledger import GeneralLedger
+    from ledger_format import write_ledger_file
+
+    path = str(tmp_path / "books.gl")
+    write_ledger_file(GeneralLedger(), path)
+    Journal(journal_path(path), base_rows=5).close()
+    assert main(["balances", path]) == 2
+    assert "Journal is newer" in capsys.readouterr().err
+
+
+def test_report_commands_do_not_import_sqlite_or_process_pools():
+    code = ("import sys, ledger_cli; "
+            "print(sorted({'sqlite3', 'concurrent.futures'} & set(sys.modules)))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "[]"
+
+
+def test_rows_rejected_by_a_parallel_scan_are_reported(tmp_path, capsys):
+    path = tmp_path / "books.csv"
+    rows = [f"2024-01-{row % 28 + 1:02d},Account {row % 3},{row + 1},0,Row {row}" for row in range(200)]
+    rows[10] = "2024-01-05,Cash,not a number,0,Bad amount"
+    rows[150] = "2024-01-06,Cash,5,5,Debit and credit"
+    path.write_text("\n".join(["Date,Account,Debit,Credit,Description"] + rows) + "\n")
+
+    assert main(["balances", str(path)]) == 0
+    single = capsys.readouterr()
+    assert single.err == f"{path}: 2 rows rejected\n"
+    assert main(["balances", str(path), "--workers", "2"]) == 0
+    parallel = capsys.readouterr()
+    assert (parallel.out, parallel.err) == (single.out, single.err)
@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from ledger import GeneralLedger
+from ledger_format import (HEADER, SECTION, SNAPSHOT_SECTIONS, LedgerFormatError, read_ledger_file,
+                           write_ledger_file)
+
+ROW_COLUMNS = ("account_ids", "date_ids", "debits", "credits", "description_ids", "entry_ids")
+
+
+def sample_ledger():
+    ledger = GeneralLedger()
+    ledger.add_transactions([
+        ("2024-01-31", "Cash", "1250.75", 0, "Invoice Nº 1", "A"),
+        ("2024-01-31", "Sales Revenue", 0, "1250.75", "Invoice Nº 1", "A"),
+        ("2024-02-15", "Rent Expense", 800, 0, "Rent — February", "B"),
+        ("2024-02-15", "Cash", 0, 800, "Rent — February", "B"),
+        ("2024-03-01", "Office Supplies Expense", "0.10", 0, "Pens"),
+    ])
+    return ledger
+
+
+def figures(ledger):
+    return (ledger.get_records(0, len(ledger.transactions)),
+            list(ledger.get_entry_ids(0, len(ledger.transactions))),
+            ledger.get_balances_cents(),
+            ledger.get_balances_cents("2024-02-01", "2024-02-29"),
+            ledger.get_balances_cents(end_date="2024-01-31"))
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "books.gl")
+    ledger = sample_ledger()
+    assert write_ledger_file(ledger, path) == 5
+    reopened = GeneralLedger()
+    assert read_ledger_file(reopened, path) == 5
+    assert isinstance(reopened._store.debits, memoryview)  # Mapped, not parsed
+    assert figures(reopened) == figures(ledger)
+
+    # Appending copies the mapped columns before growing them
+    reopened.add_transaction("2024-03-02", "Cash", 1, 0, "After reopening")
+    ledger.add_transaction("2024-03-02", "Cash", 1, 0, "After reopening")
+    assert figures(reopened) == figures(ledger)
+    assert {len(getattr(reopened._store, name)) for name in ROW_COLUMNS} == {6}
+
+
+@pytest.mark.parametrize("append", [True, False])
+def test_save_over_the_mapped_file(tmp_path, monkeypatch, append):
+    path = str(tmp_path / "books.gl")
+    ledger = sample_ledger()
+    write_ledger_file(ledger, path)
+    reopened = GeneralLedger()
+    read_ledger_file(reopened, path)
+    mapping = reopened._store.mapping
+    assert reopened._snapshots is not None  # Read from the file, so viewing the mapping too
+    if append:
+        reopened.add_transaction("2024-03-02", "Cash", 1, 0, "After reopening")
+        ledger.add_transaction("2024-03-02", "Cash", 1, 0, "After reopening")
+        assert mapping.closed
+
+    replace = os.replace
+
+    def replace_unmapped(source, target):
+        # Windows cannot replace a file that is still mapped
+        assert mapping.closed
+        replace(source, target)
+
+    monkeypatch.setattr(os, "replace", replace_unmapped)
+    write_ledger_file(reopened, path)
+    assert reopened._store.mapping is None
+    assert figures(reopened) == figures(ledger)
+    saved = GeneralLedger()
+    read_ledger_file(saved, path)
+    assert figures(saved) == figures(ledger)
+
+
+def test_partial_write_leaves_out_later_rows_and_accounts(tmp_path):
+    path = str(tmp_path / "books.gl")
+    ledger = sample_ledger()
+    write_ledger_file(ledger, path, row_count=4)
+    reopened = GeneralLedger()
+    read_ledger_file(reopened, path)
+    assert reopened.get_records(0, 10) == ledger.get_records(0, 4)
+    assert "Office Supplies Expense" not in reopened.get_balances_cents()
+
+
+def test_file_without_snapshots_builds_them(tmp_path):
+    path = str(tmp_path / "books.gl")
+    ledger = sample_ledger()
+    write_ledger_file(ledger, path)
+    # Rename the snapshot sections, as if written before they existed; unknown sections are ignored
+    with open(path, "r+b") as handle:
+        data = bytearray(handle.read())
+        _, _, _, section_count = HEADER.unpack_from(data, 0)
+        snapshot_names = {name for _, _, name in SNAPSHOT_SECTIONS}
+        for number in range(section_count):
+            position = HEADER.size + number * SECTION.size
+            name, offset, length = SECTION.unpack_from(data, position)
+            if name.rstrip(b"\0") in snapshot_names:
+                SECTION.pack_into(data, position, b"x" + name[1:], offset, length)
+        handle.seek(0)
+        handle.write(data)
+    reopened = GeneralLedger()
+    read_ledger_file(reopened, path)
+    assert reopened._snapshots is None
+    assert figures(reopened) == figures(ledger)
+
+
+@pytest.mark.parametrize("content, message", [
+    (b"GLDG", "too short"),
+    (b"XXXX" + bytes(HEADER.size), "Not a ledger file"),
+    (HEADER.pack(b"GLDG", 99, 0, 0), "newer"),
+])
+def test_rejects_invalid_files(tmp_path, content, message):
+    path = tmp_path / "books.gl"
+    path.write_bytes(content)
+    with pytest.raises(LedgerFormatError, match=message):
+        read_ledger_file(GeneralLedger(), str(path))
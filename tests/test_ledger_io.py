@@ -0,0 +1,74 @@
+import csv
+import threading
+
+import pytest
+
+import instrumentation
+from ledger import GeneralLedger
+from ledger_io import LEDGER_HEADER, load_csv, save_csv
+from sqlite_ledger import SqliteLedger
+
+
+def test_csv_save_in_background_while_appending(tmp_path, monkeypatch):
+    ledger = GeneralLedger()
+    ledger.add_transactions([("2024-01-01", "Cash", row + 1, 0, f"Row {row}", row // 2 + 1) for row in range(1000)])
+    row_count = len(ledger.transactions)
+
+    # Pause the save while the entry index it builds holds NumPy views of the columns
+    np = pytest.importorskip("numpy")
+    building, resume = threading.Event(), threading.Event()
+    frombuffer = np.frombuffer
+
+    def paused_frombuffer(*args, **kwargs):
+        view = frombuffer(*args, **kwargs)
+        if threading.current_thread() is worker and not building.is_set():
+            building.set()
+            resume.wait(10)
+        return view
+
+    monkeypatch.setattr(np, "frombuffer", paused_frombuffer)
+    path = str(tmp_path / "books.csv")
+    worker = threading.Thread(target=save_csv, args=(ledger, path, row_count))
+    appender = threading.Thread(target=ledger.add_transaction, args=("2024-01-02", "Cash", 5, 0, "Added"))
+    worker.start()
+    assert building.wait(10)
+    try:
+        appender.start()
+        appender.join(0.2)
+        assert appender.is_alive()  # Waits for the index instead of failing to grow the columns
+    finally:
+        resume.set()
+        worker.join()
+        appender.join()
+
+    store = ledger._store
+    assert {len(getattr(store, name)) for name in
+            ("account_ids", "date_ids", "debits", "credits", "description_ids", "entry_ids")} == {1001}
+    with open(path, newline="") as handle:
+        rows = list(csv.reader(handle))
+    assert len(rows) == row_count + 1
+    assert rows[1][-1] == "1"
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_chunked_load_records_each_batch_once(tmp_path, backend):
+    path = str(tmp_path / "books.csv")
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(LEDGER_HEADER)
+        writer.writerows(("2024-01-01", "Cash", row + 1, 0, f"Row {row}") for row in range(10_000))
+    ledger = GeneralLedger() if backend == "memory" else SqliteLedger(str(tmp_path / "books.db"))
+    instrumentation.reset()
+    instrumentation.enable()
+    try:
+        report = load_csv(ledger, path, chunk_size=1000)
+        figures = instrumentation.metrics()
+    finally:
+        instrumentation.enable(False)
+        instrumentation.reset()
+        if backend == "sqlite":
+            ledger.close()
+    assert report.rows_loaded == 10_000
+    assert figures["add_transactions"]["count"] == 10
+    assert figures["add_transactions"]["rows"] == 10_000
+    assert figures["load_csv"]["rows"] == 10_000
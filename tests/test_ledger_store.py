@@ -0,0 +1,65 @@
+import pytest
+
+from ledger_store import LedgerStore, to_cents
+
+ROW_COLUMNS = ("account_ids", "date_ids", "debits", "credits", "description_ids", "entry_ids")
+
+
+def column_lengths(store):
+    return {name: len(getattr(store, name)) for name in ROW_COLUMNS}
+
+
+def test_extend_is_all_or_nothing_when_a_column_is_exported():
+    store = LedgerStore()
+    store.extend([("2024-01-01", "Cash", 100, 0, "Sale")])
+    view = memoryview(store.debits)  # Like a NumPy view held by a reader on another thread
+    with pytest.raises(BufferError):
+        store.extend([("2024-01-02", "Sales", 0, 100, "Sale")])
+    assert set(column_lengths(store).values()) == {1}
+    assert len(store.dates) == len(store.date_ordinals)
+    view.release()
+    store.extend([("2024-01-03", "Sales", 0, 100, "Sale")])
+    assert set(column_lengths(store).values()) == {2}
+    assert store.records(0, 2)[1] == ("2024-01-03", "Sales", 0, 100, "Sale")
+
+
+def test_new_date_is_not_interned_when_its_ordinal_cannot_be_stored():
+    store = LedgerStore()
+    store.extend([("2024-01-01", "Cash", 100, 0, "Sale")])
+    view = memoryview(store.date_ordinals)
+    with pytest.raises(BufferError):
+        store.extend([("2024-02-01", "Cash", 100, 0, "Sale")])
+    view.release()
+    assert len(store.dates) == len(store.date_ordinals) == 1
+    assert set(column_lengths(store).values()) == {1}
+
+
+def test_copy_is_detached_from_later_appends():
+    store = LedgerStore()
+    store.extend([("2024-01-01", "Cash", 100, 0, "Sale"), ("2024-01-02", "Sales", 0, 100, "Sale")])
+    copy = store.copy(1)
+    store.extend([("2024-01-03", "Bank", 5, 0, "Fee")])
+    assert len(copy) == 1
+    assert copy.records(0, 1) == [("2024-01-01", "Cash", 100, 0, "Sale")]
+    assert len(copy.dates) == len(copy.date_ordinals) == 2
+
+
+@pytest.mark.parametrize("amount, cents", [
+    ("12.34", 1234), ("-0.5", -50), (7, 700), (0.1, 10), (1.005, 101), ("1e2", 10000),
+])
+def test_to_cents(amount, cents):
+    assert to_cents(amount) == cents
+
+
+def test_to_cents_accepts_numpy_scalars():
+    np = pytest.importorskip("numpy")
+    assert to_cents(np.float64(1.5)) == 150
+    assert to_cents(np.float32(0.25)) == 25
+    assert to_cents(np.int64(3)) == 300
+    assert to_cents(np.array([10.5])[0]) == 1050
+
+
+@pytest.mark.parametrize("amount", ["abc", "", "nan", float("inf"), 2 ** 62, "1e30", 1e18])
+def test_to_cents_rejects_non_amounts(amount):
+    with pytest.raises(ValueError):
+        to_cents(amount)
@@ -0,0 +1,47 @@
+import pytest
+
+from ledger import GeneralLedger
+from ledger_format import write_ledger_file
+from ledger_cli import main
+from ledger_io import load_csv, save_csv
+from parallel_ledger import PartitionedLedger
+
+
+def build_ledger():
+    ledger = GeneralLedger()
+    ledger.add_transactions([(f"2024-{row % 12 + 1:02d}-{row % 28 + 1:02d}", f"Account {row % 5}",
+                              f"{row}.25", 0, f"Row {row}") for row in range(1, 200)])
+    return ledger
+
+
+@pytest.mark.parametrize("file_name", ["books.gl", "books.csv"])
+def test_partitioned_sums_match_the_ledger(tmp_path, file_name):
+    ledger = build_ledger()
+    path = str(tmp_path / file_name)
+    if file_name.endswith(".gl"):
+        write_ledger_file(ledger, path)
+    else:
+        save_csv(ledger, path)
+    partitioned = PartitionedLedger(path, workers=2, partition_rows=16, partition_bytes=512)
+    for start_date, end_date in ((None, None), ("2024-03-01", "2024-06-30"), (None, "2024-02-29")):
+        assert partitioned.get_balances_cents(start_date, end_date) == ledger.get_balances_cents(start_date, end_date)
+
+
+def test_csv_descriptions_with_line_break_characters(tmp_path, capsys):
+    breaks = ["\r", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e", "\x85", "\u2028"]
+    ledger = GeneralLedger()
+    ledger.add_transactions([("2024-01-02", f"Account {row % 3}", row + 1, 0, f"Memo{breaks[row % 8]}row {row}")
+                             for row in range(300)])
+    path = str(tmp_path / "books.csv")
+    save_csv(ledger, path)
+    loaded = GeneralLedger()
+    assert load_csv(loaded, path).rejected == []
+
+    partitioned = PartitionedLedger(path, workers=2, partition_bytes=1024)
+    assert partitioned.get_balances_cents() == loaded.get_balances_cents() == ledger.get_balances_cents()
+    assert partitioned.rows_rejected == 0
+
+    assert main(["balances", path]) == 0
+    single = capsys.readouterr().out
+    assert main(["balances", path, "--workers", "2"]) == 0
+    assert capsys.readouterr().out == single
@@ -0,0 +1,88 @@
+from datetime import date
+
+import pytest
+
+import period_snapshots
+from date_index import DateIndex
+from ledger_store import LedgerStore, UNDATED
+from period_snapshots import PeriodSnapshots
+
+
+def sample_rows(count, year=2023):
+    rows = []
+    for row in range(count):
+        month, day = row % 24 + 1, row * 7 % 28 + 1
+        when = f"{year + (month - 1) // 12}-{(month - 1) % 12 + 1:02d}-{day:02d}"
+        if row % 13 == 0:
+            when = "" if row % 2 else "someday"  # Undated rows
+        # Accounts past the third only start appearing mid-way through the first year
+        account = f"Account {row % 6}" if row % 24 >= 6 else f"Account {row % 3}"
+        rows.append((when, account, row % 9 * 100, row % 5 * 100, "Row"))
+    return rows
+
+
+def period_sums(snapshots, store, start=None, end=None):
+    """{account_id: (debit, credit)} over [start, end] from the snapshots, or None."""
+    through = snapshots.cumulative(store, end)
+    before = {} if start is None else snapshots.cumulative(store, start - 1)
+    if through is None or before is None:
+        return None
+    sums = {}
+    for account_id, (debit, credit, rows) in through.items():
+        opening_debit, opening_credit, opening_rows = before.get(account_id, (0, 0, 0))
+        if rows > opening_rows:
+            sums[account_id] = (debit - opening_debit, credit - opening_credit)
+    return sums
+
+
+def month_bounds():
+    bounds = [None, UNDATED + 1]
+    for year in (2023, 2024, 2025):
+        for month in range(1, 13):
+            first = date(year, month, 1).toordinal()
+            bounds += [first, first + 9, period_snapshots.period_end(first)]
+    return bounds
+
+
+@pytest.fixture(params=["numpy", "python"])
+def vectorized(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(period_snapshots, "numpy_module", lambda: None)
+    elif period_snapshots.numpy_module() is None:
+        pytest.skip("NumPy is not installed")
+
+
+@pytest.mark.parametrize("appended", [0, 40])
+def test_period_sums_match_the_date_index(vectorized, appended):
+    rows = sample_rows(600)
+    store = LedgerStore()
+    store.extend(rows[:len(rows) - appended])
+    snapshots = PeriodSnapshots.build(store)
+    # Rows appended after the build, including a new account, are read from the store
+    store.extend(rows[len(rows) - appended:] + ([("2024-05-05", "Late account", 100, 0, "Row")] if appended else []))
+    index = DateIndex.build(store)
+
+    bounds = month_bounds()
+    for start in bounds:
+        for end in bounds:
+            if start is not None and end is not None and end < start:
+                continue
+            sums = period_sums(snapshots, store, start, end)
+            # Whole months are always answered by the snapshots; other dates may fall back
+            if (start is None or date.fromordinal(start).day == 1) and \
+                    (end is None or end == period_snapshots.period_end(end)):
+                assert sums is not None, (start, end)
+            if sums is not None:
+                assert sums == index.period_totals(start, end), (start, end)
+
+
+def test_undated_rows_count_before_every_date(vectorized):
+    store = LedgerStore()
+    store.extend([("", "Cash", 500, 0, "Opening"), ("2024-03-10", "Cash", 0, 200, "Spend"),
+                  ("2024-06-01", "Fees", 70, 0, "New account")])
+    snapshots = PeriodSnapshots.build(store)
+    cash, fees = store.accounts.lookup("Cash"), store.accounts.lookup("Fees")
+    assert snapshots.cumulative(store, date(2024, 1, 31).toordinal()) == {cash: (500, 0, 1)}
+    assert snapshots.cumulative(store, date(2024, 6, 30).toordinal()) == {cash: (500, 200, 2), fees: (70, 0, 1)}
+    first_of_march = date(2024, 3, 1).toordinal()
+    assert period_sums(snapshots, store, first_of_march) == DateIndex.build(store).period_totals(first_of_march)
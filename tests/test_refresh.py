@@ -0,0 +1,84 @@
+from chart_of_accounts import DEFAULT_CHART
+from refresh import Change, RefreshScheduler, statements_affected, tax_forms_affected
+from tax_forms import FORM_1120
+
+
+class FakeMaster:
+    """Records after()/after_cancel() calls instead of running a Tk event loop."""
+
+    def __init__(self):
+        self.calls = []
+        self.pending = {}
+        self.next_id = 0
+
+    def after(self, delay_ms, callback):
+        self.next_id += 1
+        after_id = f"after#{self.next_id}"
+        self.calls.append(("after", delay_ms, after_id))
+        self.pending[after_id] = callback
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.calls.append(("after_cancel", after_id))
+        self.pending.pop(after_id, None)
+
+    def run_pending(self):
+        for callback in list(self.pending.values()):
+            callback()
+        self.pending.clear()
+
+
+def change(accounts):
+    result = Change()
+    result.add(accounts, ["2024-01-01"])
+    return result
+
+
+def test_each_change_postpones_the_flush():
+    master = FakeMaster()
+    scheduler = RefreshScheduler(master, delay_ms=50)
+    refreshed = []
+    scheduler.add_view("ledger", refreshed.append, lambda: True)
+    for day in (1, 2, 3):
+        scheduler.invalidate(["Cash"], [f"2024-01-0{day}"])
+    assert master.calls == [("after", 50, "after#1"), ("after_cancel", "after#1"),
+                            ("after", 50, "after#2"), ("after_cancel", "after#2"),
+                            ("after", 50, "after#3")]
+    assert list(master.pending) == ["after#3"]
+    assert refreshed == []
+
+    master.run_pending()
+    assert len(refreshed) == 1  # One refresh for the whole burst
+    assert refreshed[0].accounts == {"Cash"}
+    assert (refreshed[0].first_date, refreshed[0].last_date) == (738886, 738888)
+
+
+def test_hidden_and_unaffected_views_are_not_refreshed():
+    master = FakeMaster()
+    scheduler = RefreshScheduler(master)
+    refreshed = []
+    visible = {"shown": True, "hidden": False}
+    for name in visible:
+        scheduler.add_view(name, lambda change, name=name: refreshed.append(name), lambda name=name: visible[name],
+                           lambda change: "Cash" in change.accounts)
+    scheduler.invalidate(["Rent Expense"], ["2024-01-01"])
+    scheduler.flush()
+    assert refreshed == []
+    scheduler.invalidate(["Cash"], ["2024-01-01"])
+    scheduler.flush()
+    assert refreshed == ["shown"]
+    visible["hidden"] = True
+    scheduler.shown()
+    assert refreshed == ["shown", "hidden"]
+
+
+def test_statement_and_tax_form_predicates():
+    statements = statements_affected(DEFAULT_CHART)
+    tax_forms = tax_forms_affected(DEFAULT_CHART, [FORM_1120])
+    assert statements(change(["Cash"])) and statements(change(["Sales Revenue"]))
+    assert not statements(change(["Miscellaneous"]))  # Unclassified accounts appear on no statement
+    assert tax_forms(change(["Consulting Revenue"])) and tax_forms(change(["Rent Expense"]))
+    assert not tax_forms(change(["Cash"])) and not tax_forms(change(["Miscellaneous"]))
+    everything = Change()
+    everything.add()
+    assert statements(everything) and tax_forms(everything)
@@ -0,0 +1,89 @@
+import pytest
+
+import search_index
+from ledger_store import LedgerStore, parse_date, to_cents
+from search_index import SearchIndex, tokenize
+
+WORDS = ("rent", "rental", "invoice", "inv", "coffee", "café", "refund", "deposit")
+DATES = ("2024-01-15", "02/29/2024", "2024-03-31", "2024-12-01", "", "not a date")
+
+
+def sample_rows(start, count):
+    return [(DATES[row % len(DATES)], f"Account {row % 4}", (row % 50) * 100, 0,
+             f"{WORDS[row % len(WORDS)]} {WORDS[row * 3 % len(WORDS)]} #{row % 17}")
+            for row in range(start, start + count)]
+
+
+def brute_force(rows, account=None, text="", start_date=None, end_date=None, min_amount=None, max_amount=None):
+    prefixes = tokenize(text)
+    start = None if start_date is None else parse_date(start_date)
+    end = None if end_date is None else parse_date(end_date)
+    matched = []
+    for row, (date, row_account, debit, credit, description) in enumerate(rows):
+        words = tokenize(description)
+        ordinal = parse_date(date)
+        amount = debit + credit
+        if (account is None or row_account == account) \
+                and all(any(word.startswith(prefix) for word in words) for prefix in prefixes) \
+                and (start is None or ordinal >= start) and (end is None or ordinal <= end) \
+                and (min_amount is None or amount >= to_cents(min_amount)) \
+                and (max_amount is None or amount <= to_cents(max_amount)):
+            matched.append(row)
+    return matched
+
+
+QUERIES = [
+    {},
+    {"text": "ren"},
+    {"text": "RENT inv"},
+    {"text": "caf"},
+    {"text": "#3"},
+    {"text": "nothing"},
+    {"account": "Account 2"},
+    {"account": "Account 1", "text": "de"},
+    {"start_date": "2024-02-01", "end_date": "2024-03-31"},
+    {"end_date": "2024-02-29", "text": "coffee"},
+    {"start_date": "2024-03-31", "account": "Account 3", "min_amount": "10", "max_amount": "30.00"},
+]
+
+
+def match(index, store, filters):
+    filters = dict(filters)
+    account = filters.pop("account", None)
+    account_id = None if account is None else store.accounts.lookup(account)
+    return list(index.match_rows(store, account_id, **filters))
+
+
+@pytest.fixture(params=["numpy", "python"])
+def vectorized(request, monkeypatch):
+    if request.param == "python":
+        monkeypatch.setattr(search_index, "numpy_module", lambda: None)
+    elif search_index.numpy_module() is None:
+        pytest.skip("NumPy is not installed")
+
+
+@pytest.mark.parametrize("filters", QUERIES)
+def test_match_rows_agrees_with_a_scan(vectorized, filters):
+    rows = sample_rows(0, 300)
+    store = LedgerStore()
+    store.extend(rows)
+    assert match(SearchIndex.build(store), store, filters) == brute_force(rows, **filters)
+
+
+def test_descriptions_appended_after_the_build(vectorized, monkeypatch):
+    monkeypatch.setattr(search_index, "REBUILD_DESCRIPTIONS", 40)
+    rows = sample_rows(0, 100)
+    store = LedgerStore()
+    store.extend(rows)
+    index = SearchIndex.build(store)
+    # New words land in the recent map, then a large append rebuilds, then more go to the recent map
+    for count, rebuilt in ((30, False), (200, True), (20, False)):
+        appended = [(date, account, debit, credit, f"{description} batch{len(rows)}")
+                    for date, account, debit, credit, description in sample_rows(len(rows), count)]
+        store.extend(appended)
+        rows += appended
+        index.add(store)
+        assert (not index.recent) == rebuilt
+        assert index.indexed == len(store.descriptions)
+        for filters in QUERIES + [{"text": "batch1"}, {"text": f"batch{len(rows) - count} ren"}]:
+            assert match(index, store, filters) == brute_force(rows, **filters)
@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+from ledger import GeneralLedger
+from sqlite_ledger import SqliteLedger
+
+DESCRIPTIONS = ("Office rent", "Client invoice", "Coffee beans", "Invoice correction", "Rental deposit")
+
+
+def sample_rows(count):
+    rows = []
+    for row in range(count):
+        month, day = row % 12 + 1, row % 28 + 1
+        # Mix the accepted date formats; they must sort by day, not by text
+        date = f"2024-{month:02d}-{day:02d}" if row % 3 else f"{month:02d}/{day:02d}/2024"
+        debit, credit = (row % 700 + 1, 0) if row % 2 else (0, row % 700 + 1)
+        rows.append((date, f"Account {row % 9}", debit, credit, f"{DESCRIPTIONS[row % 5]} {row % 40}",
+                     f"E{row // 3}" if row % 10 == 0 else ""))
+    return rows
+
+
+@pytest.fixture
+def ledgers(tmp_path):
+    rows = sample_rows(40_000)
+    memory = GeneralLedger()
+    memory.add_transactions(rows)
+    database = SqliteLedger(str(tmp_path / "books.db"))
+    database.add_transactions(rows)
+    yield memory, database
+    database.close()
+
+
+SEARCHES = [
+    {},
+    {"text": "inv"},
+    {"text": "rent 1"},
+    {"account": "Account 3", "text": "coffee"},
+    {"account": "Missing"},
+    {"start_date": "2024-03-01", "end_date": "2024-05-31"},
+    {"start_date": "06/01/2024", "min_amount": "100", "max_amount": "250.50"},
+]
+
+
+def test_balances_and_trial_balance_match(ledgers):
+    memory, database = ledgers
+    assert len(database.transactions) == len(memory.transactions)
+    for start_date, end_date in ((None, None), ("2024-02-01", "2024-04-30"), (None, "2024-06-15")):
+        assert database.get_balances_cents(start_date, end_date) == memory.get_balances_cents(start_date, end_date)
+        assert database.get_account_totals(start_date, end_date) == memory.get_account_totals(start_date, end_date)
+    assert database.trial_balance() == memory.trial_balance()
+    assert database.unbalanced_entries() == memory.unbalanced_entries()
+    assert database.get_t_account("Account 4") == memory.get_t_account("Account 4")
+
+
+@pytest.mark.parametrize("filters", SEARCHES)
+def test_search_matches(ledgers, filters):
+    memory, database = ledgers
+    rows, expected = database.search(**filters), memory.search(**filters)
+    assert list(rows) == list(expected)
+    assert database.account_counts(rows) == memory.account_counts(expected)
+
+
+def test_records_of_a_large_result_are_fetched_in_chunks(ledgers):
+    memory, database = ledgers
+    rows = list(memory.search())[::-1]  # More rows than SQLite allows parameters, in any order
+    assert len(rows) > 32766
+    assert database.get_records_at(rows) == memory.get_records_at(rows)
+
+
+def test_database_without_ordinals_is_upgraded(tmp_path):
+    path = str(tmp_path / "old.db")
+    rows = sample_rows(500)
+    database = SqliteLedger(path)
+    database.add_transactions(rows)
+    database.close()
+    with sqlite3.connect(path) as connection:  # As written before the ordinal column existed
+        connection.execute("DROP INDEX transactions_ordinal")
+        connection.execute("ALTER TABLE transactions DROP COLUMN ordinal")
+
+    memory = GeneralLedger()
+    memory.add_transactions(rows)
+    database = SqliteLedger(path)
+    try:
+        filters = {"start_date": "2024-03-01", "end_date": "2024-05-31"}
+        assert list(database.search(**filters)) == list(memory.search(**filters))
+    finally:
+        database.close()
@@ -0,0 +1,33 @@
+from financial_statements import StatementEngine
+from ledger import GeneralLedger
+from tax_forms import evaluate_forms
+
+
+def trading_ledger():
+    ledger = GeneralLedger()
+    for date, account, debit, credit, description in (
+            ("2024-01-05", "Cash", 1000, 0, "Sale"),
+            ("2024-01-05", "Sales Revenue", 0, 1000, "Sale"),
+            ("2024-01-06", "COGS", 300, 0, "Stock sold"),
+            ("2024-01-06", "Inventory", 0, 300, "Stock sold"),
+            ("2024-01-07", "Rent Expense", 100, 0, "January rent"),
+            ("2024-01-07", "Cash", 0, 100, "January rent")):
+        ledger.add_transaction(date, account, debit, credit, description)
+    return ledger
+
+
+def lines(form):
+    return {number: amount for number, _, amount in form}
+
+
+def test_cost_of_goods_sold_is_reported_once():
+    ledger = trading_ledger()
+    revenue = StatementEngine(ledger).revenue
+    forms = evaluate_forms(ledger)
+    form_1120, form_1065, schedule_c = (lines(forms[form_id]) for form_id in ("1120", "1065", "schedule-c"))
+
+    # COGS is an expense: net income is receipts less COGS less the other deductions
+    assert form_1120["2"] == form_1065["2"] == schedule_c["4"] == 300
+    assert (form_1120["11"], form_1120["25"], form_1120["26"]) == (revenue - 300, 100, revenue - 400)
+    assert (form_1065["8"], form_1065["22"], form_1065["23"]) == (revenue - 300, 100, revenue - 400)
+    assert (schedule_c["7"], schedule_c["28"], schedule_c["31"]) == (revenue - 300, 100, revenue - 400)
@@ -0,0 +1,38 @@
+from ledger import GeneralLedger
+from ledger_format import write_ledger_file
+from workspace import Workspace
+
+
+def build_indexes(ledger):
+    ledger.search("row", start_date="2024-03-01")
+    ledger.get_balances_cents("2024-02-01", "2024-02-29")
+
+
+def test_index_memory_counts_towards_the_budget(tmp_path):
+    source = GeneralLedger()
+    source.add_transactions([(f"2024-{row % 12 + 1:02d}-{row % 28 + 1:02d}", f"Account {row % 40}",
+                              row % 900 + 1, 0, f"Row {row} memo {row % 3000}") for row in range(20_000)])
+    source_path = str(tmp_path / "source.gl")
+    write_ledger_file(source, source_path)
+
+    workspace = Workspace(str(tmp_path / "books"), workers=1)
+    for entity in ("A", "B", "C"):
+        workspace.create(entity, source_path)
+    try:
+        active = workspace.activate("A")
+        mapped_bytes = active.memory_bytes()
+        build_indexes(active)
+        assert active._store.mapping is not None  # Rows are still mapped; the indexes are not
+        index_bytes = active.memory_bytes() - mapped_bytes
+        assert index_bytes > 0
+
+        workspace.memory_budget = mapped_bytes * 3 + index_bytes * 3 // 2
+        other = workspace.get("B")
+        build_indexes(other)
+        third = workspace.get("C")
+        # A and B together are over the budget: B, the least recently used, is spilled and A stays active
+        assert not workspace.holds(other)
+        assert workspace.holds(active) and workspace.holds(third)
+        assert workspace.memory_bytes() <= workspace.memory_budget
+    finally:
+        workspace.close()
@@ -0,0 +1,245 @@
+"""Multi-entity workspace: many client ledgers open under one memory budget.
+
+A workspace is a directory holding one journaled .gl ledger per entity
+(`<entity>.gl`). Entities are opened on demand and kept in least-recently
+used order; when the ledgers held in memory exceed the budget, the
+coldest ones are spilled: checkpointed into their .gl file and dropped.
+Reopening a spilled entity only maps its file, so it costs little.
+
+close_entities() produces the statements and tax forms of every entity
+in parallel on a process pool that the workspace keeps for its lifetime,
+and reports how long each entity took.
+"""
+import csv
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from financial_statements import BalanceSheet, IncomeStatement, StatementEngine, StatementOfEquity
+from journal import checkpoint, journal_path, open_ledger, read_ledger
+from ledger import GeneralLedger
+from ledger_format import FILE_EXTENSION, is_ledger_file, write_ledger_file
+from ledger_io import load_csv
+from tax_forms import evaluate_forms
+
+# Bytes of ledger rows, pools and indexes kept in memory across all open entities
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+
+ENTITY_NAME = re.compile(r"^[\w][\w .&'-]*$")
+
+TIMING_COLUMNS = ("Entity", "Rows", "Load (s)", "Statements (s)", "Tax forms (s)", "Total (s)", "Error")
+
+
+def close_entity(entity, path, start_date=None, end_date=None, form_ids=None):
+    """Compute one entity's statements and tax forms from its file (runs in a worker process).
+
+    Returns a result dict; a failure is reported in result["error"] rather
+    than raised, so one bad ledger does not stop a batch.
+    """
+    result = {"entity": entity, "rows": 0, "statements": {}, "tax_forms": {}, "timings": {}, "error": None}
+    timings = result["timings"]
+    started = time.perf_counter()
+    try:
+        ledger = GeneralLedger()
+        read_ledger(ledger, path)
+        result["rows"] = len(ledger.transactions)
+        timings["load"] = time.perf_counter() - started
+
+        mark = time.perf_counter()
+        engine = StatementEngine(ledger, start_date, end_date)
+        for title, statement in (("Income Statement", IncomeStatement(ledger, engine=engine)),
+                                 ("Balance Sheet", BalanceSheet(ledger, engine=engine)),
+                                 ("Statement of Equity", StatementOfEquity(ledger, engine=engine))):
+            result["statements"][title] = statement.to_records()
+        timings["statements"] = time.perf_counter() - mark
+
+        mark = time.perf_counter()
+        result["tax_forms"] = evaluate_forms(ledger, form_ids, engine=engine)
+        timings["tax_forms"] = time.perf_counter() - mark
+    except Exception as error:  # Reported per entity
+        result["error"] = f"{type(error).__name__}: {error}"
+    timings["total"] = time.perf_counter() - started
+    return result
+
+
+class BatchReport:
+    """Results of a batch close, one per entity in name order, with per-entity timings."""
+
+    def __init__(self, results, elapsed):
+        self.results = sorted(results, key=lambda result: result["entity"])
+        self.elapsed = elapsed
+
+    @property
+    def failed(self):
+        return [result for result in self.results if result["error"]]
+
+    def summary(self):
+        text = f"{len(self.results):,} entities closed in {self.elapsed:.2f}s"
+        if self.failed:
+            text += f", {len(self.failed):,} failed"
+        return text
+
+    def timing_rows(self):
+        rows = []
+        for result in self.results:
+            timings = result["timings"]
+            rows.append((result["entity"], result["rows"],
+                         *(round(timings.get(step, 0.0), 4) for step in ("load", "statements", "tax_forms", "total")),
+                         result["error"] or ""))
+        return rows
+
+    def write_timings(self, path):
+        with open(path, 'w', newline='') as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(TIMING_COLUMNS)
+            writer.writerows(self.timing_rows())
+
+
+class Workspace:
+    def __init__(self, directory, memory_budget=DEFAULT_MEMORY_BUDGET, workers=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.workers = workers or os.cpu_count() or 1
+        self.active = None  # Entity shown in the app; never spilled
+        self._open = OrderedDict()  # entity -> ledger, least recently used first
+        self._lock = threading.RLock()
+        self._pool = None
+
+    def path(self, entity):
+        return os.path.join(self.directory, entity + FILE_EXTENSION)
+
+    def entities(self):
+        """Every entity in the workspace, by name."""
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(self.directory) if is_ledger_file(name))
+
+    def __contains__(self, entity):
+        return os.path.exists(self.path(entity))
+
+    def holds(self, ledger):
+        """Whether `ledger` is one of the workspace's open entities (and so is closed by it)."""
+        with self._lock:
+            return any(open_ledger is ledger for open_ledger in self._open.values())
+
+    def create(self, entity, source=None):
+        """Add an entity, empty or from a CSV or .gl file; returns the CSV LoadReport, if any."""
+        if not ENTITY_NAME.match(entity):
+            raise ValueError(f"Invalid entity name {entity!r}.")
+        if entity in self:
+            raise ValueError(f"Entity {entity!r} already exists.")
+        path = self.path(entity)
+        if source is not None and is_ledger_file(source):
+            shutil.copyfile(source, path)
+            if os.path.exists(journal_path(source)):
+                shutil.copyfile(journal_path(source), journal_path(path))
+            return None
+        ledger = GeneralLedger()
+        report = load_csv(ledger, source) if source is not None else None
+        write_ledger_file(ledger, path)
+        return report
+
+    def get(self, entity):
+        """Open an entity (or return it if already open) and mark it most recently used."""
+        with self._lock:
+            ledger = self._open.get(entity)
+            if ledger is None:
+                if entity not in self:
+                    raise KeyError(f"No entity {entity!r} in {self.directory}.")
+                ledger = GeneralLedger()
+                open_ledger(ledger, self.path(entity))
+                self._open[entity] = ledger
+            self._open.move_to_end(entity)
+            self.trim(keep=entity)
+            return ledger
+
+    def activate(self, entity):
+        """Open an entity as the one being worked on; it is exempt from spilling."""
+        with self._lock:
+            ledger = self.get(entity)
+            self.active = entity
+            return ledger
+
+    def memory_bytes(self):
+        with self._lock:
+            return sum(ledger.memory_bytes() for ledger in self._open.values())
+
+    def trim(self, keep=None):
+        """Spill least recently used entities until the open ones fit the memory budget."""
+        with self._lock:
+            used = self.memory_bytes()
+            for entity in list(self._open):
+                if used <= self.memory_budget:
+                    break
+                if entity in (keep, self.active):
+                    continue
+                used -= self._open[entity].memory_bytes()
+                self.spill(entity)
+
+    def spill(self, entity):
+        """Checkpoint an open entity into its file and drop it from memory."""
+        with self._lock:
+            ledger = self._open.pop(entity, None)
+            if ledger is None:
+                return
+            if self.active == entity:
+                self.active = None
+            with ledger.write_lock:
+                if ledger.journal is not None and ledger.journal.record_count:
+                    checkpoint(ledger, self.path(entity))
+                ledger.close_journal()
+
+    def commit(self):
+        """Make every open entity's journal durable, so other processes read current books."""
+        with self._lock:
+            for ledger in self._open.values():
+                with ledger.write_lock:
+                    if ledger.journal is not None:
+                        ledger.journal.commit()
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    def close_entities(self, entities=None, start_date=None, end_date=None, form_ids=None, progress=None):
+        """Compute statements and tax forms for many entities in parallel; return a BatchReport.
+
+        Each entity is read from its file by a worker process, so open
+        entities only have their journals committed first. progress, if
+        given, is called with (entities done, total) as they finish.
+        """
+        entities = self.entities() if entities is None else list(entities)
+        self.commit()
+        started = time.perf_counter()
+        tasks = [(entity, self.path(entity), start_date, end_date, form_ids) for entity in entities]
+        results = []
+        if self.workers == 1 or len(tasks) <= 1:
+            for task in tasks:
+                results.append(close_entity(*task))
+                if progress is not None:
+                    progress(len(results), len(tasks))
+            return BatchReport(results, time.perf_counter() - started)
+        futures = [self._get_pool().submit(close_entity, *task) for task in tasks]
+        try:
+            for future in as_completed(futures):
+                results.append(future.result())
+                if progress is not None:
+                    progress(len(results), len(tasks))
+        finally:
+            for future in futures:
+                future.cancel()  # Only pending tasks; e.g. after a cancelled job
+        return BatchReport(results, time.perf_counter() - started)
+
+    def close(self):
+        """Spill every open entity and shut the worker pool down."""
+        with self._lock:
+            for entity in list(self._open):
+                self.spill(entity)
+            self.active = None
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None